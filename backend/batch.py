@@ -0,0 +1,378 @@
+"""
+Non-interactive batch commands for ``main.py``.
+
+    python main.py predict --temp 10 15 20 -o predictions.csv
+    python main.py leaderboard --runners field.json --format jsonl
+    python main.py sweep --temp-grid 5 25 1 -o sweep.parquet
+
+Runner lists come from a CSV with ``runner`` and ``pb`` columns, or a JSON
+object ``{"name": "H:MM:SS"}`` (the shape of ``runners.ELITE_MEN_2026``,
+the default) or list of ``{"runner": ..., "pb": ...}`` objects.  PBs are
+``H:MM:SS``, ``MM:SS`` or seconds.
+
+Output goes to stdout or ``-o FILE`` as CSV, JSON lines or Parquet (needs
+``pyarrow``), picked by ``--format`` or the file extension.  Rows are written
+as they are produced: ``predict`` emits each runner as soon as it is
+simulated; ``leaderboard`` and ``sweep`` rank the field against itself, so
+their rows follow once the field has been simulated at a temperature (or
+across the whole scenario grid), and are still written one at a time.
+Non-finite values (a DNF's predicted time) are written as empty/null.
+
+Exit status: 0 on success, 1 if a run fails, 2 for bad arguments or input,
+130 when interrupted.  Only the standard library is imported until a
+command runs, so ``main.py`` stays quick to start.
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+
+from timefmt import format_result_time, time_to_seconds
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+OUTPUT_FORMATS = ("csv", "jsonl", "parquet")
+_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+# Rows per Parquet row group; Parquet is columnar, so rows are buffered
+# this many at a time.
+PARQUET_BATCH_ROWS = 1024
+
+DEFAULT_SIMULATIONS = 10000
+
+# Statistics written for each predicted runner.
+PREDICT_STATISTICS = ("median", "mean_time", "std_dev", "p5", "p25", "p75", "p95", "dnf_rate")
+
+
+class BatchError(Exception):
+    """Bad arguments or input: reported without a traceback, exit status 2."""
+
+
+# ---------------------------------------------------------------------------
+# Input
+# ---------------------------------------------------------------------------
+def _pb_seconds(value, where):
+    text = str(value).strip()
+    try:
+        return float(time_to_seconds(text)) if ":" in text else float(text)
+    except ValueError:
+        raise BatchError(f"{where}: invalid PB {value!r}") from None
+
+
+def load_runners(path=None):
+    """List of (name, pb string, pb seconds) from a CSV or JSON file, or the
+    2026 elite men's field when ``path`` is None."""
+    if path is None:
+        from runners import ELITE_MEN_2026
+        return [(name, pb, _pb_seconds(pb, "runners.py")) for name, pb in ELITE_MEN_2026.items()]
+
+    try:
+        with open(path, newline="") as f:
+            if path.lower().endswith(".json"):
+                return _json_runners(json.load(f), path)
+            return _csv_runners(csv.DictReader(f), path)
+    except OSError as e:
+        raise BatchError(f"{path}: {e.strerror}") from None
+    except json.JSONDecodeError as e:
+        raise BatchError(f"{path}: invalid JSON ({e})") from None
+
+
+def _csv_runners(reader, path):
+    missing = {"runner", "pb"} - set(reader.fieldnames or ())
+    if missing:
+        raise BatchError(f"{path}: missing column(s) {sorted(missing)}")
+    runners = [(row["runner"], row["pb"].strip(), _pb_seconds(row["pb"], f"{path}:{line}"))
+               for line, row in enumerate(reader, 2)]
+    return _non_empty(runners, path)
+
+
+def _json_runners(data, path):
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list) and all(isinstance(r, dict) and {"runner", "pb"} <= set(r) for r in data):
+        items = [(r["runner"], r["pb"]) for r in data]
+    else:
+        raise BatchError(f"{path}: expected an object of name → PB or a list of "
+                         '{"runner": ..., "pb": ...} objects')
+    runners = [(str(name), str(pb), _pb_seconds(pb, f"{path}: {name}")) for name, pb in items]
+    return _non_empty(runners, path)
+
+
+def _non_empty(runners, path):
+    if not runners:
+        raise BatchError(f"{path}: no runners")
+    return runners
+
+
+def _load_scenarios(path):
+    try:
+        with open(path) as f:
+            scenarios = json.load(f)
+    except OSError as e:
+        raise BatchError(f"{path}: {e.strerror}") from None
+    except json.JSONDecodeError as e:
+        raise BatchError(f"{path}: invalid JSON ({e})") from None
+    if not isinstance(scenarios, list) or not scenarios:
+        raise BatchError(f"{path}: expected a non-empty list of scenarios")
+    return scenarios
+
+
+# ---------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------
+def _plain(value):
+    """A CSV/JSON/Parquet-friendly scalar: NumPy scalars unwrapped, inf/nan → None."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class _CsvWriter:
+    def __init__(self, stream):
+        self._stream = stream
+        self._writer = None
+
+    def write(self, row):
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._stream, fieldnames=list(row), lineterminator="\n")
+            self._writer.writeheader()
+        self._writer.writerow(row)
+        self._stream.flush()
+
+    def close(self):
+        pass
+
+
+class _JsonlWriter:
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, row):
+        self._stream.write(json.dumps(row) + "\n")
+        self._stream.flush()
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise BatchError("Parquet output needs pyarrow (pip install pyarrow)") from None
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._path = path
+        self._writer = None
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= PARQUET_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(
+            self._rows, schema=self._writer.schema if self._writer is not None else None)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+
+class RowSink:
+    """Writes dict rows to a file or stdout in one of ``OUTPUT_FORMATS``."""
+
+    def __init__(self, path=None, fmt=None):
+        fmt = fmt or _EXTENSIONS.get(os.path.splitext(path or "")[1].lower(), "csv")
+        if fmt not in OUTPUT_FORMATS:
+            raise BatchError(f"unknown output format {fmt!r} (expected one of {OUTPUT_FORMATS})")
+        self.rows = 0
+        self._file = None
+        if fmt == "parquet":
+            if path is None:
+                raise BatchError("Parquet output needs a file (-o FILE)")
+            self._writer = _ParquetWriter(path)
+            return
+        if path is None:
+            stream = sys.stdout
+        else:
+            try:
+                stream = self._file = open(path, "w", newline="")
+            except OSError as e:
+                raise BatchError(f"{path}: {e.strerror}") from None
+        self._writer = _CsvWriter(stream) if fmt == "csv" else _JsonlWriter(stream)
+
+    def write(self, row):
+        self._writer.write({k: _plain(v) for k, v in row.items()})
+        self.rows += 1
+
+    def close(self):
+        try:
+            self._writer.close()
+        finally:
+            if self._file is not None:
+                self._file.close()
+
+
+# ---------------------------------------------------------------------------
+# Commands
+# ---------------------------------------------------------------------------
+def _runner_seeds(seed, n):
+    import numpy as np
+    return np.random.SeedSequence(seed).spawn(n)
+
+
+def run_predict(args, sink):
+    """One row per (runner, temperature), written as each runner finishes.
+
+    Each runner's races are seeded from its own child of ``--seed``, shared
+    across temperatures, so temperature comparisons use common random numbers.
+    """
+    from sampling import SAMPLING_MODES
+    from simulation import simulate_race_per_km
+
+    if args.sampling is not None and args.sampling not in SAMPLING_MODES:
+        raise BatchError(f"unknown sampling mode {args.sampling!r} (expected one of {SAMPLING_MODES})")
+    runners = load_runners(args.runners)
+    for (name, pb, pb_seconds), seed in zip(runners, _runner_seeds(args.seed, len(runners))):
+        for temp in args.temp:
+            r = simulate_race_per_km(pb_seconds, temp_celsius=temp, simulations=args.simulations,
+                                     seed=seed, sampling=args.sampling)
+            finished = r["finishers"] > 0
+            sink.write({
+                "runner": name, "pb": pb, "temp_celsius": temp, "simulations": args.simulations,
+                "predicted_time": format_result_time(r, "median"),
+                **{k: r[k] if finished or k == "dnf_rate" else None for k in PREDICT_STATISTICS},
+            })
+
+
+def run_leaderboard(args, sink):
+    """The ranked field at each temperature, with placing probabilities."""
+    from simulation import simulate_field
+
+    runners = load_runners(args.runners)
+    pbs = [pb_seconds for _, _, pb_seconds in runners]
+    for temp in args.temp:
+        results = simulate_field(pbs, temp_celsius=temp, simulations=args.simulations, seed=args.seed)
+        # Same ordering as main.build_leaderboard: finishers by median, then likely DNFs.
+        order = sorted(range(len(runners)),
+                       key=lambda i: (results[i]["dnf_rate"] > 0.5, results[i]["median"]))
+        for rank, i in enumerate(order, 1):
+            name, pb, _ = runners[i]
+            r = results[i]
+            is_dnf = r["dnf_rate"] > 0.5
+            sink.write({
+                "temp_celsius": temp, "rank": rank, "runner": name, "pb": pb,
+                "predicted_time": "DNF" if is_dnf else format_result_time(r, "median"),
+                "median": r["median"] if r["finishers"] else None,
+                "win_prob": r["win_prob"], "podium_prob": r["podium_prob"],
+                "expected_position": r["expected_position"], "dnf_rate": r["dnf_rate"],
+                "status": "DNF" if is_dnf else "Finished",
+            })
+
+
+def run_sweep(args, sink):
+    """One row per (runner, scenario) from :func:`sweep.simulate_scenarios`."""
+    from sweep import simulate_scenarios, sweep_records, temperature_grid
+
+    runners = load_runners(args.runners)
+    if args.scenarios:
+        scenarios = _load_scenarios(args.scenarios)
+    elif args.temp_grid:
+        scenarios = temperature_grid(*args.temp_grid)
+    else:
+        scenarios = args.temp
+    try:
+        grid = simulate_scenarios([pb for _, _, pb in runners], scenarios,
+                                  simulations=args.simulations, seed=args.seed)
+    except ValueError as e:  # unknown scenario parameters
+        raise BatchError(str(e)) from None
+    for row in sweep_records(grid, [name for name, _, _ in runners]):
+        sink.write(row)
+
+
+COMMANDS = {
+    "predict": (run_predict, "simulate each runner on its own"),
+    "leaderboard": (run_leaderboard, "rank the field with head-to-head placing probabilities"),
+    "sweep": (run_sweep, "simulate the field across a scenario grid with common random numbers"),
+}
+
+
+def add_commands(subparsers):
+    """Register the batch commands on ``main.py``'s argument parser."""
+    for name, (run, help_text) in COMMANDS.items():
+        p = subparsers.add_parser(name, help=help_text, description=help_text.capitalize() + ".")
+        p.add_argument("-r", "--runners", metavar="FILE",
+                       help="runner list (.csv or .json); default: the 2026 elite men's field")
+        p.add_argument("-t", "--temp", type=float, nargs="+", default=[15.0], metavar="C",
+                       help="race-day temperature(s) in °C (default: 15)")
+        p.add_argument("-n", "--simulations", type=_positive_int, default=DEFAULT_SIMULATIONS,
+                       help="simulations per runner (default: %(default)s)")
+        p.add_argument("--seed", type=int, help="seed for reproducible output")
+        p.add_argument("-o", "--output", metavar="FILE", help="write here instead of stdout")
+        p.add_argument("-f", "--format", choices=OUTPUT_FORMATS,
+                       help="output format (default: from the file extension, else csv)")
+        if name == "predict":
+            # sampling.SAMPLING_MODES, checked when the command runs (it imports NumPy)
+            p.add_argument("--sampling", metavar="MODE",
+                           help="variance-reduction mode for the fatigue draws "
+                                "(random, antithetic, lhs, sobol, stratified)")
+        if name == "sweep":
+            p.add_argument("--temp-grid", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+                           help="temperatures from START to STOP inclusive (instead of --temp)")
+            p.add_argument("--scenarios", metavar="FILE",
+                           help="JSON list of scenario objects (see sweep.SCENARIO_DEFAULTS)")
+        p.set_defaults(run=run)
+
+
+def _positive_int(value):
+    try:
+        n = int(value)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+    return n
+
+
+def run_command(args):
+    """Run a parsed batch command and return its exit status."""
+    try:
+        sink = RowSink(args.output, args.format)
+        try:
+            args.run(args, sink)
+        finally:
+            sink.close()
+    except BatchError as e:
+        print(f"  ✗ {e}", file=sys.stderr)
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # the reader (e.g. ``| head``) went away — not a failure of the run
+        sys.stdout = open(os.devnull, "w")
+        return EXIT_OK
+    except Exception as e:
+        print(f"  ✗ {args.command} failed: {type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+    print(f"  ✓ {sink.rows} row(s)" + (f" written to {args.output}" if args.output else ""),
+          file=sys.stderr)
+    return EXIT_OK
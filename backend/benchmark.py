@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the simulation, course and leaderboard hot paths.
+
+    python benchmark.py                         # run and print
+    python benchmark.py -o bench.json           # also write JSON results
+    python benchmark.py -b baseline.json        # fail if >10% slower than baseline
+    python benchmark.py --quick --only simulate # subset, smaller sizes
+    python benchmark.py --only none --convergence  # sampling-mode convergence curves
+    python benchmark.py --only startup --imports   # cold start and -X importtime
+
+Each case reports best-of-N wall time, throughput in simulated race-km per
+second where that makes sense, and peak traced memory (from a separate,
+tracemalloc-instrumented run so tracing doesn't skew the timings).  With a
+baseline, any case whose best time grows by more than ``--threshold`` is a
+regression and the exit status is 1.
+"""
+
+import argparse
+import atexit
+import gzip
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import course
+import segments
+from runners import ELITE_MEN_2026
+from sampling import SAMPLING_MODES
+from simulation import NUM_KM, simulate_field, simulate_race_per_km
+from timefmt import time_to_seconds
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.10
+
+# Registered cases: (name, sizes, setup) where setup(size) returns
+# (callable, simulated race-km per call or None).
+_CASES = []
+
+
+def case(name, sizes=None):
+    """Register a benchmark case.  The decorated function takes the case's
+    size and returns ``(fn, race_km)``.
+
+    ``sizes`` is ``(full, quick)``: the size used without and with
+    ``--quick``, filled into the name's ``{size}`` field so results and
+    baselines are keyed by the workload actually run.  Unsized cases get None.
+    """
+    def register(setup):
+        _CASES.append((name, sizes, setup))
+        return setup
+    return register
+
+
+def _size_label(n):
+    return f"{n // 1000}k" if n >= 1000 and n % 1000 == 0 else str(n)
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+@case("course.parse_gpx")
+def _bench_parse_gpx(size):
+    return lambda: course._parse_gpx(course.DEFAULT_GPX), None
+
+
+def _synthetic_gpx(n_points, compress):
+    """Write an ``n_points`` watch-style export of the default course to a temp file."""
+    _, pts = course._parse_gpx(course.DEFAULT_GPX)
+    t = np.linspace(0, len(pts) - 1, n_points)
+    src = np.arange(len(pts))
+    lat, lon, ele = (np.interp(t, src, pts[:, i]) for i in range(3))
+    body = "".join(
+        f'<trkpt lat="{a:.7f}" lon="{b:.7f}"><ele>{e:.1f}</ele><time>2025-04-27T09:00:00Z</time></trkpt>\n'
+        for a, b, e in zip(lat, lon, ele)
+    )
+    xml = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><name>synthetic</name>'
+           f"<trkseg>\n{body}</trkseg></trk></gpx>\n").encode()
+    tmpdir = tempfile.mkdtemp(prefix="bench-gpx-")
+    atexit.register(shutil.rmtree, tmpdir, ignore_errors=True)
+    path = os.path.join(tmpdir, "course.gpx" + (".gz" if compress else ""))
+    with (gzip.open if compress else open)(path, "wb") as f:
+        f.write(xml)
+    return path
+
+
+def _large_gpx_case(compress):
+    def setup(n_points):
+        path = _synthetic_gpx(n_points, compress)
+        return lambda: course._parse_gpx(path), None
+    return setup
+
+
+for _gz in (False, True):
+    case(f"course.parse_gpx[{{size}} points{', gzip' if _gz else ''}]",
+         sizes=(100_000, 10_000))(_large_gpx_case(_gz))
+
+
+@case("course.load_compiled")
+def _bench_load_compiled(size):
+    tmpdir = tempfile.mkdtemp(prefix="bench-course-")
+    atexit.register(shutil.rmtree, tmpdir, ignore_errors=True)
+    path = course.compile_course(course.DEFAULT_GPX, os.path.join(tmpdir, "london.course"))
+    return lambda: course.load_compiled_course(path), None
+
+
+@case("course.compute_km_multipliers")
+def _bench_multipliers(size):
+    c = course.load_course()
+    return lambda: course._compute_km_multipliers(c.cum_dist, c.elevation), None
+
+
+def _bench_single_runner(sims):
+    course.load_course()  # exclude the one-off GPX parse
+    return (lambda: simulate_race_per_km(2 * 3600 + 2 * 60 + 5, simulations=sims, seed=0),
+            sims * NUM_KM)
+
+
+for _sims in (1_000, 10_000, 100_000):
+    case("simulate_race_per_km[{size}]", sizes=(_sims, _sims // 10))(_bench_single_runner)
+
+
+@case("simulate_race_segments[100m, {size}]", sizes=(100_000, 10_000))
+def _bench_segments(sims):
+    course.load_course()
+    segments.segment_plan()
+    return (lambda: segments.simulate_race_segments(2 * 3600 + 2 * 60 + 5, simulations=sims, seed=0),
+            sims * segments.RACE_DISTANCE_M / 1000)
+
+
+@case("leaderboard[35 runners, {size}]", sizes=(10_000, 1_000))
+def _bench_leaderboard(sims):
+    pbs = [time_to_seconds(pb) for pb in ELITE_MEN_2026.values()]
+    course.load_course()
+    return lambda: simulate_field(pbs, simulations=sims, seed=0), sims * NUM_KM * len(pbs)
+
+
+# ---------------------------------------------------------------------------
+# Cold start
+# ---------------------------------------------------------------------------
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Modules whose -X importtime breakdown --imports reports.
+STARTUP_MODULES = ("main", "course", "simulation", "server")
+
+
+def _python(*args, stdin=None):
+    """Run a fresh interpreter in this directory; return the completed process."""
+    return subprocess.run([sys.executable, *args], cwd=HERE, input=stdin, capture_output=True,
+                          text=True, check=False)
+
+
+def _import_case(module):
+    def setup(size):
+        return lambda: _python("-c", f"import {module}"), None
+    return setup
+
+
+for _module in ("main", "simulation"):
+    case(f"startup.import[{_module}]")(_import_case(_module))
+
+
+@case("startup.first_prompt")
+def _bench_first_prompt(size):
+    # The menu with no warm-up, quitting at the first prompt.
+    return lambda: _python("main.py", "--no-warmup", stdin="q\n"), None
+
+
+def import_times(modules=STARTUP_MODULES, top=5):
+    """``-X importtime`` for each module in a fresh interpreter: its cumulative
+    import time and the ``top`` imports by self time, in milliseconds.
+
+    Modules that fail to import (a missing optional dependency) are skipped.
+    """
+    report = []
+    for module in modules:
+        proc = _python("-X", "importtime", "-c", f"import {module}")
+        if proc.returncode != 0:
+            continue
+        # Lines come out in completion order, children (indented) before
+        # their parent, so the module's subtree is everything since the
+        # previous top-level import — site.py's own imports come before it.
+        rows = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            if not self_us.strip().isdigit():
+                continue  # header
+            if not name[1:].startswith(" "):
+                if name.strip() == module:
+                    rows.append((name.strip(), int(self_us) / 1e3, int(cumulative_us) / 1e3))
+                    break
+                rows = []
+                continue
+            rows.append((name.strip(), int(self_us) / 1e3, int(cumulative_us) / 1e3))
+        total = rows[-1][2]
+        heaviest = sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+        report.append({
+            "module": module,
+            "cumulative_ms": total,
+            "heaviest": [{"module": name, "self_ms": self_ms} for name, self_ms, _ in heaviest],
+        })
+    return report
+
+
+def _print_import_times(report):
+    print(f"  {'Module':<12s}  {'Import':>9s}  Heaviest (self time)")
+    print(f"  {'─' * 12}  {'─' * 9}  {'─' * 50}")
+    for r in report:
+        heaviest = ", ".join(f"{h['module']} {h['self_ms']:.1f}" for h in r["heaviest"][:3])
+        print(f"  {r['module']:<12s}  {r['cumulative_ms']:7.1f}ms  {heaviest}")
+
+
+# ---------------------------------------------------------------------------
+# Sampling-mode convergence
+# ---------------------------------------------------------------------------
+CONVERGENCE_SIZES = (1_000, 2_000, 5_000, 10_000, 20_000)
+CONVERGENCE_TRIALS = 40
+CONVERGENCE_REFERENCE_SIMS = 2_000_000
+
+
+def convergence_curves(sizes=CONVERGENCE_SIZES, trials=CONVERGENCE_TRIALS, modes=SAMPLING_MODES,
+                       pb_seconds=2 * 3600 + 2 * 60 + 5):
+    """RMSE of the median and mean vs a large reference run, per sampling
+    mode and simulation count, over ``trials`` seeds.
+
+    ``variance_reduction`` is the random mode's MSE divided by the mode's at
+    the same size — how many times fewer simulations the mode needs.
+    """
+    ref = simulate_race_per_km(pb_seconds, simulations=CONVERGENCE_REFERENCE_SIMS, seed=12345,
+                               sampling="lhs")
+    curves = []
+    for mode in modes:
+        for n in sizes:
+            runs = [simulate_race_per_km(pb_seconds, simulations=n, seed=1000 + t, sampling=mode)
+                    for t in range(trials)]
+            curves.append({
+                "mode": mode,
+                "simulations": n,
+                "rmse_median": float(np.sqrt(np.mean([(r["median"] - ref["median"]) ** 2 for r in runs]))),
+                "rmse_mean": float(np.sqrt(np.mean([(r["mean_time"] - ref["mean_time"]) ** 2 for r in runs]))),
+            })
+    random_mse = {(c["simulations"], k): c[k] ** 2 for c in curves if c["mode"] == "random"
+                  for k in ("rmse_median", "rmse_mean")}
+    for c in curves:
+        c["variance_reduction"] = {
+            stat: random_mse[(c["simulations"], f"rmse_{stat}")] / c[f"rmse_{stat}"] ** 2
+            if (c["simulations"], f"rmse_{stat}") in random_mse and c[f"rmse_{stat}"] else None
+            for stat in ("median", "mean")
+        }
+    return curves
+
+
+def _print_convergence(curves):
+    print(f"  {'Mode':<12s}  {'Sims':>7s}  {'RMSE median':>11s}  {'RMSE mean':>10s}  {'VRF median':>10s}  {'VRF mean':>9s}")
+    print(f"  {'─' * 12}  {'─' * 7}  {'─' * 11}  {'─' * 10}  {'─' * 10}  {'─' * 9}")
+    for c in curves:
+        vrf = c["variance_reduction"]
+        fmt = lambda v: f"{v:.2f}×" if v is not None else "—"
+        print(f"  {c['mode']:<12s}  {c['simulations']:>7,d}  {c['rmse_median']:9.2f} s  {c['rmse_mean']:8.2f} s"
+              f"  {fmt(vrf['median']):>10s}  {fmt(vrf['mean']):>9s}")
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+def _measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def run_benchmarks(repeat=DEFAULT_REPEAT, quick=False, only=None):
+    """Run every registered case (or those whose name contains ``only``)."""
+    results = []
+    for name, sizes, setup in _CASES:
+        size = (sizes[1] if quick else sizes[0]) if sizes else None
+        if size is not None:
+            name = name.format(size=_size_label(size))
+        if only and only not in name:
+            continue
+        fn, race_km = setup(size)
+        fn()  # warm-up: imports, caches, allocator
+        times, peak = _measure(fn, repeat)
+        best = min(times)
+        results.append({
+            "name": name,
+            "size": size,
+            "best_seconds": best,
+            "mean_seconds": float(np.mean(times)),
+            "race_km_per_second": race_km / best if race_km else None,
+            "peak_memory_mb": peak / 1e6,
+        })
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return ``(name, baseline_s, current_s, ratio)`` for every case that got
+    more than ``threshold`` slower than ``baseline``."""
+    base = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = base.get(r["name"])
+        if b is None or not b["best_seconds"]:
+            continue
+        ratio = r["best_seconds"] / b["best_seconds"]
+        if ratio > 1 + threshold:
+            regressions.append((r["name"], b["best_seconds"], r["best_seconds"], ratio))
+    return regressions
+
+
+def _print_results(results):
+    print(f"  {'Case':<34s}  {'Best':>10s}  {'Mean':>10s}  {'race-km/s':>12s}  {'Peak MB':>8s}")
+    print(f"  {'─' * 34}  {'─' * 10}  {'─' * 10}  {'─' * 12}  {'─' * 8}")
+    for r in results:
+        rate = f"{r['race_km_per_second']:,.0f}" if r["race_km_per_second"] else "—"
+        print(f"  {r['name']:<34s}  {r['best_seconds'] * 1e3:8.2f}ms  {r['mean_seconds'] * 1e3:8.2f}ms"
+              f"  {rate:>12s}  {r['peak_memory_mb']:8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation hot paths.")
+    parser.add_argument("-o", "--output", help="write JSON results to this file")
+    parser.add_argument("-b", "--baseline", help="JSON results to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown vs baseline as a fraction (default: %(default)s)")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="timed runs per case (default: %(default)s)")
+    parser.add_argument("--quick", action="store_true", help="use smaller simulation counts")
+    parser.add_argument("--only", help="run only cases whose name contains this string")
+    parser.add_argument("--convergence", action="store_true",
+                        help="also compare the convergence of the fatigue sampling modes")
+    parser.add_argument("--imports", action="store_true",
+                        help="also report -X importtime for the entry-point modules")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(repeat=args.repeat, quick=args.quick, only=args.only)
+    _print_results(results)
+
+    imports = None
+    if args.imports:
+        imports = import_times()
+        print()
+        _print_import_times(imports)
+
+    curves = None
+    if args.convergence:
+        trials = CONVERGENCE_TRIALS // 4 if args.quick else CONVERGENCE_TRIALS
+        curves = convergence_curves(trials=trials)
+        print()
+        _print_convergence(curves)
+
+    if args.output:
+        payload = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "quick": args.quick,
+            "results": results,
+        }
+        if imports is not None:
+            payload["imports"] = imports
+        if curves is not None:
+            payload["convergence"] = curves
+        with open(args.output, "w") as f:
+            json.dump(payload, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != args.quick:
+            print("\n  ! Baseline and current run differ in --quick; only cases of the same size are compared.")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n  ✗ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for name, before, after, ratio in regressions:
+                print(f"    {name:<34s}  {before * 1e3:8.2f}ms → {after * 1e3:8.2f}ms  ({ratio:.2f}×)")
+            return 1
+        print(f"\n  ✓ No regressions beyond {args.threshold:.0%} vs {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Deterministic result cache for seeded predictions.
+
+A seeded simulation is a pure function of its inputs, so its result can be
+reused.  Keys combine the request arguments with :func:`simulation.course_hash`
+and :func:`simulation.model_parameter_hash`, so a different course file or a
+retuned model never serves a stale answer.  A call without a seed runs with
+:func:`default_seed`, derived from its key, so it is just as reproducible and
+is cached too; pass an explicit seed for a different draw.
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from instrumentation import cache_lookup
+from simulation import (
+    DEFAULT_TEMP_C,
+    course_hash,
+    model_parameter_hash,
+    simulate_field,
+    simulate_race_per_km,
+)
+
+DEFAULT_MAXSIZE = 1024
+DEFAULT_TTL_SECONDS = 3600.0
+
+
+class ResultCache:
+    """Thread-safe LRU cache with an optional per-entry time-to-live.
+
+    ``ttl=None`` keeps entries until they are evicted by size.  ``name``
+    labels the cache's hit/miss counters in :mod:`instrumentation`.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL_SECONDS, clock=time.monotonic,
+                 name="result"):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be positive, got {maxsize}")
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return ``(True, value)`` on a hit, ``(False, None)`` on a miss."""
+        hit, value = self._get(key)
+        cache_lookup(self.name, hit)
+        return hit, value
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, value):
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, calling ``compute()`` on a miss.
+
+        The lock is not held while computing, so two threads missing on the
+        same key may both compute it; the results are identical.
+        """
+        hit, value = self.get(key)
+        if not hit:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+RESULT_CACHE = ResultCache()
+
+
+def _seed_key(seed):
+    if seed is None:
+        return None
+    if isinstance(seed, np.random.SeedSequence):
+        return ("seedseq", seed.entropy, tuple(seed.spawn_key))
+    return int(seed)
+
+
+def default_seed(key):
+    """Seed for a call made without one: a hash of its cache key (built with
+    ``seed=None``), so repeating the call repeats — and can reuse — the result."""
+    return int.from_bytes(hashlib.sha256(repr(key).encode()).digest()[:8], "little")
+
+
+def _copy_result(result):
+    # Results hold numpy arrays; hand out copies so callers can't mutate the cache.
+    return copy.deepcopy(result)
+
+
+def race_cache_key(pb_seconds, temp_celsius, simulations, seed, course_profile=None):
+    """Cache key for a single-runner prediction."""
+    return ("race", float(pb_seconds), float(temp_celsius), int(simulations), _seed_key(seed),
+            course_hash(course_profile), model_parameter_hash())
+
+
+def field_cache_key(pb_seconds, temp_celsius, simulations, seed, course_profile=None):
+    """Cache key for a whole-field simulation."""
+    return ("field", tuple(float(pb) for pb in pb_seconds), float(temp_celsius), int(simulations),
+            _seed_key(seed), course_hash(course_profile), model_parameter_hash())
+
+
+def cached_simulate_race_per_km(pb_seconds, temp_celsius=DEFAULT_TEMP_C, simulations=10000,
+                                seed=None, course_profile=None, cache=RESULT_CACHE):
+    """:func:`simulation.simulate_race_per_km` through the result cache.
+
+    ``seed=None`` uses :func:`default_seed`, so unseeded calls are cached too.
+    """
+    key = race_cache_key(pb_seconds, temp_celsius, simulations, seed, course_profile)
+    if seed is None:
+        seed = default_seed(key)
+    result = cache.get_or_compute(key, lambda: simulate_race_per_km(
+        pb_seconds, temp_celsius=temp_celsius, simulations=simulations,
+        course_profile=course_profile, seed=seed,
+    ))
+    return _copy_result(result)
+
+
+def cached_simulate_field(pb_seconds, temp_celsius=DEFAULT_TEMP_C, simulations=10000,
+                          seed=None, course_profile=None, cache=RESULT_CACHE):
+    """:func:`simulation.simulate_field` through the result cache (unseeded
+    calls use :func:`default_seed`)."""
+    key = field_cache_key(pb_seconds, temp_celsius, simulations, seed, course_profile)
+    if seed is None:
+        seed = default_seed(key)
+    result = cache.get_or_compute(key, lambda: simulate_field(
+        pb_seconds, temp_celsius=temp_celsius, simulations=simulations,
+        course_profile=course_profile, seed=seed,
+    ))
+    return _copy_result(result)
+
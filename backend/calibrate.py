@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Fit the model's hand-set constants to historical race results.
+
+    python calibrate.py results.csv -o params.json
+    PREDICTOR_MODEL_PARAMS=params.json python main.py
+
+The CSV has one row per starter with columns ``runner``, ``pb``,
+``temp_celsius`` and ``finish_time``.  Times are ``H:MM:SS``, ``MM:SS`` or
+seconds; a blank finish time or ``DNF`` marks a DNF.  Rows are assumed to
+be on the simulated course (London by default).
+
+What is fitted:
+
+  DNF_BASE_RATES       per tier, binomial maximum likelihood (DNFs / starters)
+  FATIGUE_TIERS        per tier log-normal median and sigma  ┐ simulated method
+  HEAT_PENALTY_PER_C                                         │ of moments on
+  NOISE_SIGMA_START, NOISE_SIGMA_GROWTH                      ┘ finish / PB
+
+Tier boundaries, the spike model and the heat optimum stay fixed.
+
+Simulated moments use common random numbers: every record gets ``draws``
+simulated races whose random components (fatigue normals, per-km noise and
+spikes) are drawn once.  A finish time is linear in the heat penalty and the
+two noise constants for fixed draws, so the per-km sums are contracted up
+front and each objective evaluation is a handful of (records, draws) array
+operations — about 10 ms for 1,500 records × 200 draws.  The moments are per-tier
+quantiles of finish / PB and the slope of finish / PB on heat excess, each
+scaled by its approximate standard error; a weak prior in log space keeps
+parameters the data barely constrain near their current values.  Finish
+times alone separate fatigue from late-race noise only weakly, so treat the
+noise constants and fatigue sigmas as a joint fit rather than individually.
+
+The prior adds ``prior_weight × Σ (log θ − log θ_current)²`` to the
+objective: at the default weight of 1.0, moving a parameter by a factor of
+e costs as much as one moment sitting one standard error off.  That pulls
+hard only where the moments are flat.  On synthetic data (true heat penalty
+0.0008, current 0.0003, 1,500 records) weights of 1.0 and 0 both fit 0.00086.
+With 300 records both fit about 0.00042, so that error is sampling noise,
+not the prior.  ``fit["prior_penalty"]`` reports the prior's share of the
+final objective; lower ``--prior-weight`` (0 disables it) if it is large.
+"""
+
+import argparse
+import csv
+import hashlib
+import math
+import sys
+
+import numpy as np
+import model
+from model import fatigue_shape
+from simulation import KM_DISTANCES, NUM_KM, _resolve_course_profile
+from timefmt import time_to_seconds
+
+DEFAULT_DRAWS = 200
+DEFAULT_PRIOR_WEIGHT = 1.0
+DEFAULT_MAX_EVALS = 4000
+
+# Quantiles of finish / PB matched per fatigue tier.
+MOMENT_QUANTILES = (0.10, 0.25, 0.50, 0.75, 0.90)
+
+# Records per chunk when contracting the (records, draws, 42) noise array.
+_CHUNK_ELEMENTS = 2_000_000
+
+
+# ---------------------------------------------------------------------------
+# Input
+# ---------------------------------------------------------------------------
+def _parse_time(value):
+    value = value.strip()
+    if ":" in value:
+        return float(time_to_seconds(value))
+    return float(value)
+
+
+def load_results(path):
+    """Read a results CSV into arrays: runner (list), pb, temp_celsius, finish (NaN = DNF)."""
+    runners, pbs, temps, finishes = [], [], [], []
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = {"pb", "temp_celsius", "finish_time"} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {sorted(missing)}")
+        for line, row in enumerate(reader, 2):
+            try:
+                finish = (row["finish_time"] or "").strip()
+                runners.append(row.get("runner", ""))
+                pbs.append(_parse_time(row["pb"]))
+                temps.append(float(row["temp_celsius"]))
+                finishes.append(math.nan if finish.upper() in ("", "DNF") else _parse_time(finish))
+            except ValueError as e:
+                raise ValueError(f"{path}:{line}: {e}") from None
+    if not pbs:
+        raise ValueError(f"{path}: no results")
+    return {
+        "runner": runners,
+        "pb": np.array(pbs),
+        "temp_celsius": np.array(temps),
+        "finish": np.array(finishes),
+    }
+
+
+def _tier_index(pbs, tiers):
+    bounds = np.array([t[0] for t in tiers])
+    return np.minimum(np.searchsorted(bounds, pbs, side="left"), len(tiers) - 1)
+
+
+# ---------------------------------------------------------------------------
+# DNF rates — closed-form maximum likelihood
+# ---------------------------------------------------------------------------
+def fit_dnf_rates(results):
+    """Per-tier DNF fraction; tiers without starters keep their current rate."""
+    tier = _tier_index(results["pb"], model.DNF_BASE_RATES)
+    dnf = np.isnan(results["finish"])
+    rates = []
+    for t, (bound, rate) in enumerate(model.DNF_BASE_RATES):
+        starters = int((tier == t).sum())
+        rates.append((bound, float(dnf[tier == t].mean()) if starters else rate))
+    return rates
+
+
+# ---------------------------------------------------------------------------
+# Simulated finish / PB with common random numbers
+# ---------------------------------------------------------------------------
+# For record i and draw m, with σ_k = s0 + g·r_k and heat excess x_i:
+#
+#   finish / PB = (1 / 42.195) Σ_k c_k (1 + pen·x_i·d_k) (1 + σ_k e_ikm) (1 + fc_im s_k)
+#
+# c: course multipliers, d: heat drift, r: noise ramp, s: fatigue shape,
+# e: standardised noise (Gaussian + spikes).  Expanding the product leaves
+# eight noise sums Σ_k w_k e_ikm per (i, m), one per weight vector below.
+_WEIGHTS = ("c", "cd", "cr", "crd", "cs", "csd", "crs", "crsd")
+
+
+def _crn_panel(pbs, temps, draws, seed, course_profile=None):
+    """Draw the common random numbers once and contract them over km."""
+    rng = np.random.default_rng(seed)
+    n = len(pbs)
+    c = _resolve_course_profile(course_profile)
+    # per °C of excess and unit penalty, the heat slowdown is excess × penalty × d
+    d = model.heat_multipliers(KM_DISTANCES, model.OPTIMAL_TEMP_C + 1.0, penalty_per_c=1.0) - 1.0
+    r = model.noise_sigma(KM_DISTANCES, start=0.0, growth=1.0)
+    s = fatigue_shape(KM_DISTANCES)
+    vec = {"c": c, "d": d, "r": r, "s": s}
+    weights = np.stack([np.prod([vec[ch] for ch in name], axis=0) for name in _WEIGHTS])
+
+    fc_z = rng.standard_normal((n, draws))
+    noise = np.empty((len(_WEIGHTS), n, draws))
+    chunk = max(1, _CHUNK_ELEMENTS // (draws * NUM_KM))
+    for start in range(0, n, chunk):
+        k = min(chunk, n - start)
+        e = rng.standard_normal((k, draws, NUM_KM))
+        spikes = rng.random((k, draws, NUM_KM)) < model.SPIKE_PROB
+        e += spikes * rng.standard_exponential((k, draws, NUM_KM)) * model.SPIKE_SCALE
+        noise[:, start:start + k] = np.einsum("imk,wk->wim", e, weights)
+
+    return {
+        "fc_z": fc_z,
+        "noise": dict(zip(_WEIGHTS, noise)),
+        "sums": {name: float(w.sum()) for name, w in zip(_WEIGHTS, weights)},
+        "excess": np.maximum(temps - model.OPTIMAL_TEMP_C, 0.0)[:, None],
+    }
+
+
+def _simulated_ratios(panel, mu, sigma, penalty, s0, growth):
+    """(records, draws) simulated finish / PB.  ``mu``/``sigma`` are per record."""
+    T, S, x = panel["noise"], panel["sums"], panel["excess"]
+    px = penalty * x
+    base = S["c"] + px * S["cd"] + s0 * (T["c"] + px * T["cd"]) + growth * (T["cr"] + px * T["crd"])
+    fatigue = (S["cs"] + px * S["csd"] + s0 * (T["cs"] + px * T["csd"])
+               + growth * (T["crs"] + px * T["crsd"]))
+    fc = np.exp(mu[:, None] + sigma[:, None] * panel["fc_z"])
+    return (base + fc * fatigue) / 42.195
+
+
+# ---------------------------------------------------------------------------
+# Moments and objective
+# ---------------------------------------------------------------------------
+def _moments(ratio, tier, tiers_fitted, excess, fit_heat):
+    """Moment vector: per-tier quantiles of ``ratio`` (records, draws), then
+    the within-tier slope of the per-record mean ratio on heat excess."""
+    out = []
+    for t in tiers_fitted:
+        out.extend(np.quantile(ratio[tier == t], MOMENT_QUANTILES))
+    if fit_heat:
+        y = _demean(ratio.mean(axis=1), tier)
+        xc = excess - excess.mean()
+        out.append((xc * y).sum() / (xc * xc).sum())
+    return np.array(out)
+
+
+def _demean(y, tier):
+    means = np.zeros(tier.max() + 1)
+    np.add.at(means, tier, y)
+    return y - (means / np.bincount(tier, minlength=len(means)))[tier]
+
+
+def _moment_scales(ratio, tier, tiers_fitted, excess, fit_heat):
+    """Approximate standard error of each data moment."""
+    out = []
+    for t in tiers_fitted:
+        y = ratio[tier == t]
+        out.extend([y.std(ddof=1) / math.sqrt(len(y)) if len(y) > 1 else 1e-3] * len(MOMENT_QUANTILES))
+    if fit_heat:
+        y = _demean(ratio, tier)
+        xc = excess - excess.mean()
+        sxx = (xc * xc).sum()
+        slope = (xc * y).sum() / sxx
+        resid = y - slope * xc
+        out.append(resid.std(ddof=1) / math.sqrt(sxx))
+    return np.maximum(np.array(out), 1e-6)
+
+
+def _nelder_mead(f, x0, step=0.3, max_evals=DEFAULT_MAX_EVALS, xtol=1e-4, ftol=1e-8):
+    """Minimise ``f`` from ``x0`` with the Nelder–Mead simplex (no SciPy needed).
+
+    Returns ``(x, f(x), evaluations)``.
+    """
+    n = len(x0)
+    simplex = np.vstack([x0] + [x0 + step * np.eye(n)[i] for i in range(n)])
+    values = np.array([f(x) for x in simplex])
+    evals = n + 1
+
+    while evals < max_evals:
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if (np.abs(simplex[1:] - simplex[0]).max() < xtol
+                and values[-1] - values[0] < ftol * (1 + abs(values[0]))):
+            break
+
+        centroid = simplex[:-1].mean(axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        fr = f(reflected)
+        evals += 1
+        if fr < values[0]:
+            expanded = centroid + 2 * (centroid - simplex[-1])
+            fe = f(expanded)
+            evals += 1
+            simplex[-1], values[-1] = (expanded, fe) if fe < fr else (reflected, fr)
+        elif fr < values[-2]:
+            simplex[-1], values[-1] = reflected, fr
+        else:
+            # contract towards the better of the reflected and worst points
+            target = reflected if fr < values[-1] else simplex[-1]
+            contracted = centroid + 0.5 * (target - centroid)
+            fc = f(contracted)
+            evals += 1
+            if fc < min(fr, values[-1]):
+                simplex[-1], values[-1] = contracted, fc
+            else:  # shrink towards the best vertex
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                values[1:] = [f(x) for x in simplex[1:]]
+                evals += n
+
+    best = np.argmin(values)
+    return simplex[best], float(values[best]), evals
+
+
+# ---------------------------------------------------------------------------
+# Fit
+# ---------------------------------------------------------------------------
+def calibrate(results, draws=DEFAULT_DRAWS, seed=0, course_profile=None,
+              prior_weight=DEFAULT_PRIOR_WEIGHT, max_evals=DEFAULT_MAX_EVALS):
+    """Fit model parameters to ``results`` (see :func:`load_results`).
+
+    Returns ``(parameters, fit)``: a dict in the :func:`model.current_parameters`
+    format, and diagnostics (record counts, objective before and after,
+    evaluations, the prior's share of the final objective, and the data vs
+    simulated moments).  Fatigue tiers without
+    finishers and, when no race was run above ``model.OPTIMAL_TEMP_C``, the
+    heat penalty keep their current values.
+    """
+    params = model.current_parameters()
+    params["dnf_base_rates"] = [[None if math.isinf(b) else b, r] for b, r in fit_dnf_rates(results)]
+
+    done = ~np.isnan(results["finish"])
+    pbs, temps = results["pb"][done], results["temp_celsius"][done]
+    ratio = results["finish"][done] / pbs
+    tiers = model.FATIGUE_TIERS
+    tier = _tier_index(pbs, tiers)
+    counts = np.bincount(tier, minlength=len(tiers))
+    tiers_fitted = [t for t in range(len(tiers)) if counts[t] >= len(MOMENT_QUANTILES)]
+    excess = np.maximum(temps - model.OPTIMAL_TEMP_C, 0.0)
+    fit_heat = bool(np.ptp(excess) > 0) if len(excess) else False
+
+    fit = {"records": len(results["pb"]), "finishers": int(done.sum()), "draws": draws, "seed": seed,
+           "tiers_fitted": tiers_fitted, "heat_fitted": fit_heat}
+    if not tiers_fitted:
+        fit["note"] = "too few finishers per tier; only DNF rates were fitted"
+        return params, fit
+
+    panel = _crn_panel(pbs, temps, draws, seed, course_profile)
+    target = _moments(ratio[:, None], tier, tiers_fitted, excess, fit_heat)
+    scale = _moment_scales(ratio, tier, tiers_fitted, excess, fit_heat)
+
+    # θ (log space): per fitted tier (median, sigma), then penalty?, s0, growth
+    theta0 = np.log(np.concatenate([
+        [v for t in tiers_fitted for v in tiers[t][1:]],
+        [model.HEAT_PENALTY_PER_C] if fit_heat else [],
+        [model.NOISE_SIGMA_START, model.NOISE_SIGMA_GROWTH],
+    ]))
+    mu_all = np.log([t[1] for t in tiers])
+    sigma_all = np.array([t[2] for t in tiers])
+
+    def unpack(theta):
+        mu, sigma = mu_all.copy(), sigma_all.copy()
+        for j, t in enumerate(tiers_fitted):
+            mu[t] = theta[2 * j]
+            sigma[t] = math.exp(theta[2 * j + 1])
+        rest = np.exp(theta[2 * len(tiers_fitted):])
+        penalty = rest[0] if fit_heat else model.HEAT_PENALTY_PER_C
+        return mu, sigma, penalty, rest[-2], rest[-1]
+
+    def simulated(theta):
+        mu, sigma, penalty, s0, growth = unpack(theta)
+        sim = _simulated_ratios(panel, mu[tier], sigma[tier], penalty, s0, growth)
+        return _moments(sim, tier, tiers_fitted, excess, fit_heat)
+
+    def prior(theta):
+        return prior_weight * float(((theta - theta0) ** 2).sum())
+
+    def objective(theta):
+        z = (simulated(theta) - target) / scale
+        return float(z @ z) + prior(theta)
+
+    f0 = objective(theta0)
+    theta, f1, evals = _nelder_mead(objective, theta0, max_evals=max_evals)
+    mu, sigma, penalty, s0, growth = unpack(theta)
+
+    params["fatigue_tiers"] = [[None if math.isinf(b) else b, float(math.exp(mu[t])), float(sigma[t])]
+                               for t, (b, _, _) in enumerate(tiers)]
+    params["heat_penalty_per_c"] = float(penalty)
+    params["noise_sigma_start"] = float(s0)
+    params["noise_sigma_growth"] = float(growth)
+
+    fit.update({
+        "objective_initial": f0,
+        "objective_final": f1,
+        "prior_weight": prior_weight,
+        "prior_penalty": prior(theta),
+        "evaluations": evals,
+        "moments": {"data": target.tolist(), "fitted": simulated(theta).tolist(),
+                    "initial": simulated(theta0).tolist()},
+    })
+    return params, fit
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit model parameters to historical results.")
+    parser.add_argument("results", help="CSV with runner, pb, temp_celsius, finish_time columns")
+    parser.add_argument("-o", "--output", default="model_params.json",
+                        help="parameter file to write (default: %(default)s)")
+    parser.add_argument("--draws", type=int, default=DEFAULT_DRAWS,
+                        help="simulated races per record (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the common random numbers")
+    parser.add_argument("--prior-weight", type=float, default=DEFAULT_PRIOR_WEIGHT,
+                        help="log-space pull towards the current constants; 0 disables it "
+                             "(default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    try:
+        results = load_results(args.results)
+    except (OSError, ValueError) as e:
+        print(f"  ✗ {e}", file=sys.stderr)
+        return 1
+
+    before = model.current_parameters()
+    params, fit = calibrate(results, draws=args.draws, seed=args.seed, prior_weight=args.prior_weight)
+    model.save_parameters(args.output, params, fit=fit,
+                          source={"path": args.results, "sha256": _file_hash(args.results)})
+
+    print(f"  {fit['records']} records, {fit['finishers']} finishers")
+    if "objective_final" in fit:
+        print(f"  objective {fit['objective_initial']:.1f} → {fit['objective_final']:.1f}"
+              f"  ({fit['evaluations']} evaluations, prior {fit['prior_penalty']:.1f})")
+    for key in ("heat_penalty_per_c", "noise_sigma_start", "noise_sigma_growth"):
+        print(f"  {key:<20s} {before[key]:.6f} → {params[key]:.6f}")
+    for (b, c0, s0), (_, c1, s1) in zip(before["fatigue_tiers"], params["fatigue_tiers"]):
+        label = "open" if b is None else f"≤{b:.0f}s"
+        print(f"  fatigue {label:<12s} median {c0:.5f} → {c1:.5f}   sigma {s0:.2f} → {s1:.2f}")
+    for (b, r0), (_, r1) in zip(before["dnf_base_rates"], params["dnf_base_rates"]):
+        label = "open" if b is None else f"≤{b:.0f}s"
+        print(f"  dnf     {label:<12s} {r0:.3f} → {r1:.3f}")
+    print(f"\n  Wrote {args.output} — use it with {model.PARAMS_ENV}={args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
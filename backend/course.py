@@ -1,7 +1,16 @@
 import numpy as np
 import xml.etree.ElementTree as ET
-import math
+import argparse
+import gzip
+import hashlib
+import json
 import os
+import struct
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from instrumentation import cache_lookup, phase, timed
 
 # Pace multiplier model:
 #   Uphill:   +0.033% per metre of elevation gain
@@ -9,7 +18,9 @@ import os
 GAIN_FACTOR = 0.00033
 LOSS_FACTOR = 0.00018
 
-GPX_NS = {"gpx": "http://www.topografix.com/GPX/1/1"}
+# How many parsed courses (file version × num_km × track) to keep.
+COURSE_CACHE_SIZE = 16
+
 DEFAULT_GPX = os.path.join(
     os.path.dirname(__file__),
     "gpx_20250427_id10099_race1_20241212094041.gpx",
@@ -17,89 +28,467 @@ DEFAULT_GPX = os.path.join(
 
 
 def _haversine(lat1, lon1, lat2, lon2):
-    """Great-circle distance in metres between two GPS points."""
+    """Great-circle distance in metres between GPS points (scalars or arrays)."""
     R = 6_371_000
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlam = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
-    return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dlam = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
 
-def _parse_gpx(gpx_path):
-    """Return lists of cumulative distances (m) and elevations (m) from a GPX file."""
-    tree = ET.parse(gpx_path)
-    root = tree.getroot()
+# ---------------------------------------------------------------------------
+# GPX reader
+# ---------------------------------------------------------------------------
+# High-resolution watch exports run to 100k+ trackpoints, so the file is
+# streamed with ``iterparse``: every element is dropped from the tree as soon
+# as it has been read and coordinates go straight into preallocated arrays.
+# Gzip-compressed files are detected from their magic bytes.  Namespaces are
+# ignored, so GPX 1.0, 1.1 and un-namespaced files all work.
 
-    points = []
-    for trkpt in root.findall(".//gpx:trkpt", GPX_NS):
-        lat = float(trkpt.get("lat"))
-        lon = float(trkpt.get("lon"))
-        ele_elem = trkpt.find("gpx:ele", GPX_NS)
-        ele = float(ele_elem.text) if ele_elem is not None else 0.0
-        points.append((lat, lon, ele))
+GZIP_MAGIC = b"\x1f\x8b"
 
-    cum_dist = [0.0]
-    for i in range(1, len(points)):
-        d = _haversine(points[i - 1][0], points[i - 1][1], points[i][0], points[i][1])
-        cum_dist.append(cum_dist[-1] + d)
+# Bytes of XML per trackpoint are rarely below this, so file size / this is a
+# safe first guess at the point count (the buffer grows if it is not).
+_MIN_TRKPT_BYTES = 40
 
-    return cum_dist, points
 
+@dataclass(frozen=True)
+class GpxTrack:
+    """One ``<trk>``: its points in file order and where each ``<trkseg>`` starts."""
+    name: str | None
+    lat: np.ndarray
+    lon: np.ndarray
+    ele: np.ndarray
+    segment_starts: np.ndarray
 
-def _interpolate_ele(cum_dist, points, target_m):
-    """Linearly interpolate elevation at a given cumulative distance."""
-    for i in range(1, len(cum_dist)):
-        if cum_dist[i] >= target_m:
-            span = cum_dist[i] - cum_dist[i - 1]
-            frac = (target_m - cum_dist[i - 1]) / span if span else 0
-            return points[i - 1][2] + frac * (points[i][2] - points[i - 1][2])
-    return points[-1][2]
 
+def _open_gpx(gpx_path):
+    with open(gpx_path, "rb") as f:
+        magic = f.read(2)
+    if magic == GZIP_MAGIC:
+        return gzip.open(gpx_path, "rb")
+    return open(gpx_path, "rb")
 
-def _compute_km_multipliers(cum_dist, points, num_km=42):
-    """Compute a pace multiplier per km from elevation gain/loss."""
-    multipliers = []
 
-    for km in range(num_km):
-        start_m = km * 1000
-        end_m = (km + 1) * 1000 if km < num_km - 1 else cum_dist[-1]
+def _local_name(tag):
+    return tag.rpartition("}")[2]
 
-        start_ele = _interpolate_ele(cum_dist, points, start_m)
-        end_ele = _interpolate_ele(cum_dist, points, end_m)
 
-        # Walk through actual trackpoints inside this km for detailed gain/loss
-        gain, loss = 0.0, 0.0
-        prev_ele = start_ele
+def read_gpx_tracks(gpx_path):
+    """Stream every track out of a (possibly gzipped) GPX file.
 
-        for i in range(len(cum_dist)):
-            if cum_dist[i] <= start_m:
+    Returns a list of :class:`GpxTrack`.  Trackpoints without ``<ele>`` get
+    elevation 0.  Route and waypoint elements are ignored.
+    """
+    capacity = max(1024, os.path.getsize(gpx_path) // _MIN_TRKPT_BYTES)
+    buf = np.empty((capacity, 3))  # lat, lon, ele
+    n = 0
+    tracks = []
+    parents = []
+    in_trk = in_pt = False
+    track_start, seg_starts, name = 0, [], None
+    lat = lon = ele = 0.0
+
+    with _open_gpx(gpx_path) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            tag = _local_name(elem.tag)
+            if event == "start":
+                parents.append(elem)
+                if tag == "trkpt" and in_trk:
+                    in_pt = True
+                    lat, lon, ele = float(elem.get("lat")), float(elem.get("lon")), 0.0
+                elif tag == "trkseg" and in_trk:
+                    seg_starts.append(n - track_start)
+                elif tag == "trk":
+                    in_trk, track_start, seg_starts, name = True, n, [], None
                 continue
-            if cum_dist[i] > end_m:
-                break
-            diff = points[i][2] - prev_ele
-            if diff > 0:
-                gain += diff
-            else:
-                loss += abs(diff)
-            prev_ele = points[i][2]
 
-        # Account for interpolated endpoint
-        diff = end_ele - prev_ele
-        if diff > 0:
-            gain += diff
-        else:
-            loss += abs(diff)
+            parents.pop()
+            if in_pt:
+                if tag == "ele" and elem.text:
+                    ele = float(elem.text)
+                elif tag == "trkpt":
+                    in_pt = False
+                    if n == len(buf):
+                        buf = np.resize(buf, (2 * len(buf), 3))
+                    buf[n] = lat, lon, ele
+                    n += 1
+            elif tag == "name" and in_trk and name is None and _local_name(parents[-1].tag) == "trk":
+                name = (elem.text or "").strip() or None
+            elif tag == "trk":
+                in_trk = False
+                pts = buf[track_start:n]
+                tracks.append(GpxTrack(
+                    name=name,
+                    lat=pts[:, 0].copy(),
+                    lon=pts[:, 1].copy(),
+                    ele=pts[:, 2].copy(),
+                    segment_starts=np.array(seg_starts, dtype=np.int64),
+                ))
+
+            # Finished elements are always the last child of their parent, so
+            # detaching them keeps the in-memory tree to the current path.
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+    return tracks
+
+
+def _select_track(tracks, track, gpx_path):
+    if not tracks:
+        raise ValueError(f"No <trk> in {gpx_path}")
+    if track is None:
+        if len(tracks) == 1:
+            return tracks[0]
+        return GpxTrack(
+            name=None,
+            lat=np.concatenate([t.lat for t in tracks]),
+            lon=np.concatenate([t.lon for t in tracks]),
+            ele=np.concatenate([t.ele for t in tracks]),
+            segment_starts=np.concatenate(
+                [t.segment_starts + off for t, off in
+                 zip(tracks, np.cumsum([0] + [len(t.lat) for t in tracks[:-1]]))]
+            ).astype(np.int64),
+        )
+    if isinstance(track, str):
+        for t in tracks:
+            if t.name == track:
+                return t
+        raise ValueError(f"No track named {track!r} in {gpx_path}; available: {[t.name for t in tracks]}")
+    if not 0 <= track < len(tracks):
+        raise ValueError(f"Track {track} out of range: {gpx_path} has {len(tracks)} track(s)")
+    return tracks[track]
+
+
+def _parse_gpx(gpx_path, track=None):
+    """Return cumulative distances (m) and an (N, 3) lat/lon/ele array from a GPX file.
+
+    ``track`` selects one ``<trk>`` by index or name; by default every track
+    and segment is joined in file order, with gaps between segments bridged
+    by straight-line distance.
+    """
+    t = _select_track(read_gpx_tracks(gpx_path), track, gpx_path)
+    if len(t.lat) == 0:
+        raise ValueError(f"No trackpoints in {gpx_path}")
+
+    cum_dist = np.empty(len(t.lat))
+    cum_dist[0] = 0.0
+    np.cumsum(_haversine(t.lat[:-1], t.lon[:-1], t.lat[1:], t.lon[1:]), out=cum_dist[1:])
+    return cum_dist, np.column_stack((t.lat, t.lon, t.ele))
+
+
+def _gain_loss(cum_dist, elevation, bounds):
+    """Elevation gain and loss (m) between consecutive distances in ``bounds``.
+
+    Single linear pass: the interpolated elevation at every boundary is
+    spliced into the trackpoint elevation series, then per-segment gain and
+    loss are read off cumulative sums of the positive/negative differences.
+    """
+    dist = np.asarray(cum_dist, dtype=float)
+    ele = np.asarray(elevation, dtype=float)
+    bounds = np.asarray(bounds, dtype=float)
+    bound_ele = np.interp(bounds, dist, ele)
+
+    # Insert each boundary after every trackpoint at or before it, so the
+    # points strictly inside (start, end] sit between their two boundaries.
+    idx = np.searchsorted(dist, bounds, side="right")
+    merged = np.insert(ele, idx, bound_ele)
+    bound_pos = idx + np.arange(len(bounds))
+
+    diffs = np.diff(merged)
+    cum_gain = np.concatenate(([0.0], np.cumsum(np.clip(diffs, 0, None))))
+    cum_loss = np.concatenate(([0.0], np.cumsum(np.clip(-diffs, 0, None))))
+    return np.diff(cum_gain[bound_pos]), np.diff(cum_loss[bound_pos])
+
+
+def _compute_km_multipliers(cum_dist, elevation, num_km=42):
+    """Compute a pace multiplier per km from elevation gain/loss."""
+    # km boundaries — the final km absorbs the remaining 195 m
+    bounds = np.arange(num_km + 1, dtype=float) * 1000
+    bounds[-1] = cum_dist[-1]
+    gain, loss = _gain_loss(cum_dist, elevation, bounds)
+
+    return 1.0 + gain * GAIN_FACTOR - loss * LOSS_FACTOR
+
+
+def segment_multipliers(cum_dist, elevation, bounds):
+    """Pace multipliers for arbitrary segments between consecutive ``bounds`` (m).
+
+    Gain and loss are taken per km of segment, so a segment's time is
+    ``base_pace × length_km × multiplier`` and 1 km segments reproduce
+    :func:`_compute_km_multipliers`.
+    """
+    gain, loss = _gain_loss(cum_dist, elevation, bounds)
+    length_km = np.diff(np.asarray(bounds, dtype=float)) / 1000
+    return 1.0 + (gain * GAIN_FACTOR - loss * LOSS_FACTOR) / length_km
+
+
+# ---------------------------------------------------------------------------
+# Course registry
+# ---------------------------------------------------------------------------
+# Parsing the GPX and deriving multipliers is by far the most expensive part
+# of setting up a simulation, and the result only changes when the file does.
+# Courses are cached in-process keyed by (path, mtime, size) and can
+# optionally be persisted as a compiled course file (below) next to the GPX,
+# validated against the file's SHA-256 and the elevation factors.
+
+
+@dataclass(frozen=True)
+class Course:
+    """A parsed course: trackpoint distance/elevation plus per-km multipliers."""
+    gpx_path: str
+    source_hash: str
+    cum_dist: np.ndarray
+    elevation: np.ndarray
+    km_multipliers: np.ndarray
+
+
+_COURSE_CACHE = OrderedDict()  # (path, mtime, size, num_km, track) -> Course
+
+
+def _file_key(gpx_path):
+    st = os.stat(gpx_path)
+    return os.path.abspath(gpx_path), st.st_mtime_ns, st.st_size
+
+
+def _file_hash(gpx_path):
+    with open(gpx_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
 
-        multipliers.append(1.0 + gain * GAIN_FACTOR - loss * LOSS_FACTOR)
+def _read_only(arr):
+    arr = np.asarray(arr, dtype=float)
+    arr.setflags(write=False)
+    return arr
 
-    return np.array(multipliers)
+
+# ---------------------------------------------------------------------------
+# Compiled course files
+# ---------------------------------------------------------------------------
+# Layout (little-endian):
+#
+#   magic    8 bytes   b"EMPCOURS"
+#   version  uint32    COMPILED_VERSION
+#   hlen     uint32    length of the JSON header that follows
+#   header   hlen      UTF-8 JSON: source_path, source_hash, gain_factor,
+#                      loss_factor, num_km, track, n_points, and for every
+#                      array its byte offset, dtype and length
+#   arrays   ...       cum_dist (float32), elevation (float32),
+#                      km_multipliers (float64), each 64-byte aligned
+#
+# The loader maps the file read-only, so every process using the same course
+# shares its pages through the OS cache and never touches the XML.
+
+COMPILED_MAGIC = b"EMPCOURS"
+COMPILED_VERSION = 1
+COMPILED_SUFFIX = ".course"
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 64
+
+
+def compile_course(gpx_path=DEFAULT_GPX, out_path=None, num_km=42, track=None):
+    """Parse a GPX file and write it as a compiled course; returns the output path.
+
+    ``out_path`` defaults to ``<gpx_path>.course`` (``<gpx_path>.<track>.course``
+    when a track is selected).  The file is written atomically, so concurrent
+    readers never see a partial one.
+    """
+    if out_path is None:
+        out_path = _compiled_path(gpx_path, track)
+    cum_dist, points = _parse_gpx(gpx_path, track)
+    multipliers = _compute_km_multipliers(cum_dist, points[:, 2], num_km)
+
+    arrays = {
+        "cum_dist": cum_dist.astype("<f4"),
+        "elevation": points[:, 2].astype("<f4"),
+        "km_multipliers": multipliers.astype("<f8"),
+    }
+    header = {
+        "source_path": os.path.abspath(gpx_path),
+        "source_hash": _file_hash(gpx_path),
+        "gain_factor": GAIN_FACTOR,
+        "loss_factor": LOSS_FACTOR,
+        "num_km": num_km,
+        "track": track,
+        "n_points": len(cum_dist),
+        "arrays": {},
+    }
+
+    # Offsets depend on the header length and vice versa; reserve generously.
+    offset = _aligned(_PREAMBLE.size + len(json.dumps(header)) + 64 * (len(arrays) + 1))
+    for name, arr in arrays.items():
+        header["arrays"][name] = {"offset": offset, "dtype": arr.dtype.str, "length": len(arr)}
+        offset = _aligned(offset + arr.nbytes)
+    header_bytes = json.dumps(header).encode()
+    first = header["arrays"]["cum_dist"]["offset"]
+    assert _PREAMBLE.size + len(header_bytes) <= first
+
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(COMPILED_MAGIC, COMPILED_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(arr.tobytes())
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def read_compiled_header(path):
+    """Return the JSON header of a compiled course file.
+
+    Raises ``ValueError`` if the file is not a compiled course or was written
+    by a different format version.
+    """
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError(f"{path} is not a compiled course file")
+        magic, version, hlen = _PREAMBLE.unpack(preamble)
+        if magic != COMPILED_MAGIC:
+            raise ValueError(f"{path} is not a compiled course file")
+        if version != COMPILED_VERSION:
+            raise ValueError(f"{path} is compiled course version {version}, expected {COMPILED_VERSION}")
+        return json.loads(f.read(hlen))
+
+
+@timed("course.load_compiled")
+def load_compiled_course(path):
+    """Memory-map a compiled course file as a :class:`Course`.
+
+    ``cum_dist`` and ``elevation`` are read-only float32 views of the mapping.
+    Raises ``ValueError`` if the file was compiled with different elevation
+    factors than this module uses.
+    """
+    header = read_compiled_header(path)
+    if header["gain_factor"] != GAIN_FACTOR or header["loss_factor"] != LOSS_FACTOR:
+        raise ValueError(f"{path} was compiled with different GAIN_FACTOR/LOSS_FACTOR; recompile it")
+
+    mm = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def view(name):
+        spec = header["arrays"][name]
+        dtype = np.dtype(spec["dtype"])
+        start = spec["offset"]
+        return mm[start:start + spec["length"] * dtype.itemsize].view(dtype)
+
+    return Course(
+        gpx_path=header["source_path"],
+        source_hash=header["source_hash"],
+        cum_dist=view("cum_dist"),
+        elevation=view("elevation"),
+        km_multipliers=_read_only(np.array(view("km_multipliers"))),  # tiny; keep a plain copy
+    )
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def _compiled_path(gpx_path, track):
+    return gpx_path + ("" if track is None else f".{track}") + COMPILED_SUFFIX
+
+
+def _load_sidecar(path, source_hash, num_km, track):
+    """Return the compiled course at ``path`` if it matches the source, else None."""
+    try:
+        header = read_compiled_header(path)
+        if (header["source_hash"] != source_hash
+                or header["num_km"] != num_km
+                or header["track"] != track):
+            return None
+        return load_compiled_course(path)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def load_course(gpx_path=DEFAULT_GPX, sidecar=False, num_km=42, track=None):
+    """Return the cached :class:`Course` for a GPX file, parsing it at most once.
+
+    ``track`` picks one course out of a multi-track file (by index or
+    ``<name>``); see :func:`_parse_gpx`.  With ``sidecar=True`` the course is
+    compiled to ``<gpx_path>.course`` on first use and memory-mapped from
+    there afterwards, so a fresh process skips the XML entirely.
+    """
+    key = _file_key(gpx_path) + (num_km, track)
+    course = _COURSE_CACHE.get(key)
+    cache_lookup("course", course is not None)
+    if course is not None:
+        _COURSE_CACHE.move_to_end(key)
+        return course
+
+    source_hash = _file_hash(gpx_path)
+    course = None
+    if sidecar:
+        sidecar_path = _compiled_path(gpx_path, track)
+        course = _load_sidecar(sidecar_path, source_hash, num_km, track)
+        if course is None:
+            try:
+                compile_course(gpx_path, sidecar_path, num_km, track)
+                course = _load_sidecar(sidecar_path, source_hash, num_km, track)
+            except OSError:
+                pass  # read-only checkout — the in-memory cache still applies
+
+    if course is None:
+        with phase("course.parse_gpx"):
+            cum_dist, points = _parse_gpx(gpx_path, track)
+        course = Course(
+            gpx_path=key[0],
+            source_hash=source_hash,
+            cum_dist=_read_only(cum_dist),
+            elevation=_read_only(points[:, 2]),
+            km_multipliers=_read_only(_compute_km_multipliers(cum_dist, points[:, 2], num_km)),
+        )
+    # an edited file never matches its old entries again, so drop them
+    for stale in [k for k in _COURSE_CACHE if k[0] == key[0] and k[1:3] != key[1:3]]:
+        del _COURSE_CACHE[stale]
+    _COURSE_CACHE[key] = course
+    if len(_COURSE_CACHE) > COURSE_CACHE_SIZE:
+        _COURSE_CACHE.popitem(last=False)
+    return course
+
+
+def clear_course_cache():
+    """Forget every cached course (sidecar files are left alone)."""
+    _COURSE_CACHE.clear()
+
+
+def preload_course(gpx_path=DEFAULT_GPX):
+    """Process-pool ``initializer``: load the course from its compiled sidecar
+    so a fresh worker's first job skips the XML.  Best effort — a failure here
+    is left for that job to report."""
+    try:
+        load_course(gpx_path, sidecar=True)
+    except Exception:
+        pass
 
 
 def LondonCourseProfile(gpx_path=DEFAULT_GPX):
-    """Return a 42-element numpy array of pace multipliers parsed from GPX elevation data."""
-    cum_dist, points = _parse_gpx(gpx_path)
-    return _compute_km_multipliers(cum_dist, points)
+    """Return a 42-element numpy array of pace multipliers parsed from GPX elevation data.
+
+    The array comes from the course registry and is read-only; copy it
+    before modifying.
+    """
+    return load_course(gpx_path).km_multipliers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile a GPX course to the memory-mappable binary format.")
+    parser.add_argument("gpx", nargs="?", default=DEFAULT_GPX, help="GPX file, optionally gzipped")
+    parser.add_argument("-o", "--output", help="output path (default: <gpx>.course)")
+    parser.add_argument("--track", help="track index or name (default: all tracks joined)")
+    parser.add_argument("--num-km", type=int, default=42, help="per-km multipliers to derive")
+    args = parser.parse_args(argv)
 
+    track = int(args.track) if args.track is not None and args.track.isdigit() else args.track
+    out = compile_course(args.gpx, args.output, args.num_km, track)
+    header = read_compiled_header(out)
+    print(f"  {args.gpx} ({os.path.getsize(args.gpx):,} bytes) → {out} ({os.path.getsize(out):,} bytes)")
+    print(f"  {header['n_points']:,} points, {header['num_km']} km multipliers, sha256 {header['source_hash'][:12]}…")
+    return 0
 
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Opt-in instrumentation for the simulation hot paths.
+
+Phase timers and counters are sprinkled through the engine, course loader
+and caches, and do nothing unless a :class:`Recorder` is listening:
+
+  engine.rng        random draws (fatigue coefficients, DNF uniforms, noise)
+  engine.model      course × heat × fatigue arithmetic on the drawn splits
+  engine.summary    percentiles and moments over the finish times
+  engine.placings   ranking every simulated race across a field
+  course.parse_gpx  streaming a GPX file into arrays
+  course.load_compiled
+                    memory-mapping a compiled course
+  model.pace_table  building a (course, temperature) multiplier table
+  simulate_race_per_km, simulate_field, simulate_race_segments
+                    whole calls (phases nest, so timings are inclusive)
+
+Counters: ``simulations``, ``km_evaluated`` (splits computed, i.e. finishers
+× segments), ``dnfs`` and ``cache_hits`` / ``cache_misses`` labelled by cache.
+
+Turn it on globally with :func:`enable` (or ``PREDICTOR_INSTRUMENT=1`` in the
+environment) and read :data:`GLOBAL`, or per call::
+
+    with instrumentation.recording() as rec:
+        simulate_race_per_km(7325)
+    print(rec.to_prometheus())
+
+When nothing is listening each hook costs one context-variable lookup, and
+hooks sit around whole array operations, never inside per-km loops.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+INSTRUMENT_ENV = "PREDICTOR_INSTRUMENT"
+
+# Prefix of every exported Prometheus metric name.
+METRIC_PREFIX = "predictor"
+
+_ENABLED = False
+_RECORDERS = contextvars.ContextVar("recorders", default=())
+
+
+class Recorder:
+    """Accumulates phase timings and counters; thread-safe.
+
+    ``callback``, if given, is called as ``callback(kind, name, value,
+    labels)`` for every record — ``kind`` is ``"phase"`` (value in seconds)
+    or ``"count"`` — so events can be forwarded to another metrics system.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._timers = {}    # name -> [count, total_seconds, max_seconds]
+        self._counters = {}  # (name, labels) -> value
+
+    def record_phase(self, name, seconds):
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+        if self.callback is not None:
+            self.callback("phase", name, seconds, {})
+
+    def record_count(self, name, n, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+        if self.callback is not None:
+            self.callback("count", name, n, labels)
+
+    def merge(self, other):
+        """Fold another recorder's totals into this one (e.g. one returned
+        from a worker process — recorders pickle without their callback)."""
+        with other._lock:
+            timers = {name: list(t) for name, t in other._timers.items()}
+            counters = dict(other._counters)
+        with self._lock:
+            for name, (c, total, peak) in timers.items():
+                timer = self._timers.setdefault(name, [0, 0.0, 0.0])
+                timer[0] += c
+                timer[1] += total
+                timer[2] = max(timer[2], peak)
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def __getstate__(self):
+        with self._lock:
+            return {"timers": self._timers, "counters": self._counters}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self._timers = state["timers"]
+        self._counters = state["counters"]
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """Plain dict of everything recorded so far (JSON-serialisable)."""
+        with self._lock:
+            timers = {name: {"count": c, "total_seconds": total, "mean_seconds": total / c,
+                             "max_seconds": peak}
+                      for name, (c, total, peak) in sorted(self._timers.items())}
+            counters = {_label_key(name, labels): value
+                        for (name, labels), value in sorted(self._counters.items())}
+        return {"timers": timers, "counters": counters}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix=METRIC_PREFIX):
+        """Snapshot in the Prometheus text exposition format.
+
+        Phases become one summary (``<prefix>_phase_seconds`` with a
+        ``phase`` label) and each counter a ``<prefix>_<name>_total``.
+        """
+        with self._lock:
+            timers = sorted(self._timers.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        if timers:
+            metric = f"{prefix}_phase_seconds"
+            lines.append(f"# HELP {metric} Wall-clock time spent in each instrumented phase.")
+            lines.append(f"# TYPE {metric} summary")
+            for name, (count, total, _) in timers:
+                lines.append(f'{metric}_sum{{phase="{name}"}} {total!r}')
+                lines.append(f'{metric}_count{{phase="{name}"}} {count}')
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{prefix}_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_str}}} {value}" if label_str else f"{metric} {value}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _label_key(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+# Process-wide recorder used by enable().
+GLOBAL = Recorder()
+
+
+def enable():
+    """Record every hook into :data:`GLOBAL` from now on."""
+    global _ENABLED
+    _ENABLED = True
+
+
+def disable():
+    global _ENABLED
+    _ENABLED = False
+
+
+def is_enabled():
+    """True if any recorder is listening in this context."""
+    return _ENABLED or bool(_RECORDERS.get())
+
+
+@contextmanager
+def recording(recorder=None):
+    """Record hooks inside the ``with`` block into ``recorder`` (a fresh
+    :class:`Recorder` by default), which is yielded.
+
+    Scoped to the current context, so concurrent calls on other threads or
+    tasks are not mixed in; nests, and combines with :func:`enable`.
+    """
+    recorder = recorder if recorder is not None else Recorder()
+    token = _RECORDERS.set(_RECORDERS.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _RECORDERS.reset(token)
+
+
+def _targets():
+    recorders = _RECORDERS.get()
+    return recorders + (GLOBAL,) if _ENABLED else recorders
+
+
+# ---------------------------------------------------------------------------
+# Hooks
+# ---------------------------------------------------------------------------
+class _Phase:
+    __slots__ = ("name", "targets", "start")
+
+    def __init__(self, name, targets):
+        self.name = name
+        self.targets = targets
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        for recorder in self.targets:
+            recorder.record_phase(self.name, seconds)
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name):
+    """Context manager timing a named phase (a shared no-op when off)."""
+    targets = _targets()
+    return _Phase(name, targets) if targets else _NULL_PHASE
+
+
+def timed(name):
+    """Decorator: run the whole function as :func:`phase` ``name``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def run_recorded(func, *args):
+    """Call ``func(*args)`` under a fresh recorder; return ``(value, recorder)``.
+
+    For work run in another process: the caller merges the returned recorder
+    (e.g. into :data:`GLOBAL`), since hooks in the worker cannot reach it.
+    """
+    with recording() as recorder:
+        value = func(*args)
+    return value, recorder
+
+
+def count(name, n=1, **labels):
+    """Add ``n`` to a counter, optionally labelled (``cache="course"``)."""
+    for recorder in _targets():
+        recorder.record_count(name, n, labels)
+
+
+def cache_lookup(cache, hit):
+    """Count a hit or miss on the named cache."""
+    count("cache_hits" if hit else "cache_misses", cache=cache)
+
+
+# ---------------------------------------------------------------------------
+# cProfile
+# ---------------------------------------------------------------------------
+PROFILE_SORT = "cumulative"
+PROFILE_LIMIT = 30
+
+
+def run_profiled(func, *args, output=None, sort=PROFILE_SORT, limit=PROFILE_LIMIT, **kwargs):
+    """Call ``func`` under cProfile and report, even if it exits early.
+
+    With ``output`` the raw stats are dumped there (for ``snakeviz``,
+    ``python -m pstats`` …); the top ``limit`` functions by ``sort`` are
+    always printed to stderr.
+    """
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        if output:
+            profiler.dump_stats(output)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        print(stream.getvalue(), file=sys.stderr)
+        if output:
+            print(f"  Profile written to {output}", file=sys.stderr)
+
+
+if os.environ.get(INSTRUMENT_ENV, "").lower() in ("1", "true", "yes", "on"):
+    enable()
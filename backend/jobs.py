@@ -0,0 +1,363 @@
+"""
+Background jobs for long leaderboard and sweep runs.
+
+Submit a job, get an ID back, then poll it, stream its events as
+newline-delimited JSON, or cancel it.  Jobs are driven from a bounded thread
+pool, at most ``max_queued`` wait (further submissions raise
+:class:`QueueFull`), and finished jobs are kept in a bounded store, oldest
+evicted first.  Given an ``executor`` (the server passes its process pool)
+each runner's (or sweep slice's) simulation runs there, so a job holds at
+most one worker at a time; without one it runs in the job thread.
+
+A leaderboard job simulates its field one runner at a time and publishes an
+event as each runner completes.  Runners are independent in the model, so
+stacking their per-runner sample matrices gives the same joint distribution
+as a single :func:`simulation.simulate_field` call; the final event ranks the
+field with exact head-to-head statistics.
+
+A sweep job needs the whole field in every race for its placing statistics,
+so it is split by races instead: each slice of ``simulations`` runs
+:func:`sweep.simulate_scenarios`' accumulation in the pool and returns only
+reduced per-scenario statistics, which merge exactly; a progress event with
+the running rows follows each slice.  Sweeps larger than
+``MAX_SWEEP_SAMPLES`` (scenarios × runners × simulations) are rejected.
+
+Each runner or slice draws from its own ``SeedSequence.spawn`` child, so a
+seeded job is reproducible.
+
+Event stream (one JSON object per line):
+  {"event": "started", "total": N}
+  {"event": "runner", "index": i, "completed": k, "total": N, "name": ..., "result": {...}}
+  {"event": "progress", "completed": k, "total": N, "result": [...]}   (sweeps; k, N in races)
+  {"event": "done", "result": {...}}  |  {"event": "cancelled"}  |  {"event": "error", "message": ...}
+"""
+
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import instrumentation
+from main import build_leaderboard
+from runners import ELITE_MEN_2026
+from simulation import (
+    DEFAULT_TEMP_C,
+    NUM_KM,
+    _resolve_course_profile,
+    _simulate_field_samples,
+    _summarise,
+    _summarise_field,
+)
+from sweep import (
+    SWEEP_STATISTICS,
+    _normalise_scenario,
+    _scenario_accumulate,
+    _scenario_grid,
+    sweep_records,
+)
+from timefmt import time_to_seconds
+
+DEFAULT_MAX_CONCURRENT = 2
+DEFAULT_MAX_QUEUED = 16
+DEFAULT_MAX_FINISHED = 100
+
+# Largest sweep accepted, in scenarios × runners × simulations: about 70k
+# races of the elite field over a 41-temperature grid.
+MAX_SWEEP_SAMPLES = 100_000_000
+# Sweeps are run and reported in this many slices of their races.
+SWEEP_SLICES = 4
+
+QUEUED, RUNNING, DONE, CANCELLED, FAILED = "queued", "running", "done", "cancelled", "failed"
+TERMINAL_STATES = (DONE, CANCELLED, FAILED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    """Raised by :meth:`JobManager.submit` when ``max_queued`` jobs are waiting."""
+
+
+def _jsonable(value):
+    """Plain-JSON copy of a result: floats, lists and dicts; ``inf``/``nan`` → None."""
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _jsonable(value.tolist())
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return value if math.isfinite(value) else None
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+class Job:
+    """One submitted job: its state, its event log and its final result."""
+
+    def __init__(self, kind, params, run, executor=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.total = None
+        self.completed = 0
+        self.result = None
+        self.error = None
+        self._run = run
+        self._executor = executor
+        self._events = []
+        self._cond = threading.Condition()
+        self._cancel = threading.Event()
+
+    # -- used by the job body ------------------------------------------------
+    def emit(self, event):
+        with self._cond:
+            self._events.append(_jsonable(event))
+            self._cond.notify_all()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled
+
+    def compute(self, fn, *args):
+        """``fn(*args)``, on the manager's executor when it has one (``fn``
+        must then be module-level so it pickles)."""
+        if self._executor is None:
+            return fn(*args)
+        if not instrumentation.is_enabled():
+            return self._executor.submit(fn, *args).result()
+        value, recorder = self._executor.submit(instrumentation.run_recorded, fn, *args).result()
+        instrumentation.GLOBAL.merge(recorder)
+        return value
+
+    # -- public --------------------------------------------------------------
+    def cancel(self):
+        """Request cancellation; takes effect before the next runner or slice starts."""
+        self._cancel.set()
+
+    @property
+    def done(self):
+        return self.status in TERMINAL_STATES
+
+    def wait_events(self, start=0, timeout=None):
+        """Events from index ``start`` on, waiting up to ``timeout`` seconds for
+        at least one if none are there yet.  Empty once the job has finished
+        and everything has been read (or on timeout)."""
+        with self._cond:
+            self._cond.wait_for(lambda: start < len(self._events) or self.done, timeout)
+            return self._events[start:]
+
+    def events(self, start=0):
+        """Yield every event from index ``start``, blocking until the job finishes."""
+        i = start
+        while True:
+            batch = self.wait_events(i)
+            if not batch:
+                return
+            yield from batch
+            i += len(batch)
+
+    def snapshot(self, include_result=True):
+        snap = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": _jsonable(self.params),
+            "completed": self.completed,
+            "total": self.total,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.error is not None:
+            snap["error"] = self.error
+        if include_result and self.result is not None:
+            snap["result"] = self.result
+        return snap
+
+    def _execute(self):
+        if self._cancel.is_set():
+            self._finish(CANCELLED, {"event": "cancelled"})
+            return
+        self.status = RUNNING
+        self.started = time.time()
+        try:
+            result = self._run(self)
+        except JobCancelled:
+            self._finish(CANCELLED, {"event": "cancelled"})
+        except Exception as e:  # surfaced to the client, not swallowed
+            self.error = f"{type(e).__name__}: {e}"
+            self._finish(FAILED, {"event": "error", "message": self.error})
+        else:
+            self.result = _jsonable(result)
+            self._finish(DONE, {"event": "done", "result": self.result})
+
+    def _finish(self, status, event):
+        with self._cond:
+            self.finished = time.time()
+            self._events.append(event)
+            self.status = status
+            self._cond.notify_all()
+
+
+class JobManager:
+    """Runs jobs on a bounded pool and remembers the most recent finished ones.
+
+    ``executor`` (e.g. a ``ProcessPoolExecutor``) runs the per-runner and
+    per-slice simulations; it is borrowed, not shut down with the manager.
+    """
+
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, max_queued=DEFAULT_MAX_QUEUED,
+                 max_finished=DEFAULT_MAX_FINISHED, executor=None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.compute_executor = executor
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="job")
+        self._jobs = OrderedDict()  # id -> Job, in submission order
+        self._lock = threading.Lock()
+
+    def submit(self, kind, params, run):
+        with self._lock:
+            self._evict()
+            waiting = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            if waiting >= self.max_queued:
+                raise QueueFull
+            job = Job(kind, params, run, self.compute_executor)
+            self._jobs[job.id] = job
+        self._executor.submit(job._execute)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def _evict(self):
+        finished = [j for j in self._jobs.values() if j.done]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.id]
+
+    def shutdown(self):
+        for job in self.list():
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # -- job kinds -----------------------------------------------------------
+    def submit_leaderboard(self, field=None, temp_celsius=DEFAULT_TEMP_C, simulations=10000,
+                           seed=None, course_profile=None):
+        """Queue a leaderboard job.  ``field`` is a list of (name, "H:MM:SS")
+        pairs and defaults to the 2026 elite men's field."""
+        field = list(field if field is not None else ELITE_MEN_2026.items())
+        params = {"temp_celsius": temp_celsius, "simulations": simulations, "seed": seed,
+                  "runners": len(field)}
+        return self.submit("leaderboard", params, lambda job: _run_leaderboard(
+            job, field, temp_celsius, simulations, seed, course_profile))
+
+    def submit_sweep(self, scenarios, field=None, simulations=10000, seed=None, course_profile=None):
+        """Queue a scenario sweep (see :func:`sweep.simulate_scenarios`).
+
+        Raises ValueError for unknown scenario parameters or a sweep over
+        ``MAX_SWEEP_SAMPLES``.
+        """
+        field = list(field if field is not None else ELITE_MEN_2026.items())
+        scenarios = [_normalise_scenario(s) for s in scenarios]
+        samples = len(scenarios) * len(field) * simulations
+        if samples > MAX_SWEEP_SAMPLES:
+            raise ValueError(f"Sweep too large: {len(scenarios)} scenarios × {len(field)} runners × "
+                             f"{simulations} simulations exceeds {MAX_SWEEP_SAMPLES:,}")
+        params = {"scenarios": scenarios, "simulations": simulations, "seed": seed,
+                  "runners": len(field)}
+        return self.submit("sweep", params, lambda job: _run_sweep(
+            job, field, scenarios, simulations, seed, course_profile))
+
+
+# ---------------------------------------------------------------------------
+# Job bodies
+# ---------------------------------------------------------------------------
+def _child_seeds(seed, n):
+    return np.random.SeedSequence(seed).spawn(n)
+
+
+def _leaderboard_runner(pb_seconds, temp_celsius, simulations, course_profile, seed):
+    """One runner's field samples and solo summary (module-level so it pickles)."""
+    times, sums = _simulate_field_samples([pb_seconds], temp_celsius, simulations,
+                                          course_profile, seed)
+    done = np.isfinite(times[0])
+    n_done = int(done.sum())
+    summary = _summarise(times[0, done], sums[0] / n_done if n_done else np.zeros(NUM_KM),
+                         simulations - n_done, simulations, temp_celsius)
+    return times[0], sums[0], summary
+
+
+def _run_leaderboard(job, field, temp_celsius, simulations, seed, course_profile):
+    course_profile = _resolve_course_profile(course_profile)
+    seeds = _child_seeds(seed, len(field))
+    job.total = len(field)
+    job.emit({"event": "started", "total": job.total})
+
+    finish_times = np.empty((len(field), simulations))
+    split_sums = np.zeros((len(field), NUM_KM))
+
+    for i, (name, pb) in enumerate(field):
+        job.check_cancelled()
+        finish_times[i], split_sums[i], summary = job.compute(
+            _leaderboard_runner, time_to_seconds(pb), temp_celsius, simulations,
+            course_profile, seeds[i])
+        job.completed = i + 1
+        job.emit({"event": "runner", "index": i, "completed": job.completed, "total": job.total,
+                  "name": name, "pb": pb, "result": summary})
+
+    runners = _summarise_field(finish_times, split_sums, temp_celsius)
+    rows = build_leaderboard(field, runners)
+    by_name = {name: r for (name, _), r in zip(field, runners)}
+    for rank, row in enumerate(rows, 1):
+        row["rank"] = rank
+        row["expected_position"] = by_name[row["name"]]["expected_position"]
+    return {"temp_celsius": temp_celsius, "simulations": simulations, "runners": rows}
+
+
+def _run_sweep(job, field, scenarios, simulations, seed, course_profile):
+    course_profile = _resolve_course_profile(course_profile)
+    pbs = [time_to_seconds(pb) for _, pb in field]
+    names = [name for name, _ in field]
+    n_slices = min(SWEEP_SLICES, simulations)
+    sizes = [simulations // n_slices + (i < simulations % n_slices) for i in range(n_slices)]
+    seeds = _child_seeds(seed, n_slices)
+    job.total = simulations
+    job.emit({"event": "started", "total": job.total})
+
+    stats = None
+    for size, slice_seed in zip(sizes, seeds):
+        job.check_cancelled()
+        part = job.compute(_scenario_accumulate, pbs, scenarios, size, course_profile, slice_seed)
+        if stats is None:
+            stats = part
+        else:
+            for acc, other in zip(stats, part):
+                acc.merge(other)
+        job.completed += size
+        rows = list(sweep_records(_scenario_grid(scenarios, stats, job.completed), names))
+        job.emit({"event": "progress", "completed": job.completed, "total": job.total, "result": rows})
+
+    return {"simulations": simulations, "statistics": list(SWEEP_STATISTICS), "rows": rows}
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Minimal load generator for the HTTP API (``server.py``).
+
+    uvicorn server:app &
+    python loadtest.py --requests 500 --concurrency 32
+    python loadtest.py --path "/leaderboard?simulations=2000" --method GET
+
+Each client thread keeps one HTTP/1.1 connection open and fires requests
+back to back.  Reports throughput, latency percentiles and the status-code
+mix (429s show backpressure kicking in).
+"""
+
+import argparse
+import http.client
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import numpy as np
+
+DEFAULT_URL = "http://127.0.0.1:8000"
+DEFAULT_PATH = "/predict?pb_time=2:05:30&simulations=10000"
+
+
+def _client(host, port, method, path, n_requests, latencies, statuses, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    local_lat, local_status = [], Counter()
+    try:
+        for _ in range(n_requests):
+            t0 = time.perf_counter()
+            try:
+                conn.request(method, path)
+                resp = conn.getresponse()
+                resp.read()
+                local_status[resp.status] += 1
+            except (OSError, http.client.HTTPException) as e:
+                local_status[type(e).__name__] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=120)
+            local_lat.append(time.perf_counter() - t0)
+    finally:
+        conn.close()
+    with lock:
+        latencies.extend(local_lat)
+        statuses.update(local_status)
+
+
+def run_load(url, path, method, total_requests, concurrency):
+    """Fire ``total_requests`` at ``url + path`` from ``concurrency`` threads."""
+    parts = urlsplit(url)
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    per_client = [total_requests // concurrency + (i < total_requests % concurrency)
+                  for i in range(concurrency)]
+
+    threads = [
+        threading.Thread(target=_client, args=(parts.hostname, parts.port or 80, method, path,
+                                               n, latencies, statuses, lock))
+        for n in per_client if n
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    lat = np.array(latencies) * 1e3
+    return {
+        "requests": len(lat),
+        "elapsed_seconds": elapsed,
+        "requests_per_second": len(lat) / elapsed if elapsed else 0.0,
+        "p50_ms": float(np.percentile(lat, 50)) if len(lat) else 0.0,
+        "p95_ms": float(np.percentile(lat, 95)) if len(lat) else 0.0,
+        "p99_ms": float(np.percentile(lat, 99)) if len(lat) else 0.0,
+        "max_ms": float(lat.max()) if len(lat) else 0.0,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the predictor API.")
+    parser.add_argument("--url", default=DEFAULT_URL, help="server base URL (default: %(default)s)")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="request path (default: %(default)s)")
+    parser.add_argument("--method", default="POST", help="HTTP method (default: %(default)s)")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="total requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="concurrent clients")
+    args = parser.parse_args(argv)
+
+    r = run_load(args.url, args.path, args.method.upper(), args.requests, args.concurrency)
+
+    print(f"  {r['requests']} requests in {r['elapsed_seconds']:.2f}s  "
+          f"→  {r['requests_per_second']:.1f} req/s")
+    print(f"  latency  p50 {r['p50_ms']:.1f}ms  p95 {r['p95_ms']:.1f}ms  "
+          f"p99 {r['p99_ms']:.1f}ms  max {r['max_ms']:.1f}ms")
+    print("  status   " + "  ".join(f"{k}×{v}" for k, v in r["statuses"].items()))
+    return 0 if r["statuses"].get("200") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
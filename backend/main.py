@@ -2,32 +2,30 @@
 """
 Elite Marathon Predictor — CLI
 Run predictions for the 2026 TCS London Marathon entirely from the terminal.
+
+  python main.py                      interactive menu
+  python main.py --profile [FILE]     … under cProfile; pstats report on exit
+  python main.py --metrics json       … printing engine phase timers and
+                                      counters on exit (or "prometheus")
+  python main.py --no-warmup          … without the background warm-up
+  python main.py predict|leaderboard|sweep [options]
+                                      scriptable batch runs (see batch.py)
+
+NumPy, the simulation engine and the course are imported on first use, so
+the time helpers, ``build_leaderboard`` and the menu come up without them.
+While the menu waits for input, :func:`start_warm_up` loads them on a
+background thread, memory-mapping the compiled course (``<gpx>.course``,
+compiled on first run) so the first prediction starts straight away.
 """
 
+import argparse
 import sys
-from simulation import simulate_race_per_km
-from runners import ELITE_MEN_2026
-
-
-# ---------------------------------------------------------------------------
-# Helpers
-# ---------------------------------------------------------------------------
-def time_to_seconds(time_str):
-    parts = time_str.strip().split(":")
-    if len(parts) == 3:
-        h, m, s = map(int, parts)
-    elif len(parts) == 2:
-        h, m, s = 0, int(parts[0]), int(parts[1])
-    else:
-        raise ValueError(f"Invalid time format: {time_str!r}  (expected H:MM:SS or MM:SS)")
-    return h * 3600 + m * 60 + s
-
+import threading
 
-def seconds_to_time(seconds):
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
-    return f"{h}:{m:02d}:{s:02d}"
+import batch
+import instrumentation
+from runners import ELITE_MEN_2026
+from timefmt import format_result_time, format_time, time_to_seconds
 
 
 BANNER = r"""
@@ -55,22 +53,31 @@ def predict_single():
     temp_input = input("  Race-day temperature in °C [15]: ").strip()
     temp_celsius = float(temp_input) if temp_input else 15.0
 
-    sims_input = input("  Number of simulations [10000]: ").strip()
-    simulations = int(sims_input) if sims_input else 10000
+    sims_input = input("  Number of simulations, or 'auto' to run until converged [10000]: ").strip().lower()
 
-    print(f"\n  Running {simulations:,} simulations … ", end="", flush=True)
-    result = simulate_race_per_km(pb_seconds, temp_celsius=temp_celsius, simulations=simulations)
-    print("done.\n")
+    from simulation import simulate_adaptive, simulate_race_per_km
+
+    if sims_input == "auto":
+        print("\n  Running simulations until the median, p95 and DNF rate converge … ", end="", flush=True)
+        result = simulate_adaptive(pb_seconds, temp_celsius=temp_celsius)
+        simulations = result["simulations"]
+        status = "converged" if result["converged"] else "budget reached"
+        print(f"done ({status}, median ±{result['precision']['median']:.1f}s).\n")
+    else:
+        simulations = int(sims_input) if sims_input else 10000
+        print(f"\n  Running {simulations:,} simulations … ", end="", flush=True)
+        result = simulate_race_per_km(pb_seconds, temp_celsius=temp_celsius, simulations=simulations)
+        print("done.\n")
 
     print(f"  ┌─────────────────────────────────────────┐")
     print(f"  │  PB               : {pb_time:<20s}│")
     print(f"  │  Temperature      : {temp_celsius}°C{' ' * (16 - len(str(temp_celsius)))}│")
     print(f"  │  Simulations      : {simulations:<20,d}│")
     print(f"  ├─────────────────────────────────────────┤")
-    print(f"  │  Predicted median : {seconds_to_time(result['median']):<20s}│")
-    print(f"  │  Predicted mean   : {seconds_to_time(result['mean_time']):<20s}│")
-    print(f"  │  Best 5%          : {seconds_to_time(result['p5']):<20s}│")
-    print(f"  │  Worst 5%         : {seconds_to_time(result['p95']):<20s}│")
+    print(f"  │  Predicted median : {format_result_time(result, 'median'):<20s}│")
+    print(f"  │  Predicted mean   : {format_result_time(result, 'mean_time'):<20s}│")
+    print(f"  │  Best 5%          : {format_result_time(result, 'p5'):<20s}│")
+    print(f"  │  Worst 5%         : {format_result_time(result, 'p95'):<20s}│")
     std_str = f"{result['std_dev']:.1f}s"
     dnf_str = f"{result['dnf_rate']:.1%}"
     print(f"  │  Std deviation    : {std_str:<20s}│")
@@ -87,71 +94,116 @@ def predict_single():
         cumulative = 0.0
         for i, split in enumerate(mean_splits, 1):
             cumulative += split
-            print(f"  {i:4d}  {seconds_to_time(split):>8s}  {seconds_to_time(cumulative):>10s}")
+            print(f"  {i:4d}  {format_time(split):>8s}  {format_time(cumulative):>10s}")
 
 
 # ---------------------------------------------------------------------------
 # Full elite field leaderboard
 # ---------------------------------------------------------------------------
-def leaderboard():
-    """Simulate every runner in the 2026 elite men's field and print a leaderboard."""
-    print("\n── 2026 TCS London Marathon — Elite Men's Leaderboard ──\n")
+def build_leaderboard(field, field_results):
+    """Turn ``simulate_field`` results into display rows, fastest first.
 
-    temp_input = input("  Race-day temperature in °C [15]: ").strip()
-    temp_celsius = float(temp_input) if temp_input else 15.0
-
-    sims_input = input("  Simulations per runner [10000]: ").strip()
-    simulations = int(sims_input) if sims_input else 10000
-
-    field = list(ELITE_MEN_2026.items())
-    total = len(field)
+    ``field`` is a list of (name, pb) pairs in the order they were simulated.
+    """
     results = []
-
-    print(f"\n  Simulating {total} runners × {simulations:,} races each …")
-
-    for idx, (name, pb) in enumerate(field, 1):
-        pct = idx / total * 100
-        print(f"\r  [{idx:2d}/{total}] {pct:5.1f}%  {name:<25s}", end="", flush=True)
-
-        pb_seconds = time_to_seconds(pb)
-        r = simulate_race_per_km(pb_seconds, temp_celsius=temp_celsius, simulations=simulations)
-
+    for (name, pb), r in zip(field, field_results):
         dnf_pct = r["dnf_rate"]
         is_dnf = dnf_pct > 0.5
 
         results.append({
             "name": name,
             "pb": pb,
-            "predicted_time": "DNF" if is_dnf else seconds_to_time(r["median"]),
+            "predicted_time": "DNF" if is_dnf else format_result_time(r, "median"),
             "predicted_seconds": float("inf") if is_dnf else r["median"],
             "dnf_rate": f"{dnf_pct:.1%}",
+            "win_prob": f"{r['win_prob']:.1%}",
+            "podium_prob": f"{r['podium_prob']:.1%}",
             "status": "DNF" if is_dnf else "Finished",
         })
 
-    print("\r" + " " * 60, end="\r")  # clear progress line
-
     # Sort: finishers first by time, then DNFs
     results.sort(key=lambda x: (x["status"] == "DNF", x["predicted_seconds"]))
+    return results
+
+
+def leaderboard():
+    """Simulate every runner in the 2026 elite men's field and print a leaderboard."""
+    print("\n── 2026 TCS London Marathon — Elite Men's Leaderboard ──\n")
+
+    temp_input = input("  Race-day temperature in °C [15]: ").strip()
+    temp_celsius = float(temp_input) if temp_input else 15.0
+
+    sims_input = input("  Simulations per runner [10000]: ").strip()
+    simulations = int(sims_input) if sims_input else 10000
+
+    from course import load_course
+    from simulation import simulate_field
+
+    field = list(ELITE_MEN_2026.items())
+    total = len(field)
+    course = load_course()
+
+    print(f"\n  Simulating {total} runners × {simulations:,} races each … ", end="", flush=True)
+
+    pb_seconds = [time_to_seconds(pb) for _, pb in field]
+    field_results = simulate_field(pb_seconds, temp_celsius=temp_celsius, simulations=simulations,
+                                   course_profile=course)
+
+    results = build_leaderboard(field, field_results)
+    print("done.")
 
     # Print table
     print(f"\n  Race conditions: {temp_celsius}°C  |  {simulations:,} simulations per runner\n")
-    print(f"  {'#':>3s}  {'Runner':<25s}  {'PB':>8s}  {'Predicted':>9s}  {'DNF%':>6s}  Status")
-    print(f"  {'─' * 3}  {'─' * 25}  {'─' * 8}  {'─' * 9}  {'─' * 6}  {'─' * 8}")
+    print(f"  {'#':>3s}  {'Runner':<25s}  {'PB':>8s}  {'Predicted':>9s}  {'Win%':>6s}  {'Podium%':>7s}"
+          f"  {'DNF%':>6s}  Status")
+    print(f"  {'─' * 3}  {'─' * 25}  {'─' * 8}  {'─' * 9}  {'─' * 6}  {'─' * 7}  {'─' * 6}  {'─' * 8}")
 
     for i, r in enumerate(results, 1):
         marker = "  🔴" if r["status"] == "DNF" else ""
         print(
             f"  {i:3d}  {r['name']:<25s}  {r['pb']:>8s}  {r['predicted_time']:>9s}"
-            f"  {r['dnf_rate']:>6s}  {r['status']}{marker}"
+            f"  {r['win_prob']:>6s}  {r['podium_prob']:>7s}  {r['dnf_rate']:>6s}  {r['status']}{marker}"
         )
 
     print()
 
 
+# ---------------------------------------------------------------------------
+# Warm-up
+# ---------------------------------------------------------------------------
+# Small enough to be over in a few milliseconds; it exercises the engine's
+# NumPy code paths and memoizes the default pace table.
+WARM_UP_SIMULATIONS = 100
+
+
+def warm_up():
+    """Import the engine, load the default course from its compiled sidecar
+    and run a tiny simulation."""
+    try:
+        from course import load_course
+        from simulation import simulate_race_per_km
+
+        load_course(sidecar=True)  # same cache entry LondonCourseProfile() reads
+        simulate_race_per_km(2 * 3600 + 2 * 60 + 5, simulations=WARM_UP_SIMULATIONS, seed=0)
+    except Exception:
+        pass  # best effort — the first real call reports any problem
+
+
+def start_warm_up():
+    """Run :func:`warm_up` on a daemon thread and return the thread.
+
+    Imports take the import lock, so a prediction that starts before the
+    warm-up is done simply waits for it instead of importing twice.
+    """
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
 # ---------------------------------------------------------------------------
 # Main menu
 # ---------------------------------------------------------------------------
-def main():
+def menu():
     print(BANNER)
 
     while True:
@@ -174,5 +226,38 @@ def main():
             print("  ✗ Invalid choice, try again.\n")
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Elite Marathon Predictor CLI.")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help="run under cProfile and print a pstats report on exit; "
+                             "with FILE, also dump the raw stats there")
+    parser.add_argument("--profile-sort", default=instrumentation.PROFILE_SORT,
+                        help="pstats sort key for the report (default: %(default)s)")
+    parser.add_argument("--metrics", choices=("json", "prometheus"),
+                        help="print instrumentation timers and counters on exit")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="don't preload the engine and course while the menu is shown "
+                             "(implied by --profile and --metrics, which measure the cold path)")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND",
+                                     help="run non-interactively instead of showing the menu")
+    batch.add_commands(commands)
+    args = parser.parse_args(argv)
+
+    run = (lambda: batch.run_command(args)) if args.command else menu
+    if args.metrics:
+        instrumentation.enable()
+    if not (args.command or args.no_warmup or args.profile is not None or args.metrics):
+        start_warm_up()
+    try:
+        if args.profile is not None:
+            return instrumentation.run_profiled(run, output=args.profile or None, sort=args.profile_sort)
+        return run()
+    finally:
+        if args.metrics == "json":
+            print(instrumentation.GLOBAL.to_json(indent=2), file=sys.stderr)
+        elif args.metrics:
+            print(instrumentation.GLOBAL.to_prometheus(), file=sys.stderr, end="")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
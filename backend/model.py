@@ -1,4 +1,9 @@
+import json
+import math
+import os
+
 import numpy as np
+from sampling import standard_normals
 
 
 # ---------------------------------------------------------------------------
@@ -32,18 +37,28 @@ def get_fatigue_tier(pb_seconds):
     return FATIGUE_TIERS[-1][1], FATIGUE_TIERS[-1][2]
 
 
-def sample_fatigue_coeff(pb_seconds, rng=None):
+def sample_fatigue_coeff(pb_seconds, rng=None, size=None, seed=None, sampling="random"):
     """Draw a random fatigue coefficient for one simulated race.
 
     Uses a log-normal distribution so the median race is 'normal' but there
-    is a long right tail of blow-up performances.
+    is a long right tail of blow-up performances.  Pass ``size`` to draw a
+    whole batch of coefficients at once.  Without an ``rng`` a fresh
+    generator is built from ``seed`` (``None`` means OS entropy).
+
+    ``sampling`` spreads a batch over the distribution for variance
+    reduction — one of ``sampling.SAMPLING_MODES``; anything but
+    ``"random"`` needs ``size``.
     """
     if rng is None:
-        rng = np.random.default_rng()
+        rng = np.random.default_rng(seed)
     median, sigma = get_fatigue_tier(pb_seconds)
     # log-normal: median = exp(mu), so mu = ln(median)
     mu = np.log(median)
-    return rng.lognormal(mu, sigma)
+    if sampling == "random":
+        return rng.lognormal(mu, sigma, size)
+    if size is None:
+        raise ValueError(f"sampling={sampling!r} needs a batch size")
+    return np.exp(mu + sigma * standard_normals(rng, size, sampling))
 
 
 def fatigue_multiplier(distance_km, fatigue_coeff):
@@ -54,6 +69,15 @@ def fatigue_multiplier(distance_km, fatigue_coeff):
         return 1.0 + fatigue_coeff * ((distance_km - 30) ** 1.8)
 
 
+def fatigue_shape(distances_km):
+    """Deterministic part of the fatigue multiplier: ``(d - 30) ** 1.8`` after 30 km.
+
+    ``fatigue_multiplier(d, c) == 1 + c * fatigue_shape(d)``.
+    """
+    distances_km = np.asarray(distances_km, dtype=float)
+    return np.maximum(distances_km - 30, 0.0) ** 1.8
+
+
 # ---------------------------------------------------------------------------
 # DNF model
 # ---------------------------------------------------------------------------
@@ -115,4 +139,143 @@ def heat_multiplier(distance_km, temp_celsius):
     # Linear drift: 1.0 at km 1 → HEAT_DRIFT_MAX at km 42
     drift = 1.0 + (HEAT_DRIFT_MAX - 1.0) * ((distance_km - 1) / 41)
 
-    return 1.0 + base_penalty * drift
\ No newline at end of file
+    return 1.0 + base_penalty * drift
+
+
+def heat_multipliers(distances_km, temp_celsius, penalty_per_c=None):
+    """Vectorised :func:`heat_multiplier` over an array of distances.
+
+    ``penalty_per_c`` overrides ``HEAT_PENALTY_PER_C`` for scenario analysis.
+    """
+    distances_km = np.asarray(distances_km, dtype=float)
+    if temp_celsius <= OPTIMAL_TEMP_C:
+        return np.ones_like(distances_km)
+
+    if penalty_per_c is None:
+        penalty_per_c = HEAT_PENALTY_PER_C
+    excess = temp_celsius - OPTIMAL_TEMP_C
+    base_penalty = excess * penalty_per_c
+    drift = 1.0 + (HEAT_DRIFT_MAX - 1.0) * ((distances_km - 1) / 41)
+    return 1.0 + base_penalty * drift
+
+
+# ---------------------------------------------------------------------------
+# Pacing noise
+# ---------------------------------------------------------------------------
+# Per-km noise: sigma ramps linearly from NOISE_SIGMA_START at km 1 to
+# NOISE_SIGMA_START + NOISE_SIGMA_GROWTH at km 42.
+NOISE_SIGMA_START = 0.005
+NOISE_SIGMA_GROWTH = 0.020
+
+
+def noise_sigma(distance_km, start=None, growth=None):
+    """Per-km noise sigma at ``distance_km`` (a km number 1–42 or an array).
+
+    ``start`` and ``growth`` override NOISE_SIGMA_START / NOISE_SIGMA_GROWTH;
+    ``noise_sigma(d, 0.0, 1.0)`` is the bare 0 → 1 ramp.
+    """
+    if start is None:
+        start = NOISE_SIGMA_START
+    if growth is None:
+        growth = NOISE_SIGMA_GROWTH
+    return start + growth * ((distance_km - 1) / 41)
+
+# Bad-patch spikes (cramp, GI, wind, crowd): per-km probability and the
+# exponential scale relative to that km's sigma.
+SPIKE_PROB = 0.20
+SPIKE_SCALE = 2.5
+
+
+# ---------------------------------------------------------------------------
+# Parameter files
+# ---------------------------------------------------------------------------
+# The constants above are hand-set.  calibrate.py fits them to historical
+# results and writes them as JSON; load_parameters() swaps a file in for the
+# hand-set values.  Setting PREDICTOR_MODEL_PARAMS loads a file at import, so
+# pool worker processes pick it up too.  Everything else reads these
+# constants at call time, and result caches key on them.
+
+PARAMS_ENV = "PREDICTOR_MODEL_PARAMS"
+PARAMS_VERSION = 1
+
+
+def current_parameters():
+    """The tunable constants as a JSON-ready dict (open tier bounds as None)."""
+    return {
+        "fatigue_tiers": [[None if math.isinf(b) else b, c, s] for b, c, s in FATIGUE_TIERS],
+        "dnf_base_rates": [[None if math.isinf(b) else b, r] for b, r in DNF_BASE_RATES],
+        "heat_penalty_per_c": HEAT_PENALTY_PER_C,
+        "noise_sigma_start": NOISE_SIGMA_START,
+        "noise_sigma_growth": NOISE_SIGMA_GROWTH,
+        "spike_prob": SPIKE_PROB,
+        "spike_scale": SPIKE_SCALE,
+    }
+
+
+def _tiers(rows, width, name):
+    tiers = [tuple([float("inf") if row[0] is None else float(row[0])] + [float(v) for v in row[1:]])
+             for row in rows]
+    bounds = [t[0] for t in tiers]
+    if (not tiers or any(len(t) != width for t in tiers) or bounds != sorted(bounds)
+            or not math.isinf(bounds[-1]) or any(v < 0 for t in tiers for v in t[1:])):
+        raise ValueError(f"{name} must be rows of {width} non-negative values with increasing "
+                         "PB bounds, the last one open (null)")
+    return tiers
+
+
+def apply_parameters(params):
+    """Replace the module constants with the values in ``params``.
+
+    ``params`` uses the keys of :func:`current_parameters`; missing keys keep
+    their current value.  Raises ``ValueError`` on malformed values.
+    """
+    global FATIGUE_TIERS, DNF_BASE_RATES, HEAT_PENALTY_PER_C
+    global NOISE_SIGMA_START, NOISE_SIGMA_GROWTH, SPIKE_PROB, SPIKE_SCALE
+
+    updates = {}
+    if "fatigue_tiers" in params:
+        updates["FATIGUE_TIERS"] = _tiers(params["fatigue_tiers"], 3, "fatigue_tiers")
+    if "dnf_base_rates" in params:
+        updates["DNF_BASE_RATES"] = _tiers(params["dnf_base_rates"], 2, "dnf_base_rates")
+    for key in ("heat_penalty_per_c", "noise_sigma_start", "noise_sigma_growth", "spike_prob", "spike_scale"):
+        if key in params:
+            value = float(params[key])
+            if value < 0:
+                raise ValueError(f"{key} must be non-negative, got {value}")
+            updates[key.upper()] = value
+
+    # validated everything first, so a bad file changes nothing
+    FATIGUE_TIERS = updates.get("FATIGUE_TIERS", FATIGUE_TIERS)
+    DNF_BASE_RATES = updates.get("DNF_BASE_RATES", DNF_BASE_RATES)
+    HEAT_PENALTY_PER_C = updates.get("HEAT_PENALTY_PER_C", HEAT_PENALTY_PER_C)
+    NOISE_SIGMA_START = updates.get("NOISE_SIGMA_START", NOISE_SIGMA_START)
+    NOISE_SIGMA_GROWTH = updates.get("NOISE_SIGMA_GROWTH", NOISE_SIGMA_GROWTH)
+    SPIKE_PROB = updates.get("SPIKE_PROB", SPIKE_PROB)
+    SPIKE_SCALE = updates.get("SPIKE_SCALE", SPIKE_SCALE)
+
+
+def load_parameters(path):
+    """Load a parameter file written by :func:`save_parameters` and apply it.
+
+    Returns the file's contents (parameters plus any fit metadata).
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != PARAMS_VERSION:
+        raise ValueError(f"{path}: unsupported parameter file version {data.get('version')!r}")
+    apply_parameters(data["parameters"])
+    return data
+
+
+def save_parameters(path, params=None, **metadata):
+    """Write ``params`` (default: the current constants) as a parameter file.
+
+    Extra keyword arguments are stored alongside, e.g. fit diagnostics.
+    """
+    data = {"version": PARAMS_VERSION, "parameters": params or current_parameters(), **metadata}
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+if os.environ.get(PARAMS_ENV):
+    load_parameters(os.environ[PARAMS_ENV])
@@ -0,0 +1,142 @@
+"""
+Multi-core execution layer for large simulation batches.
+
+Simulations are cut into fixed-size shards and farmed out to a
+``ProcessPoolExecutor``.  Shard ``i`` always gets child ``i`` of
+``SeedSequence(seed).spawn(n_shards)`` and shards are merged in index order,
+so for a given seed the result is bit-for-bit identical whether it runs on
+one worker or sixteen — only ``shard_size`` changes the random streams.
+
+Merging is exact: DNF/finisher counts and per-km split sums are added up,
+and moments and percentiles are computed over the concatenated finish
+times, exactly as the single-process functions do.  A requested
+``distribution`` is built per shard and the shards' histograms are added.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from course import preload_course
+from simulation import (
+    DEFAULT_TEMP_C,
+    NUM_KM,
+    _resolve_course_profile,
+    _simulate_field_samples,
+    _new_distribution,
+    _simulate_samples,
+    _summarise,
+    _summarise_field,
+    pace_plan,
+)
+
+# Simulations per shard.  Large enough that pickling results back from a
+# worker is negligible next to the simulation itself.
+DEFAULT_SHARD_SIZE = 25_000
+
+
+def _shard_sizes(simulations, shard_size):
+    if simulations < 1:
+        raise ValueError(f"simulations must be positive, got {simulations}")
+    if shard_size < 1:
+        raise ValueError(f"shard_size must be positive, got {shard_size}")
+    full, rest = divmod(simulations, shard_size)
+    return [shard_size] * full + ([rest] if rest else [])
+
+
+def _shard_seeds(seed, n_shards):
+    ss = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return ss.spawn(n_shards)
+
+
+def _map_shards(fn, shard_args, workers):
+    """Run ``fn`` over the shard arguments, in order, on up to ``workers`` processes."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(shard_args)))
+
+    if workers == 1:
+        return [fn(*args) for args in shard_args]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=preload_course) as pool:
+        futures = [pool.submit(fn, *args) for args in shard_args]
+        return [f.result() for f in futures]
+
+
+# ---------------------------------------------------------------------------
+# Single runner
+# ---------------------------------------------------------------------------
+def _race_shard(pb_seconds, fatigue_coeff_override, temp_celsius, simulations,
+                method, course_profile, seed, distribution):
+    finish_times, all_splits, dnf_km = _simulate_samples(
+        pb_seconds, fatigue_coeff_override, temp_celsius, simulations,
+        method, course_profile, seed,
+    )
+    dist = _new_distribution(distribution)
+    if dist is not None:
+        dist.update(finish_times, dnf_km)
+    return finish_times, all_splits.sum(axis=0), len(dnf_km), dist
+
+
+def simulate_race_parallel(pb_seconds, fatigue_coeff_override=None,
+                           temp_celsius=DEFAULT_TEMP_C, simulations=10000,
+                           method="vectorized", course_profile=None, seed=None,
+                           workers=None, shard_size=DEFAULT_SHARD_SIZE, distribution=None):
+    """Sharded, multi-process :func:`simulation.simulate_race_per_km`.
+
+    Returns the same result dict.  ``workers`` defaults to the CPU count;
+    ``workers=1`` runs every shard in-process.  ``distribution`` is as in
+    ``simulate_race_per_km``.
+    """
+    course_profile = _resolve_course_profile(course_profile)
+    sizes = _shard_sizes(simulations, shard_size)
+    seeds = _shard_seeds(seed, len(sizes))
+
+    shards = _map_shards(_race_shard, [
+        (pb_seconds, fatigue_coeff_override, temp_celsius, n, method, course_profile, s, distribution)
+        for n, s in zip(sizes, seeds)
+    ], workers)
+
+    finish_times = np.concatenate([times for times, _, _, _ in shards])
+    split_sum = sum((sums for _, sums, _, _ in shards), np.zeros(NUM_KM))
+    dnf_count = sum(dnf for _, _, dnf, _ in shards)
+
+    mean_splits = split_sum / len(finish_times) if len(finish_times) > 0 else np.zeros(NUM_KM)
+    result = _summarise(finish_times, mean_splits, dnf_count, simulations, temp_celsius)
+    dist = _new_distribution(distribution)
+    if dist is not None:
+        for *_, shard_dist in shards:
+            dist.merge(shard_dist)
+        result["distribution"] = dist
+    result["pace_plan"] = pace_plan(pb_seconds, temp_celsius, course_profile)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Whole field
+# ---------------------------------------------------------------------------
+def simulate_field_parallel(pb_seconds, temp_celsius=DEFAULT_TEMP_C, simulations=10000,
+                            course_profile=None, seed=None,
+                            workers=None, shard_size=DEFAULT_SHARD_SIZE):
+    """Sharded, multi-process :func:`simulation.simulate_field`.
+
+    Each shard simulates the whole field for its slice of races; the finish
+    time matrices are concatenated before placings are computed, so
+    head-to-head statistics are exact.
+    """
+    pb_seconds = np.asarray(pb_seconds, dtype=float)
+    course_profile = _resolve_course_profile(course_profile)
+    sizes = _shard_sizes(simulations, shard_size)
+    seeds = _shard_seeds(seed, len(sizes))
+
+    shards = _map_shards(_simulate_field_samples, [
+        (pb_seconds, temp_celsius, n, course_profile, s)
+        for n, s in zip(sizes, seeds)
+    ], workers)
+
+    finish_times = np.concatenate([times for times, _ in shards], axis=1)
+    split_sums = sum(sums for _, sums in shards)
+    runners = _summarise_field(finish_times, split_sums, temp_celsius)
+    for pb, summary in zip(pb_seconds, runners):
+        summary["pace_plan"] = pace_plan(pb, temp_celsius, course_profile)
+    return runners
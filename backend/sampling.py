@@ -0,0 +1,104 @@
+"""
+Variance-reduction sampling for the fatigue coefficient.
+
+The fatigue coefficient is the dominant source of finish-time variance, so
+spreading its draws evenly over the log-normal distribution settles the
+estimates with far fewer races.  Every mode produces standard-normal variates
+``z`` (the coefficient is then ``exp(mu + sigma z)``):
+
+  random       independent draws (plain Monte Carlo)
+  antithetic   pairs z, -z
+  lhs          Latin hypercube — one draw in each of n equal-probability bins
+  sobol        randomly shifted Sobol points (in one dimension the Sobol
+               sequence is the base-2 van der Corput sequence)
+  stratified   SAMPLING_STRATA equal-probability strata of the fatigue
+               distribution with proportional allocation, random within each
+
+Each randomised set is an unbiased sample of the distribution, so estimates
+stay unbiased; their variance is measured across independent replicates.
+"""
+
+import numpy as np
+
+SAMPLING_MODES = ("random", "antithetic", "lhs", "sobol", "stratified")
+
+# Strata used by the "stratified" mode (good day … blow-up).
+SAMPLING_STRATA = 10
+
+
+# Acklam's rational approximation to the inverse normal CDF (relative error
+# below 1.2e-9), coefficients for the central and tail regions.
+_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+      1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+      6.680131188771972e+01, -1.328068155288572e+01)
+_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+      -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+      3.754408661907416e+00)
+_P_LOW = 0.02425
+
+
+def norm_ppf(u):
+    """Vectorised inverse standard-normal CDF for ``u`` in (0, 1)."""
+    u = np.asarray(u, dtype=float)
+    z = np.empty_like(u)
+
+    low = u < _P_LOW
+    high = u > 1 - _P_LOW
+    mid = ~(low | high)
+
+    q = u[mid] - 0.5
+    r = q * q
+    z[mid] = (((((_A[0] * r + _A[1]) * r + _A[2]) * r + _A[3]) * r + _A[4]) * r + _A[5]) * q / \
+             (((((_B[0] * r + _B[1]) * r + _B[2]) * r + _B[3]) * r + _B[4]) * r + 1)
+
+    for mask, sign, p in ((low, 1.0, u[low]), (high, -1.0, 1 - u[high])):
+        q = np.sqrt(-2 * np.log(p))
+        z[mask] = sign * (((((_C[0] * q + _C[1]) * q + _C[2]) * q + _C[3]) * q + _C[4]) * q + _C[5]) / \
+                  ((((_D[0] * q + _D[1]) * q + _D[2]) * q + _D[3]) * q + 1)
+    return z
+
+
+def van_der_corput(n, start=0):
+    """First ``n`` points of the base-2 van der Corput sequence from index ``start``."""
+    i = np.arange(start, start + n, dtype=np.uint64)
+    out = np.zeros(n)
+    scale = 0.5
+    while i.any():
+        out += (i & 1) * scale
+        i >>= np.uint64(1)
+        scale /= 2
+    return out
+
+
+def uniforms(rng, n, mode):
+    """``n`` uniforms on (0, 1) spread according to ``mode`` (see module docstring)."""
+    if mode == "random":
+        u = rng.random(n)
+    elif mode == "antithetic":
+        half = rng.random((n + 1) // 2)
+        u = np.concatenate((half, 1 - half))[:n]
+    elif mode == "lhs":
+        u = (rng.permutation(n) + rng.random(n)) / n
+    elif mode == "sobol":
+        u = (van_der_corput(n) + rng.random()) % 1.0
+    elif mode == "stratified":
+        counts = np.full(SAMPLING_STRATA, n // SAMPLING_STRATA)
+        counts[rng.permutation(SAMPLING_STRATA)[:n % SAMPLING_STRATA]] += 1
+        u = (np.repeat(np.arange(SAMPLING_STRATA), counts) + rng.random(n)) / SAMPLING_STRATA
+        u = rng.permutation(u)
+    else:
+        raise ValueError(f"Unknown sampling mode: {mode!r}  (expected one of {SAMPLING_MODES})")
+    # keep strictly inside (0, 1) for the inverse CDF
+    return np.clip(u, 1e-12, 1 - 1e-12)
+
+
+def standard_normals(rng, n, mode="random"):
+    """``n`` standard-normal variates drawn with the given sampling ``mode``."""
+    if mode == "random":
+        return rng.standard_normal(n)
+    if mode == "antithetic":
+        half = rng.standard_normal((n + 1) // 2)
+        return np.concatenate((half, -half))[:n]
+    return norm_ppf(uniforms(rng, n, mode))
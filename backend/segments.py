@@ -0,0 +1,218 @@
+"""
+Race simulation at arbitrary segment resolution.
+
+The per-km engine in ``simulation.py`` works on 42 fixed splits: the final
+195 m is folded into km 42 and every split costs a full kilometre of base
+pace, and short features such as Tower Bridge are averaged over a whole km.
+Here the course is cut into segments of ``segment_m`` metres (100 m, 250 m,
+...) along its cumulative-distance array, rescaled to the official 42.195 km
+so the timing mats fall on segment boundaries, and every segment costs
+``base_pace × true length``.
+
+The model is the per-km model spread over shorter pieces:
+
+  course    elevation gain/loss per km of segment (course.segment_multipliers)
+  heat      model.heat_multipliers at the segment's end distance
+  fatigue   1 + coeff × model.fatigue_shape at the segment's end distance
+  noise     Gaussian with sigma / sqrt(length_km), so a km's worth of
+            segments has the per-km variance; bad-patch spikes occur with
+            probability model.SPIKE_PROB × length_km and scale 1 / length_km, so a
+            km carries the same expected spike time
+  DNF       the runner's race DNF probability (model.get_dnf_rate), one
+            uniform draw per race
+
+Simulations run in chunks of about ``SEGMENT_CHUNK_ELEMENTS`` splits, so
+memory is bounded whatever the resolution and simulation count.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from course import Course, load_course, segment_multipliers
+import model
+from instrumentation import cache_lookup, count, phase, timed
+from model import get_dnf_rate, fatigue_shape, heat_multipliers, sample_fatigue_coeff
+from simulation import DEFAULT_TEMP_C, FATIGUE_ONSET_KM, _summarise
+
+RACE_DISTANCE_M = 42_195.0
+DEFAULT_SEGMENT_M = 100.0
+
+# Official timing mats: (label, distance in metres).
+TIMING_MATS = (
+    ("5K", 5_000.0), ("10K", 10_000.0), ("15K", 15_000.0), ("20K", 20_000.0),
+    ("Half", RACE_DISTANCE_M / 2), ("25K", 25_000.0), ("30K", 30_000.0),
+    ("35K", 35_000.0), ("40K", 40_000.0), ("Finish", RACE_DISTANCE_M),
+)
+
+# Working (chunk, segments) arrays are kept around this many elements.
+SEGMENT_CHUNK_ELEMENTS = 2_000_000
+
+# Summary percentiles reported for every timing mat.
+_PERCENTILES = (5, 25, 50, 75, 95)
+_PERCENTILE_KEYS = ("p5", "p25", "median", "p75", "p95")
+
+# Segment plans kept, least recently used evicted first.
+PLAN_CACHE_SIZE = 32
+_PLANS = OrderedDict()
+
+
+def segment_plan(course=None, segment_m=DEFAULT_SEGMENT_M):
+    """Cut a course into segments; LRU-cached per (course, resolution).
+
+    Returns a dict of per-segment arrays — ``start_m``, ``end_m``,
+    ``length_km``, ``course_multipliers``, ``noise_sigma`` — plus
+    ``mat_index``: for each of ``TIMING_MATS``, the number of segments that
+    end at or before it.
+    """
+    course = _resolve_course(course)
+    if segment_m <= 0:
+        raise ValueError(f"segment_m must be positive, got {segment_m}")
+    key = (course.source_hash, len(course.cum_dist), float(segment_m),
+           model.NOISE_SIGMA_START, model.NOISE_SIGMA_GROWTH)
+    plan = _PLANS.get(key)
+    cache_lookup("segment_plan", plan is not None)
+    if plan is not None:
+        _PLANS.move_to_end(key)
+        return plan
+
+    mats = np.array([d for _, d in TIMING_MATS])
+    grid = np.arange(0.0, RACE_DISTANCE_M, segment_m)
+    # drop grid lines within 1 m of a mat, so no sliver segments; mats always stay
+    near_mat = np.abs(grid[:, None] - mats).min(axis=1) < 1.0
+    bounds = np.union1d(grid[~near_mat], mats)
+
+    dist = np.asarray(course.cum_dist, dtype=float)
+    dist = dist * (RACE_DISTANCE_M / dist[-1])  # GPS length → official distance
+    length_km = np.diff(bounds) / 1000
+    end_km = bounds[1:] / 1000
+
+    plan = {
+        "start_m": bounds[:-1],
+        "end_m": bounds[1:],
+        "length_km": length_km,
+        "course_multipliers": segment_multipliers(dist, course.elevation, bounds),
+        # per-km sigma at the km this segment ends in, widened for its length
+        "noise_sigma": model.noise_sigma(np.clip(np.ceil(end_km), 1, 42)) / np.sqrt(length_km),
+        "mat_index": np.searchsorted(bounds[1:], mats, side="right"),
+    }
+    for arr in plan.values():
+        arr.setflags(write=False)
+    _PLANS[key] = plan
+    if len(_PLANS) > PLAN_CACHE_SIZE:
+        _PLANS.popitem(last=False)
+    return plan
+
+
+def _resolve_course(course):
+    if course is None:
+        return load_course()
+    if not isinstance(course, Course):
+        raise TypeError("segment simulation needs a course.Course (cumulative distance "
+                        f"and elevation), got {type(course).__name__}")
+    return course
+
+
+@timed("simulate_race_segments")
+def simulate_race_segments(pb_seconds, temp_celsius=DEFAULT_TEMP_C, simulations=10000,
+                           segment_m=DEFAULT_SEGMENT_M, course=None, seed=None,
+                           fatigue_coeff_override=None):
+    """Monte Carlo simulation at ``segment_m`` resolution with timing-mat splits.
+
+    Returns the usual summary (mean_time, std_dev, p5 … p95, dnf_count,
+    dnf_rate, finishers, simulations, temp_celsius) plus:
+
+      mean_splits  mean time per segment over finishers
+      segments     the :func:`segment_plan` start/end distances and lengths
+      splits       one row per timing mat: elapsed-time and
+                   since-previous-mat statistics over finishers
+      half         the half-marathon row of ``splits``
+    """
+    plan = segment_plan(course, segment_m)
+    n_seg = len(plan["length_km"])
+    rng = np.random.default_rng(seed)
+
+    # deterministic part: seconds per segment without noise or fatigue
+    base = (pb_seconds / 42.195 * plan["length_km"] * plan["course_multipliers"]
+            * heat_multipliers(plan["end_m"] / 1000, temp_celsius))
+    end_km = plan["end_m"] / 1000
+    tail = int(np.searchsorted(end_km, FATIGUE_ONSET_KM, side="right"))
+    tail_shape = fatigue_shape(end_km[tail:])
+    sigma = plan["noise_sigma"]
+    spike_prob = np.minimum(model.SPIKE_PROB * plan["length_km"], 1.0)
+    spike_scale = sigma * np.sqrt(plan["length_km"]) * model.SPIKE_SCALE / plan["length_km"]
+
+    dnf_rate = get_dnf_rate(pb_seconds)
+    mat_starts = np.concatenate(([0], plan["mat_index"][:-1]))
+    chunk = max(1, SEGMENT_CHUNK_ELEMENTS // n_seg)
+
+    finish_parts, elapsed_parts = [], []
+    split_sum = np.zeros(n_seg)
+    dnf_count = 0
+
+    for start in range(0, simulations, chunk):
+        n = min(chunk, simulations - start)
+        with phase("engine.rng"):
+            if fatigue_coeff_override is not None:
+                fc = np.full(n, float(fatigue_coeff_override))
+            else:
+                fc = sample_fatigue_coeff(pb_seconds, rng, size=n)
+            finished = rng.random(n) >= dnf_rate
+            n_done = int(finished.sum())
+            dnf_count += n - n_done
+            fc = fc[finished]
+
+            splits = rng.standard_normal((n_done, n_seg))
+            splits *= sigma
+            rows, cols = np.nonzero(rng.random((n_done, n_seg)) < spike_prob)
+            splits[rows, cols] += rng.standard_exponential(len(rows)) * spike_scale[cols]
+            splits += 1.0
+
+        with phase("engine.model"):
+            splits *= base
+            splits[:, tail:] *= 1.0 + fc[:, None] * tail_shape
+
+            split_sum += splits.sum(axis=0)
+            between = np.add.reduceat(splits, mat_starts, axis=1)
+            elapsed = np.cumsum(between, axis=1)
+            finish_parts.append(elapsed[:, -1])
+            elapsed_parts.append(elapsed)
+
+    count("simulations", simulations)
+    count("km_evaluated", (simulations - dnf_count) * n_seg)
+    count("dnfs", dnf_count)
+
+    finish_times = np.concatenate(finish_parts) if finish_parts else np.empty(0)
+    elapsed = np.concatenate(elapsed_parts) if elapsed_parts else np.empty((0, len(TIMING_MATS)))
+    mean_splits = split_sum / len(finish_times) if len(finish_times) else np.zeros(n_seg)
+    result = _summarise(finish_times, mean_splits, dnf_count, simulations, temp_celsius)
+    with phase("engine.summary"):
+        splits_table = split_table(elapsed)
+    result["segments"] = {k: plan[k] for k in ("start_m", "end_m", "length_km")}
+    result["splits"] = splits_table
+    result["half"] = next(row for row in splits_table if row["mat"] == "Half")
+    return result
+
+
+def split_table(elapsed):
+    """Timing-mat table from (finishers, len(TIMING_MATS)) elapsed times.
+
+    Each row has the mat label and distance, ``elapsed`` and ``split`` (time
+    since the previous mat) statistics: mean and p5 … p95.
+    """
+    between = np.diff(elapsed, axis=1, prepend=0.0)
+    rows = []
+    for j, (label, distance) in enumerate(TIMING_MATS):
+        rows.append({
+            "mat": label,
+            "distance_m": distance,
+            "elapsed": _describe(elapsed[:, j]),
+            "split": _describe(between[:, j]),
+        })
+    return rows
+
+
+def _describe(values):
+    if len(values) == 0:
+        return {"mean": float("inf"), **dict.fromkeys(_PERCENTILE_KEYS, 0.0)}
+    pcts = np.percentile(values, _PERCENTILES)
+    return {"mean": float(values.mean()), **dict(zip(_PERCENTILE_KEYS, pcts.tolist()))}
@@ -0,0 +1,391 @@
+"""
+Elite Marathon Predictor — HTTP API
+
+    uvicorn server:app
+
+Simulations are CPU-bound, so every request is handed to a bounded process
+pool and the event loop only ever awaits it.  Identical requests that arrive
+while a computation is in flight share that computation, and once
+``max_pending`` distinct computations are queued or running further requests
+are rejected with ``429 Too Many Requests`` instead of piling up.  Results
+are also served from a deterministic response cache; requests without a
+``seed`` run with one derived from their parameters, so they are cached too.
+
+Long leaderboard and sweep runs can instead be submitted as background jobs
+(``/jobs/...``, see ``jobs.py``): the response carries a job ID that can be
+polled, streamed as newline-delimited JSON while runners complete, or
+cancelled.  Job simulations run in the same process pool, one runner at a
+time per job, and submissions beyond the job queue's bound get a 429 too.
+
+With ``PREDICTOR_INSTRUMENT=1`` the engine's phase timers and counters (see
+``instrumentation.py``), including those recorded inside pool workers, are
+served at ``/metrics`` in the Prometheus text format.
+
+Configuration (environment):
+  PREDICTOR_WORKERS      worker processes (default: CPU count)
+  PREDICTOR_MAX_PENDING  distinct computations in flight before 429 (default: 32)
+  PREDICTOR_JOB_WORKERS  background jobs run concurrently (default: 2)
+  PREDICTOR_MAX_JOBS     finished jobs kept for polling (default: 100)
+  PREDICTOR_INSTRUMENT   record engine metrics for /metrics (default: off)
+"""
+
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+import numpy as np
+from fastapi import Body, FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+
+import instrumentation
+
+from cache import ResultCache, default_seed, field_cache_key, race_cache_key
+from course import load_course, preload_course
+from jobs import DEFAULT_MAX_CONCURRENT, DEFAULT_MAX_FINISHED, JobManager, QueueFull
+from main import build_leaderboard
+from runners import ELITE_MEN_2026
+from simulation import DEFAULT_TEMP_C, simulate_field, simulate_race_per_km
+from stats import RaceDistribution
+from timefmt import format_result_time, time_to_seconds
+
+DEFAULT_SIMULATIONS = 10000
+MAX_SIMULATIONS = 1_000_000
+DEFAULT_MAX_PENDING = 32
+RETRY_AFTER_SECONDS = 1
+EVENT_POLL_SECONDS = 15.0
+
+# Trimmed, JSON-ready results of seeded requests.  Separate from
+# cache.RESULT_CACHE, whose entries are full simulation result dicts.
+RESPONSE_CACHE = ResultCache(name="response")
+
+
+class Overloaded(Exception):
+    """Raised when the pool already has ``max_pending`` computations in flight."""
+
+
+class SimulationPool:
+    """Process pool front-end with request coalescing and backpressure."""
+
+    def __init__(self, workers=None, max_pending=DEFAULT_MAX_PENDING):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        # also handed to the JobManager, so background jobs share these workers
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=preload_course)
+        self._inflight = {}  # key -> asyncio.Future
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    async def run(self, key, fn, *args):
+        """Run ``fn(*args)`` in a worker, sharing the result with any
+        concurrent call made with the same ``key``."""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            if len(self._inflight) >= self.max_pending:
+                self.rejected += 1
+                raise Overloaded
+            loop = asyncio.get_running_loop()
+            if instrumentation.is_enabled():
+                future = asyncio.ensure_future(_merge_recorded(
+                    loop.run_in_executor(self.executor, instrumentation.run_recorded, fn, *args)))
+            else:
+                future = loop.run_in_executor(self.executor, fn, *args)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.submitted += 1
+        # shield: one client disconnecting must not cancel everyone's result
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": len(self._inflight),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------------------------------------------------------------------
+# Worker jobs (run in the pool — module-level so they pickle)
+# ---------------------------------------------------------------------------
+async def _merge_recorded(future):
+    value, recorder = await future
+    instrumentation.GLOBAL.merge(recorder)
+    return value
+
+
+def _predict_job(pb_seconds, temp_celsius, simulations, seed, course_profile):
+    r = simulate_race_per_km(pb_seconds, temp_celsius=temp_celsius, simulations=simulations,
+                             course_profile=course_profile, seed=seed)
+    summary = {k: float(r[k]) for k in ("median", "mean_time", "p5", "p95", "std_dev", "dnf_rate")}
+    summary["finishers"] = int(r["finishers"])
+    return summary
+
+
+def _distribution_job(pb_seconds, temp_celsius, simulations, seed, course_profile, bin_seconds):
+    r = simulate_race_per_km(pb_seconds, temp_celsius=temp_celsius, simulations=simulations,
+                             course_profile=course_profile, seed=seed, distribution=bin_seconds)
+    return r["distribution"].to_bytes()
+
+
+def _leaderboard_job(pb_seconds, temp_celsius, simulations, seed, course_profile):
+    runners = simulate_field(pb_seconds, temp_celsius=temp_celsius, simulations=simulations,
+                             course_profile=course_profile, seed=seed)
+    keep = ("median", "dnf_rate", "win_prob", "podium_prob", "expected_position")
+    return [{**{k: float(r[k]) for k in keep}, "finishers": int(r["finishers"])} for r in runners]
+
+
+# ---------------------------------------------------------------------------
+# App
+# ---------------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app):
+    workers = int(os.environ.get("PREDICTOR_WORKERS", 0)) or None
+    max_pending = int(os.environ.get("PREDICTOR_MAX_PENDING", DEFAULT_MAX_PENDING))
+    # The course is loaded (and so hashed) once, before serving: cache keys and
+    # workers both use these multipliers, so no request parses the GPX on the
+    # event loop.  Restart to pick up an edited course file.
+    app.state.course = np.array(load_course(sidecar=True).km_multipliers)
+    app.state.course.setflags(write=False)
+    app.state.pool = SimulationPool(workers=workers, max_pending=max_pending)
+    app.state.jobs = JobManager(
+        max_concurrent=int(os.environ.get("PREDICTOR_JOB_WORKERS", DEFAULT_MAX_CONCURRENT)),
+        max_finished=int(os.environ.get("PREDICTOR_MAX_JOBS", DEFAULT_MAX_FINISHED)),
+        executor=app.state.pool.executor,
+    )
+    try:
+        yield
+    finally:
+        app.state.jobs.shutdown()
+        app.state.pool.shutdown()
+
+
+app = FastAPI(title="Elite Marathon Predictor", lifespan=lifespan)
+
+
+async def _compute(key, fn, *args):
+    """Serve from the response cache, otherwise via the pool.  Unseeded
+    requests run with ``cache.default_seed(key)``, so every call is cacheable."""
+    hit, value = RESPONSE_CACHE.get(key)
+    if hit:
+        return value
+    try:
+        value = await app.state.pool.run(key, fn, *args)
+    except Overloaded:
+        raise HTTPException(
+            status_code=429,
+            detail="Simulation queue is full, retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    RESPONSE_CACHE.put(key, value)
+    return value
+
+
+@app.post("/predict")
+async def predict(
+    pb_time: str,
+    temp_celsius: float = DEFAULT_TEMP_C,
+    simulations: int = Query(DEFAULT_SIMULATIONS, ge=1, le=MAX_SIMULATIONS),
+    seed: int | None = None,
+):
+    """Single runner prediction.
+
+    Without ``seed`` the run uses a seed derived from the other parameters, so
+    identical requests return identical, cached results.
+    """
+    try:
+        pb_seconds = time_to_seconds(pb_time)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    key = race_cache_key(pb_seconds, temp_celsius, simulations, seed, app.state.course)
+    seed = default_seed(key) if seed is None else seed
+    r = await _compute(key, _predict_job, pb_seconds, temp_celsius, simulations, seed, app.state.course)
+
+    return {
+        "pb": pb_time,
+        "predicted_median": format_result_time(r, "median", dnf=None),
+        "predicted_mean": format_result_time(r, "mean_time", dnf=None),
+        "best_5_percent": format_result_time(r, "p5", dnf=None),
+        "worst_5_percent": format_result_time(r, "p95", dnf=None),
+        "std_dev_seconds": round(r["std_dev"], 1),
+        "dnf_rate": f"{r['dnf_rate']:.1%}",
+        "temp_celsius": temp_celsius,
+        "simulations": simulations,
+    }
+
+
+@app.post("/predict/distribution")
+async def predict_distribution(
+    pb_time: str,
+    temp_celsius: float = DEFAULT_TEMP_C,
+    simulations: int = Query(DEFAULT_SIMULATIONS, ge=1, le=MAX_SIMULATIONS),
+    seed: int | None = None,
+    bin_seconds: float = Query(1.0, gt=0, le=600),
+    format: str = Query("json", pattern="^(json|binary)$"),
+):
+    """Finish-time histogram and DNF-km counts for one runner.
+
+    ``format=binary`` returns ``stats.RaceDistribution.to_bytes()``
+    (application/octet-stream), which clients can merge across requests.
+    """
+    try:
+        pb_seconds = time_to_seconds(pb_time)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    key = ("distribution", float(bin_seconds)) + race_cache_key(pb_seconds, temp_celsius, simulations,
+                                                                 seed, app.state.course)
+    seed = default_seed(key) if seed is None else seed
+    data = await _compute(key, _distribution_job, pb_seconds, temp_celsius, simulations, seed,
+                          app.state.course, bin_seconds)
+    if format == "binary":
+        return Response(content=data, media_type="application/octet-stream")
+    dist = RaceDistribution.from_bytes(data)
+    return {"pb": pb_time, "temp_celsius": temp_celsius, "simulations": simulations,
+            "finishers": dist.finishers, "dnf_rate": dist.dnf_rate, **dist.to_dict()}
+
+
+@app.get("/leaderboard")
+async def leaderboard(
+    temp_celsius: float = DEFAULT_TEMP_C,
+    simulations: int = Query(DEFAULT_SIMULATIONS, ge=1, le=MAX_SIMULATIONS),
+    seed: int | None = None,
+):
+    """Full elite field simulation, ranked by predicted median.
+
+    Like ``/predict``, unseeded requests use a derived seed and are cached.
+    """
+    field = list(ELITE_MEN_2026.items())
+    pb_seconds = [time_to_seconds(pb) for _, pb in field]
+
+    key = field_cache_key(pb_seconds, temp_celsius, simulations, seed, app.state.course)
+    seed = default_seed(key) if seed is None else seed
+    runners = await _compute(key, _leaderboard_job, pb_seconds, temp_celsius, simulations, seed,
+                             app.state.course)
+
+    rows = build_leaderboard(field, runners)
+    for rank, row in enumerate(rows, 1):
+        row["rank"] = rank
+        if row["status"] == "DNF":
+            row["predicted_seconds"] = None  # inf is not valid JSON
+    return {"temp_celsius": temp_celsius, "simulations": simulations, "runners": rows}
+
+
+@app.get("/stats")
+async def stats():
+    """Worker-pool and result-cache counters."""
+    jobs = app.state.jobs.list()
+    return {
+        "pool": app.state.pool.stats(),
+        "cache": RESPONSE_CACHE.stats(),
+        "jobs": {status: sum(j.status == status for j in jobs)
+                 for status in ("queued", "running", "done", "cancelled", "failed")},
+    }
+
+
+@app.get("/metrics")
+async def metrics(format: str = Query("prometheus", pattern="^(prometheus|json)$")):
+    """Engine phase timers and counters (empty unless PREDICTOR_INSTRUMENT is set)."""
+    if format == "json":
+        return instrumentation.GLOBAL.snapshot()
+    return PlainTextResponse(instrumentation.GLOBAL.to_prometheus(),
+                             media_type="text/plain; version=0.0.4")
+
+
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+def _submit(submit, *args, **kwargs):
+    try:
+        job = submit(*args, **kwargs)
+    except QueueFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Job queue is full, retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return job.snapshot()
+
+
+def _get_job(job_id):
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@app.post("/jobs/leaderboard", status_code=202)
+async def submit_leaderboard_job(
+    temp_celsius: float = DEFAULT_TEMP_C,
+    simulations: int = Query(DEFAULT_SIMULATIONS, ge=1, le=MAX_SIMULATIONS),
+    seed: int | None = None,
+):
+    """Queue a full-field leaderboard run; returns the job (with its ``job_id``)."""
+    return _submit(app.state.jobs.submit_leaderboard, temp_celsius=temp_celsius,
+                   simulations=simulations, seed=seed, course_profile=app.state.course)
+
+
+@app.post("/jobs/sweep", status_code=202)
+async def submit_sweep_job(
+    scenarios: list[float | dict] = Body(..., embed=True),
+    simulations: int = Query(DEFAULT_SIMULATIONS, ge=1, le=MAX_SIMULATIONS),
+    seed: int | None = None,
+):
+    """Queue a scenario sweep.  Body: ``{"scenarios": [10, 15, {"temp_celsius": 20, ...}]}``.
+
+    422 if scenarios × runners × simulations exceeds ``jobs.MAX_SWEEP_SAMPLES``.
+    """
+    return _submit(app.state.jobs.submit_sweep, scenarios, simulations=simulations, seed=seed,
+                   course_profile=app.state.course)
+
+
+@app.get("/jobs")
+async def list_jobs():
+    """Every retained job, without results."""
+    return [job.snapshot(include_result=False) for job in app.state.jobs.list()]
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, progress and — once done — its result."""
+    return _get_job(job_id).snapshot()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, start: int = Query(0, ge=0)):
+    """Stream the job's events as newline-delimited JSON until it finishes."""
+    job = _get_job(job_id)
+
+    async def stream():
+        i = start
+        while True:
+            # wait for the next event in a thread so the event loop stays free
+            done = job.done  # read first: a finished job's log is complete
+            events = await asyncio.to_thread(job.wait_events, i, EVENT_POLL_SECONDS)
+            for event in events:
+                yield json.dumps(event) + "\n"
+            i += len(events)
+            if done and not events:
+                return
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Request cancellation; the job stops before its next runner."""
+    job = _get_job(job_id)
+    job.cancel()
+    return job.snapshot(include_result=False)
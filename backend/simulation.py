@@ -1,42 +1,96 @@
+import hashlib
+import json
+from collections import OrderedDict
+from statistics import NormalDist
+
 import numpy as np
+import model
 from model import (
     fatigue_multiplier,
+    fatigue_shape,
     heat_multiplier,
+    heat_multipliers,
     sample_fatigue_coeff,
+    get_fatigue_tier,
     get_dnf_rate,
 )
-from course import LondonCourseProfile
+from course import Course, LondonCourseProfile
+from instrumentation import cache_lookup, count, phase, timed
+from sampling import SAMPLING_MODES
+from stats import DEFAULT_BIN_SECONDS, RaceDistribution, RunningMoments, TimeHistogram
 
 # London Marathon historical average temperature
 DEFAULT_TEMP_C = 15.0
 
+NUM_KM = 42
 
-def simulate_race_per_km(pb_seconds, fatigue_coeff_override=None,
-                          temp_celsius=DEFAULT_TEMP_C, simulations=10000):
-    """Monte Carlo marathon simulation with realistic variance.
+# DNF hazard applies to every km after this one.
+DNF_ONSET_KM = 30
 
-    Key differences from a naive model:
-      1. Fatigue coefficient is drawn per-simulation from a log-normal
-         distribution (unless overridden), producing good days AND blow-ups.
-      2. Per-km noise is *asymmetric* and *grows with distance* —
-         later km can go very wrong but not magically fast.
-      3. A DNF hazard accumulates after 30 km; some simulations are DNFs.
+# model.fatigue_multiplier is exactly 1.0 up to and including this km.
+FATIGUE_ONSET_KM = 30
+
+# Distance at the end of each simulated km, and the fatigue shape over it.
+KM_DISTANCES = np.arange(1, NUM_KM + 1, dtype=float)
+FATIGUE_SHAPE = fatigue_shape(KM_DISTANCES)
+FATIGUE_SHAPE.setflags(write=False)
+
+# How many (course, temperature) pace tables to keep memoized.
+PACE_TABLE_CACHE_SIZE = 256
+
+SIMULATION_METHODS = ("vectorized", "scalar")
+
+PERCENTILE_MODES = ("exact", "sketch")
+
+# Streaming mode's default chunk: (10k, 42) float64 splits ≈ 3.4 MB.
+DEFAULT_STREAM_CHUNK_SIZE = 10_000
+
+# Independently randomised replicates behind a sampling-mode result.
+SAMPLING_REPLICATES = 16
+
+# simulate_field works through the simulations in chunks so that its
+# (runners, chunk, 42) working arrays stay around this many elements.
+FIELD_CHUNK_ELEMENTS = 1_000_000
+
+
+_NOISE_SIGMAS = {}
+
+
+def km_noise_sigma():
+    """Read-only per-km noise sigma: a linear ramp from ``model.NOISE_SIGMA_START``
+    at km 1 to ``NOISE_SIGMA_START + NOISE_SIGMA_GROWTH`` at km 42.
+
+    Built from the current model constants (see ``model.load_parameters``).
     """
-    rng = np.random.default_rng()
+    key = (model.NOISE_SIGMA_START, model.NOISE_SIGMA_GROWTH)
+    sigma = _NOISE_SIGMAS.get(key)
+    if sigma is None:
+        sigma = model.noise_sigma(KM_DISTANCES)
+        sigma.setflags(write=False)
+        _NOISE_SIGMAS.clear()
+        _NOISE_SIGMAS[key] = sigma
+    return sigma
 
-    base_pace = pb_seconds / 42.195
-    course_profile = LondonCourseProfile()  # 42-element array
-    dnf_rate = get_dnf_rate(pb_seconds)
 
-    # Convert overall DNF probability into a per-km hazard after km 30.
-    # P(finish) = (1 - h)^12  =>  h = 1 - (1 - dnf_rate)^(1/12)
+def _per_km_dnf_hazard(dnf_rate):
+    """Convert overall DNF probability into a per-km hazard after km 30.
+
+    P(finish) = (1 - h)^12  =>  h = 1 - (1 - dnf_rate)^(1/12)
+    """
     if dnf_rate > 0:
-        per_km_dnf_hazard = 1 - (1 - dnf_rate) ** (1 / 12)
-    else:
-        per_km_dnf_hazard = 0.0
+        return 1 - (1 - dnf_rate) ** (1 / (NUM_KM - DNF_ONSET_KM))
+    return 0.0
+
+
+def _simulate_scalar(rng, pb_seconds, base_pace, course_profile, per_km_dnf_hazard,
+                     fatigue_coeff_override, temp_celsius, simulations):
+    """Reference engine: one Python-level loop iteration per simulated km.
 
+    Slow, but a literal transcription of the model — kept so the vectorized
+    engine can be checked against it statistically.
+    """
     finish_times = []
-    dnf_count = 0
+    dnf_km = []
     all_splits = []
 
     for _ in range(simulations):
@@ -47,15 +101,15 @@ def simulate_race_per_km(pb_seconds, fatigue_coeff_override=None,
             fc = sample_fatigue_coeff(pb_seconds, rng)
 
         km_splits = []
-        dnf = False
+        dnf = None
 
-        for km in range(42):
+        for km in range(NUM_KM):
             dist = km + 1
 
             # --- DNF check after km 30 ---
-            if dist > 30 and per_km_dnf_hazard > 0:
+            if dist > DNF_ONSET_KM and per_km_dnf_hazard > 0:
                 if rng.random() < per_km_dnf_hazard:
-                    dnf = True
+                    dnf = dist
                     break
 
             fatigue = fatigue_multiplier(dist, fc)
@@ -63,18 +117,18 @@ def simulate_race_per_km(pb_seconds, fatigue_coeff_override=None,
 
             # --- Asymmetric noise that grows with distance ---
             # Base sigma grows from 0.005 at km 1 to 0.025 at km 42
-            sigma = 0.005 + 0.020 * (km / 41)
+            sigma = model.noise_sigma(dist)
             # Positive skew: use exponential spike on top of gaussian
             gaussian_noise = rng.normal(0, sigma)
             # 20% chance of a bad-patch spike per km (cramp, GI, wind, crowd)
-            if rng.random() < 0.20:
-                gaussian_noise += rng.exponential(sigma * 2.5)
+            if rng.random() < model.SPIKE_PROB:
+                gaussian_noise += rng.exponential(sigma * model.SPIKE_SCALE)
 
             km_time = base_pace * fatigue * heat * course_profile[km] * (1 + gaussian_noise)
             km_splits.append(km_time)
 
-        if dnf:
-            dnf_count += 1
+        if dnf is not None:
+            dnf_km.append(dnf)
             continue
 
         total_time = sum(km_splits)
@@ -82,23 +136,664 @@ def simulate_race_per_km(pb_seconds, fatigue_coeff_override=None,
         all_splits.append(km_splits)
 
     finish_times = np.array(finish_times)
-    all_splits = np.array(all_splits) if all_splits else np.empty((0, 42))
+    all_splits = np.array(all_splits) if all_splits else np.empty((0, NUM_KM))
+    _count_races(simulations, all_splits.size, len(dnf_km))
+    return finish_times, all_splits, np.array(dnf_km, dtype=np.int64)
+
+
+def _count_races(simulations, km_evaluated, dnfs):
+    count("simulations", simulations)
+    count("km_evaluated", km_evaluated)
+    count("dnfs", dnfs)
+
+
+def _simulate_vectorized(rng, pb_seconds, base_pace, course_profile, per_km_dnf_hazard,
+                         fatigue_coeff_override, temp_celsius, simulations):
+    """Batched engine: every random component is drawn as a (sims, 42) array.
+
+    Same model as :func:`_simulate_scalar`, but the RNG draw order differs,
+    so the two agree in distribution rather than sample-for-sample.
+    ``fatigue_coeff_override`` may also hold one coefficient per simulation.
+
+    Both engines return ``(finish_times, all_splits, dnf_km)``: finishers'
+    times and (finishers, 42) splits, and the km (31–42) at which each DNF
+    dropped out.
+    """
+    with phase("engine.rng"):
+        if fatigue_coeff_override is not None:
+            fc = np.broadcast_to(np.asarray(fatigue_coeff_override, dtype=float), (simulations,))
+        else:
+            fc = sample_fatigue_coeff(pb_seconds, rng, size=simulations)
+
+        # DNF: a simulation drops out if any post-onset km hazard fires.
+        n_hazard_km = NUM_KM - DNF_ONSET_KM
+        if per_km_dnf_hazard > 0:
+            hazard_hits = rng.random((simulations, n_hazard_km)) < per_km_dnf_hazard
+            dnf_mask = hazard_hits.any(axis=1)
+            # the first km whose hazard fired is where the race ended
+            dnf_km = DNF_ONSET_KM + 1 + hazard_hits[dnf_mask].argmax(axis=1)
+        else:
+            dnf_mask = np.zeros(simulations, dtype=bool)
+            dnf_km = np.empty(0, dtype=np.int64)
+        finished = ~dnf_mask
+        n_finish = int(finished.sum())
+
+        # Only finishers contribute splits, so draw noise for those rows only.
+        sigma = km_noise_sigma()
+        all_splits = rng.standard_normal((n_finish, NUM_KM))
+        all_splits *= sigma
+        spikes = rng.random((n_finish, NUM_KM)) < model.SPIKE_PROB
+        all_splits += spikes * rng.standard_exponential((n_finish, NUM_KM)) * (sigma * model.SPIKE_SCALE)
+        all_splits += 1.0
+
+    with phase("engine.model"):
+        all_splits *= base_pace * _course_heat_table(course_profile, temp_celsius)
+        all_splits[:, FATIGUE_ONSET_KM:] *= 1.0 + fc[finished, None] * FATIGUE_SHAPE[FATIGUE_ONSET_KM:]
+        finish_times = all_splits.sum(axis=1)
+
+    _count_races(simulations, all_splits.size, len(dnf_km))
+    return finish_times, all_splits, dnf_km
+
+
+def _resolve_course_profile(course_profile):
+    """Return the 42-element multiplier array for a course argument."""
+    if course_profile is None:
+        return LondonCourseProfile()
+    if isinstance(course_profile, Course):
+        return course_profile.km_multipliers
+    course_profile = np.asarray(course_profile, dtype=float)
+    if course_profile.shape != (NUM_KM,):
+        raise ValueError(f"course_profile must have {NUM_KM} per-km multipliers, got shape {course_profile.shape}")
+    return course_profile
+
+
+# ---------------------------------------------------------------------------
+# Deterministic pace plan
+# ---------------------------------------------------------------------------
+# Course and heat multipliers depend only on (course, km, temperature), so
+# they are computed once per scenario and every simulation only supplies its
+# random components: split = base_pace × table[km] × fatigue × (1 + noise).
+_PACE_TABLES = OrderedDict()
+
+
+def _course_heat_table(course_profile, temp_celsius, penalty_per_c=None):
+    """Memoized, read-only 42-vector of course × heat multipliers."""
+    if penalty_per_c is None:
+        penalty_per_c = model.HEAT_PENALTY_PER_C
+    key = (course_hash(course_profile), float(temp_celsius),
+           model.OPTIMAL_TEMP_C, float(penalty_per_c), model.HEAT_DRIFT_MAX)
+    table = _PACE_TABLES.get(key)
+    cache_lookup("pace_table", table is not None)
+    if table is None:
+        with phase("model.pace_table"):
+            table = (heat_multipliers(KM_DISTANCES, temp_celsius, penalty_per_c)
+                     * _resolve_course_profile(course_profile))
+        table.setflags(write=False)
+        _PACE_TABLES[key] = table
+        if len(_PACE_TABLES) > PACE_TABLE_CACHE_SIZE:
+            _PACE_TABLES.popitem(last=False)
+    else:
+        _PACE_TABLES.move_to_end(key)
+    return table
+
+
+def pace_plan(pb_seconds, temp_celsius=DEFAULT_TEMP_C, course_profile=None):
+    """The deterministic part of a runner's race, km by km.
+
+    Returns a dict of 42-element arrays:
+
+      course_multipliers  elevation multipliers from the course profile
+      heat_multipliers    temperature multipliers with progressive drift
+      base_splits         base_pace × course × heat — the no-fatigue,
+                          no-noise split for each km
+      fatigue_shape       (d - 30) ** 1.8; a race's fatigue multiplier is
+                          1 + coeff × fatigue_shape
+    """
+    course_profile = _resolve_course_profile(course_profile)
+    return {
+        "course_multipliers": course_profile.copy(),
+        "heat_multipliers": heat_multipliers(KM_DISTANCES, temp_celsius),
+        "base_splits": pb_seconds / 42.195 * _course_heat_table(course_profile, temp_celsius),
+        "fatigue_shape": FATIGUE_SHAPE.copy(),
+    }
+
+
+def course_hash(course_profile=None):
+    """Stable identifier for a course argument (see :func:`simulate_race_per_km`).
+
+    Hashes the per-km multipliers themselves, so a ``Course``, its array and
+    the default all map to the same value.
+    """
+    multipliers = _resolve_course_profile(course_profile)
+    return hashlib.sha256(np.ascontiguousarray(multipliers, dtype=float).tobytes()).hexdigest()
+
+
+def model_parameter_hash():
+    """Hash of every model and noise constant that shapes a simulation result.
+
+    Read at call time, so results computed before the constants change never
+    share a cache key with results computed after.
+    """
+    params = {
+        "fatigue_tiers": model.FATIGUE_TIERS,
+        "dnf_base_rates": model.DNF_BASE_RATES,
+        "optimal_temp_c": model.OPTIMAL_TEMP_C,
+        "heat_penalty_per_c": model.HEAT_PENALTY_PER_C,
+        "heat_drift_max": model.HEAT_DRIFT_MAX,
+        "noise_sigma": (model.NOISE_SIGMA_START, model.NOISE_SIGMA_GROWTH),
+        "spike": (model.SPIKE_PROB, model.SPIKE_SCALE),
+        "onset_km": (DNF_ONSET_KM, FATIGUE_ONSET_KM),
+    }
+    blob = json.dumps(params, sort_keys=True, default=repr).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+_ENGINES = {
+    "vectorized": _simulate_vectorized,
+    "scalar": _simulate_scalar,
+}
+
+
+@timed("simulate_race_per_km")
+def simulate_race_per_km(pb_seconds, fatigue_coeff_override=None,
+                          temp_celsius=DEFAULT_TEMP_C, simulations=10000,
+                          method="vectorized", course_profile=None, seed=None,
+                          chunk_size=None, percentiles="exact", sampling=None,
+                          distribution=None):
+    """Monte Carlo marathon simulation with realistic variance.
+
+    Key differences from a naive model:
+      1. Fatigue coefficient is drawn per-simulation from a log-normal
+         distribution (unless overridden), producing good days AND blow-ups.
+      2. Per-km noise is *asymmetric* and *grows with distance* —
+         later km can go very wrong but not magically fast.
+      3. A DNF hazard accumulates after 30 km; some simulations are DNFs.
+
+    ``method`` selects the engine: ``"vectorized"`` (default) draws all
+    random components as arrays; ``"scalar"`` is the original per-km loop,
+    kept as a reference implementation.
+
+    ``course_profile`` may be a preloaded :class:`course.Course` or a 42-element
+    multiplier array; by default the London course comes from the registry.
+
+    ``seed`` is anything :func:`numpy.random.default_rng` accepts (an int or
+    a ``SeedSequence``); ``None`` draws fresh OS entropy.
+
+    ``chunk_size`` switches to streaming mode: simulations run in chunks of
+    that size and only running statistics are kept.  ``percentiles`` is
+    ``"exact"`` or ``"sketch"`` (a 1 s histogram, accurate to about a
+    second); sketch percentiles imply streaming with
+    ``DEFAULT_STREAM_CHUNK_SIZE`` if no ``chunk_size`` is given.
+
+    ``sampling`` draws the fatigue coefficients with a variance-reduction
+    mode from ``sampling.SAMPLING_MODES`` (vectorized engine, exact
+    percentiles).  The races are then run as ``SAMPLING_REPLICATES``
+    independently randomised replicates, and ``result["sampling"]`` reports
+    standard errors and variance-reduction factors — see
+    :func:`_simulate_replicated`.
+
+    ``distribution=True`` (1 s bins) or a bin width in seconds adds
+    ``result["distribution"]``, a :class:`stats.RaceDistribution`: the
+    finish-time histogram and the km at which each DNF happened, mergeable
+    with other runs and serialisable with ``to_bytes()``.  It works with
+    every engine and mode, streaming included.
+
+    The result also carries ``pace_plan`` — see :func:`pace_plan`.
+    """
+    if percentiles not in PERCENTILE_MODES:
+        raise ValueError(f"Unknown percentiles mode: {percentiles!r}  (expected one of {PERCENTILE_MODES})")
+    if chunk_size is None and percentiles == "sketch":
+        chunk_size = DEFAULT_STREAM_CHUNK_SIZE
+    dist = _new_distribution(distribution)
+
+    if sampling is not None:
+        if sampling not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode: {sampling!r}  (expected one of {SAMPLING_MODES})")
+        if method != "vectorized" or chunk_size is not None:
+            raise ValueError("sampling modes need method='vectorized' and exact, non-streaming percentiles")
+        result = _simulate_replicated(
+            pb_seconds, fatigue_coeff_override, temp_celsius, simulations,
+            course_profile, seed, sampling, dist,
+        )
+    elif chunk_size is not None:
+        result = _simulate_streaming(
+            pb_seconds, fatigue_coeff_override, temp_celsius, simulations,
+            method, course_profile, seed, chunk_size, percentiles, dist,
+        )
+    else:
+        finish_times, all_splits, dnf_km = _simulate_samples(
+            pb_seconds, fatigue_coeff_override, temp_celsius, simulations,
+            method, course_profile, seed,
+        )
+        if dist is not None:
+            dist.update(finish_times, dnf_km)
 
-    # Stats over finishers only
-    mean_splits = all_splits.mean(axis=0) if len(all_splits) > 0 else np.zeros(42)
+        # Stats over finishers only
+        mean_splits = all_splits.mean(axis=0) if len(all_splits) > 0 else np.zeros(NUM_KM)
+        result = _summarise(finish_times, mean_splits, len(dnf_km), simulations, temp_celsius)
 
+    if dist is not None:
+        result["distribution"] = dist
+    result["pace_plan"] = pace_plan(pb_seconds, temp_celsius, course_profile)
+    return result
+
+
+def _new_distribution(distribution):
+    """A fresh :class:`stats.RaceDistribution` for a ``distribution`` argument, or None."""
+    if distribution is None or distribution is False:
+        return None
+    bin_seconds = DEFAULT_BIN_SECONDS if distribution is True else float(distribution)
+    if bin_seconds <= 0:
+        raise ValueError(f"distribution bin width must be positive, got {distribution}")
+    return RaceDistribution(bin_seconds, NUM_KM)
+
+
+def _simulate_replicated(pb_seconds, fatigue_coeff_override, temp_celsius, simulations,
+                         course_profile, seed, sampling, dist=None):
+    """Run ``SAMPLING_REPLICATES`` independently seeded replicates with the
+    given fatigue sampling mode and summarise the pooled races.
+
+    A randomised quasi-random or stratified set has no usable within-sample
+    variance, so the estimators' standard errors come from the spread of the
+    replicate means and medians.  The variance-reduction factor divides the
+    i.i.d. variance of the same pooled sample (s² / n for the mean, the
+    order-statistic interval for the median) by that replicate variance:
+    ``"random"`` gives about 1, and a factor of 4 means a quarter of the
+    simulations reaches the same precision.
+    """
+    engine, engine_args = _prepare_engine(pb_seconds, "vectorized", course_profile)
+    n_rep = max(2, min(SAMPLING_REPLICATES, simulations // 2))
+    sizes = [simulations // n_rep + (i < simulations % n_rep) for i in range(n_rep)]
+
+    times, splits, rep_means, rep_medians = [], [], [], []
+    dnf_count = 0
+    for n, child in zip(sizes, np.random.SeedSequence(seed).spawn(n_rep)):
+        rng = np.random.default_rng(child)
+        fc = fatigue_coeff_override
+        if fc is None:
+            fc = sample_fatigue_coeff(pb_seconds, rng, size=n, sampling=sampling)
+        finish_times, all_splits, dnf_km = engine(rng, *engine_args, fc, temp_celsius, n)
+        times.append(finish_times)
+        splits.append(all_splits)
+        dnf_count += len(dnf_km)
+        if dist is not None:
+            dist.update(finish_times, dnf_km)
+        if len(finish_times):
+            rep_means.append(finish_times.mean())
+            rep_medians.append(np.median(finish_times))
+
+    finish_times = np.concatenate(times)
+    all_splits = np.concatenate(splits)
+    mean_splits = all_splits.mean(axis=0) if len(all_splits) > 0 else np.zeros(NUM_KM)
+    result = _summarise(finish_times, mean_splits, dnf_count, simulations, temp_celsius)
+
+    n = len(finish_times)
+    std_error, reduction = {}, {}
+    if n > 1 and len(rep_means) > 1:
+        lo, hi = _quantile_ci(np.sort(finish_times), 0.5, 1.0)
+        iid_var = {"mean_time": finish_times.var(ddof=1) / n, "median": ((hi - lo) / 2) ** 2}
+        rep_var = {"mean_time": np.var(rep_means, ddof=1) / len(rep_means),
+                   "median": np.var(rep_medians, ddof=1) / len(rep_medians)}
+        for key in iid_var:
+            std_error[key] = float(np.sqrt(rep_var[key]))
+            reduction[key] = float(iid_var[key] / rep_var[key]) if rep_var[key] > 0 else float("inf")
+    result["sampling"] = {
+        "mode": sampling,
+        "replicates": n_rep,
+        "std_error": std_error,
+        "variance_reduction": reduction,
+    }
+    return result
+
+
+def _simulate_samples(pb_seconds, fatigue_coeff_override, temp_celsius, simulations,
+                      method, course_profile, seed):
+    """Run one engine and return the raw (finish_times, all_splits, dnf_km)."""
+    engine, engine_args = _prepare_engine(pb_seconds, method, course_profile)
+    rng = np.random.default_rng(seed)
+    return engine(rng, *engine_args, fatigue_coeff_override, temp_celsius, simulations)
+
+
+def _prepare_engine(pb_seconds, method, course_profile):
+    """Return the engine function and its runner/course-specific leading arguments."""
+    if method not in _ENGINES:
+        raise ValueError(f"Unknown simulation method: {method!r}  (expected one of {SIMULATION_METHODS})")
+
+    base_pace = pb_seconds / 42.195
+    course_profile = _resolve_course_profile(course_profile)  # 42-element array
+    dnf_rate = get_dnf_rate(pb_seconds)
+    per_km_dnf_hazard = _per_km_dnf_hazard(dnf_rate)
+
+    return _ENGINES[method], (pb_seconds, base_pace, course_profile, per_km_dnf_hazard)
+
+
+def _simulate_streaming(pb_seconds, fatigue_coeff_override, temp_celsius, simulations,
+                        method, course_profile, seed, chunk_size, percentiles, dist=None):
+    """Chunked simulation that never holds more than one chunk of splits.
+
+    Finish-time and per-km moments are folded in with Welford updates.
+    ``percentiles="sketch"`` also replaces the finish-time array with a
+    1-second histogram, so memory is constant in ``simulations``;
+    ``"exact"`` keeps the finish times (8 bytes per finisher) instead.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+
+    engine, engine_args = _prepare_engine(pb_seconds, method, course_profile)
+    rng = np.random.default_rng(seed)
+
+    times = RunningMoments()
+    splits = RunningMoments((NUM_KM,))
+    sketch = TimeHistogram() if percentiles == "sketch" else None
+    exact = []
+    dnf_count = 0
+
+    for start in range(0, simulations, chunk_size):
+        n = min(chunk_size, simulations - start)
+        finish_times, all_splits, dnf_km = engine(
+            rng, *engine_args, fatigue_coeff_override, temp_celsius, n,
+        )
+        times.update(finish_times)
+        splits.update(all_splits)
+        dnf_count += len(dnf_km)
+        if dist is not None:
+            dist.update(finish_times, dnf_km)
+        if sketch is not None:
+            sketch.update(finish_times)
+        else:
+            exact.append(finish_times)
+
+    if sketch is not None:
+        percentile = sketch.percentile
+    else:
+        finish_times = np.concatenate(exact) if exact else np.empty(0)
+        percentile = lambda q: np.percentile(finish_times, q)
+
+    with phase("engine.summary"):
+        if times.count == 0:
+            return _result_dict(0, None, None, None, np.zeros(NUM_KM), dnf_count,
+                                simulations, temp_celsius)
+        return _result_dict(times.count, float(times.mean), float(times.std),
+                            {q: percentile(q) for q in RESULT_PERCENTILES}, splits.mean,
+                            dnf_count, simulations, temp_celsius)
+
+
+# Percentiles reported in every result dict, keyed "p5", "p25", "median" …
+RESULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _result_dict(finishers, mean, std, percentiles, mean_splits, dnf_count, simulations,
+                 temp_celsius):
+    """The standard result dict shared by every engine path.
+
+    ``percentiles`` maps each of :data:`RESULT_PERCENTILES` to a finish
+    time. With no finishers ``mean``, ``std`` and ``percentiles`` are
+    ignored: the mean is reported as inf and the rest as 0.0.
+    """
+    if finishers == 0:
+        mean, std, percentiles = float("inf"), 0.0, dict.fromkeys(RESULT_PERCENTILES, 0.0)
     return {
-        "mean_time": finish_times.mean() if len(finish_times) > 0 else float("inf"),
-        "std_dev": finish_times.std() if len(finish_times) > 0 else 0.0,
-        "p5": np.percentile(finish_times, 5) if len(finish_times) > 0 else 0.0,
-        "p25": np.percentile(finish_times, 25) if len(finish_times) > 0 else 0.0,
-        "median": np.median(finish_times) if len(finish_times) > 0 else 0.0,
-        "p75": np.percentile(finish_times, 75) if len(finish_times) > 0 else 0.0,
-        "p95": np.percentile(finish_times, 95) if len(finish_times) > 0 else 0.0,
+        "mean_time": mean,
+        "std_dev": std,
+        "p5": percentiles[5],
+        "p25": percentiles[25],
+        "median": percentiles[50],
+        "p75": percentiles[75],
+        "p95": percentiles[95],
         "mean_splits": mean_splits,
         "temp_celsius": temp_celsius,
         "dnf_count": dnf_count,
         "dnf_rate": dnf_count / simulations,
-        "finishers": len(finish_times),
+        "finishers": finishers,
         "simulations": simulations,
-    }
\ No newline at end of file
+    }
+
+
+@timed("engine.summary")
+def _summarise(finish_times, mean_splits, dnf_count, simulations, temp_celsius):
+    """Build the standard result dict from finisher times and mean splits."""
+    finishers = len(finish_times)
+    if finishers == 0:
+        return _result_dict(0, None, None, None, mean_splits, dnf_count, simulations, temp_celsius)
+    percentiles = {q: np.percentile(finish_times, q) for q in RESULT_PERCENTILES if q != 50}
+    percentiles[50] = np.median(finish_times)
+    return _result_dict(finishers, finish_times.mean(), finish_times.std(), percentiles,
+                        mean_splits, dnf_count, simulations, temp_celsius)
+
+
+# ---------------------------------------------------------------------------
+# Adaptive simulation count
+# ---------------------------------------------------------------------------
+# Default stopping tolerances: CI half-widths for the median and p95 (s) and
+# for the DNF rate (fraction — 0.005 is ±0.5 percentage points).
+ADAPTIVE_MEDIAN_TOL_S = 2.0
+ADAPTIVE_P95_TOL_S = 5.0
+ADAPTIVE_DNF_TOL = 0.005
+ADAPTIVE_BATCH_SIZE = 2_000
+ADAPTIVE_MAX_SIMULATIONS = 200_000
+
+
+def _quantile_ci(sorted_times, q, z):
+    """Distribution-free CI for the ``q`` quantile from order statistics.
+
+    The rank of the sample quantile is approximately normal with standard
+    deviation sqrt(n q (1 - q)), so the CI endpoints are the order statistics
+    z standard deviations either side of n q.  When either rank falls outside
+    the sample there are too few races to bound the quantile, and the CI is
+    unbounded rather than clipped to the extremes.
+    """
+    n = len(sorted_times)
+    half = z * np.sqrt(n * q * (1 - q))
+    lo = int(np.floor(n * q - half))
+    hi = int(np.ceil(n * q + half))
+    if lo < 0 or hi > n - 1:
+        return float("-inf"), float("inf")
+    return float(sorted_times[lo]), float(sorted_times[hi])
+
+
+def _proportion_ci(count, n, z):
+    """Wilson score interval for a binomial proportion (well-behaved near 0)."""
+    p = count / n
+    denom = 1 + z ** 2 / n
+    centre = (p + z ** 2 / (2 * n)) / denom
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return max(0.0, float(centre - half)), min(1.0, float(centre + half))
+
+
+def simulate_adaptive(pb_seconds, temp_celsius=DEFAULT_TEMP_C,
+                      median_tol=ADAPTIVE_MEDIAN_TOL_S, p95_tol=ADAPTIVE_P95_TOL_S,
+                      dnf_tol=ADAPTIVE_DNF_TOL, confidence=0.95,
+                      batch_size=ADAPTIVE_BATCH_SIZE, max_simulations=ADAPTIVE_MAX_SIMULATIONS,
+                      fatigue_coeff_override=None, method="vectorized",
+                      course_profile=None, seed=None):
+    """Run simulations in batches until the headline statistics have converged.
+
+    After each batch the ``confidence`` intervals of the median, p95 and DNF
+    rate are recomputed; the run stops once every half-width is within its
+    tolerance (seconds for ``median_tol``/``p95_tol``, a fraction for
+    ``dnf_tol``) or ``max_simulations`` is reached.
+
+    Returns the :func:`simulate_race_per_km` dict (``simulations`` is the
+    number actually run) plus:
+
+      converged   whether every tolerance was met
+      precision   achieved half-widths: {"median", "p95", "dnf_rate"}
+      ci          the intervals themselves, as (low, high) tuples
+    """
+    if batch_size < 1 or max_simulations < 1:
+        raise ValueError("batch_size and max_simulations must be positive")
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    engine, engine_args = _prepare_engine(pb_seconds, method, course_profile)
+    rng = np.random.default_rng(seed)
+
+    sorted_times = np.empty(0)
+    split_sum = np.zeros(NUM_KM)
+    dnf_count = 0
+    simulations = 0
+    converged = False
+
+    while simulations < max_simulations:
+        n = min(batch_size, max_simulations - simulations)
+        finish_times, all_splits, batch_dnf = engine(
+            rng, *engine_args, fatigue_coeff_override, temp_celsius, n,
+        )
+        split_sum += all_splits.sum(axis=0)
+        dnf_count += len(batch_dnf)
+        simulations += n
+
+        # merge the sorted batch into the running sorted sample: O(n) per batch
+        # rather than re-sorting everything drawn so far
+        finish_times = np.sort(finish_times)
+        sorted_times = np.insert(sorted_times, np.searchsorted(sorted_times, finish_times),
+                                 finish_times)
+        ci = {
+            "median": _quantile_ci(sorted_times, 0.50, z),
+            "p95": _quantile_ci(sorted_times, 0.95, z),
+            "dnf_rate": _proportion_ci(dnf_count, simulations, z),
+        }
+        precision = {k: (hi - lo) / 2 for k, (lo, hi) in ci.items()}
+        converged = (precision["median"] <= median_tol
+                     and precision["p95"] <= p95_tol
+                     and precision["dnf_rate"] <= dnf_tol)
+        if converged:
+            break
+
+    mean_splits = split_sum / len(sorted_times) if len(sorted_times) > 0 else np.zeros(NUM_KM)
+    result = _summarise(sorted_times, mean_splits, dnf_count, simulations, temp_celsius)
+    result["converged"] = converged
+    result["precision"] = precision
+    result["ci"] = ci
+    result["pace_plan"] = pace_plan(pb_seconds, temp_celsius, course_profile)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Whole-field simulation
+# ---------------------------------------------------------------------------
+@timed("simulate_field")
+def simulate_field(pb_seconds, temp_celsius=DEFAULT_TEMP_C, simulations=10000,
+                   course_profile=None, seed=None):
+    """Simulate a whole field of runners in one batched computation.
+
+    Simulation ``j`` of every runner is the same race, so besides the usual
+    per-runner summaries (the dict returned by :func:`simulate_race_per_km`)
+    each runner gets head-to-head placing statistics:
+
+      win_prob           share of races the runner finished first
+      podium_prob        share of races the runner finished top three
+      expected_position  mean finishing position over races they finished
+                         (``inf`` if they never finished)
+      position_probs     array: P(finishing in position k + 1); DNFs make
+                         the row sum to less than one
+
+    Course and heat multipliers are shared across runners; only the random
+    components are drawn per (runner, simulation, km).  ``course_profile``
+    and ``seed`` behave as in :func:`simulate_race_per_km`, and each runner's
+    summary carries its ``pace_plan``.
+    """
+    finish_times, split_sums = _simulate_field_samples(
+        pb_seconds, temp_celsius, simulations, course_profile, seed,
+    )
+    runners = _summarise_field(finish_times, split_sums, temp_celsius)
+    for pb, summary in zip(pb_seconds, runners):
+        summary["pace_plan"] = pace_plan(pb, temp_celsius, course_profile)
+    return runners
+
+
+def _field_fatigue_params(pbs):
+    """(runners, 1) log-normal mu and sigma of each runner's fatigue coefficient."""
+    tiers = np.array([get_fatigue_tier(pb) for pb in pbs])
+    return np.log(tiers[:, 0])[:, None], tiers[:, 1][:, None]
+
+
+def _field_chunks(n_runners, simulations):
+    """Yield (start, size) chunks keeping (runners, size, 42) arrays bounded."""
+    chunk = max(1, FIELD_CHUNK_ELEMENTS // max(1, n_runners * NUM_KM))
+    for start in range(0, simulations, chunk):
+        yield start, min(chunk, simulations - start)
+
+
+def _draw_field_chunk(rng, mu, fc_sigma, n):
+    """Draw the random components of ``n`` races for a whole field.
+
+    Returns fatigue coefficients (runners, n); the smallest post-onset DNF
+    uniform per race (runners, n) — the race is a DNF iff it is below the
+    per-km hazard; and the (runners, n, 42) noise factor ``1 + noise``.
+    """
+    n_runners = len(mu)
+    fc = rng.lognormal(mu, fc_sigma, (n_runners, n))
+    dnf_u = rng.random((n_runners, n, NUM_KM - DNF_ONSET_KM)).min(axis=2)
+
+    sigma = km_noise_sigma()
+    factor = rng.standard_normal((n_runners, n, NUM_KM))
+    factor *= sigma
+    spikes = rng.random((n_runners, n, NUM_KM)) < model.SPIKE_PROB
+    factor += spikes * rng.standard_exponential((n_runners, n, NUM_KM)) * (sigma * model.SPIKE_SCALE)
+    factor += 1.0
+    return fc, dnf_u, factor
+
+
+def _simulate_field_samples(pb_seconds, temp_celsius, simulations, course_profile, seed):
+    """Return raw field samples: (runners, sims) finish times with ``inf`` for
+    DNFs, and (runners, 42) split sums over each runner's finishers."""
+    pbs = np.asarray(pb_seconds, dtype=float)
+    n_runners = len(pbs)
+    course_profile = _resolve_course_profile(course_profile)
+    rng = np.random.default_rng(seed)
+
+    base = (pbs / 42.195)[:, None] * _course_heat_table(course_profile, temp_celsius)
+    mu, fc_sigma = _field_fatigue_params(pbs)
+    hazard = np.array([_per_km_dnf_hazard(get_dnf_rate(pb)) for pb in pbs])[:, None]
+
+    finish_times = np.empty((n_runners, simulations))
+    split_sums = np.zeros((n_runners, NUM_KM))
+
+    for start, n in _field_chunks(n_runners, simulations):
+        with phase("engine.rng"):
+            fc, dnf_u, splits = _draw_field_chunk(rng, mu, fc_sigma, n)
+            dnf = dnf_u < hazard
+
+        with phase("engine.model"):
+            # Build splits in place: base × (1 + noise), then fatigue on the tail.
+            splits *= base[:, None, :]
+            splits[..., FATIGUE_ONSET_KM:] *= 1.0 + fc[..., None] * FATIGUE_SHAPE[FATIGUE_ONSET_KM:]
+
+            split_sums += np.einsum("rnk,rn->rk", splits, ~dnf)
+            times = splits.sum(axis=2)
+            times[dnf] = np.inf
+            finish_times[:, start:start + n] = times
+
+        n_dnf = int(dnf.sum())
+        _count_races(n_runners * n, (n_runners * n - n_dnf) * NUM_KM, n_dnf)
+
+    return finish_times, split_sums
+
+
+def _summarise_field(finish_times, split_sums, temp_celsius):
+    """Per-runner summaries plus placing statistics from raw field samples."""
+    n_runners, simulations = finish_times.shape
+
+    # Placings: rank every simulated race across the field (DNFs sort last).
+    with phase("engine.placings"):
+        finished = np.isfinite(finish_times)
+        order = np.argsort(finish_times, axis=0)
+        positions = np.empty_like(order)
+        np.put_along_axis(positions, order, np.arange(1, n_runners + 1)[:, None], axis=0)
+
+    runners = []
+    for r in range(n_runners):
+        done = finished[r]
+        n_done = int(done.sum())
+        mean_splits = split_sums[r] / n_done if n_done else np.zeros(NUM_KM)
+        summary = _summarise(finish_times[r, done], mean_splits, simulations - n_done,
+                             simulations, temp_celsius)
+
+        pos = positions[r, done]
+        summary["win_prob"] = np.count_nonzero(pos == 1) / simulations
+        summary["podium_prob"] = np.count_nonzero(pos <= 3) / simulations
+        summary["expected_position"] = pos.mean() if n_done else float("inf")
+        summary["position_probs"] = np.bincount(pos - 1, minlength=n_runners) / simulations
+        runners.append(summary)
+
+    return runners
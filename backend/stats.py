@@ -0,0 +1,264 @@
+"""
+Constant-memory, mergeable statistics for streaming simulation results.
+
+``RunningMoments`` keeps count/mean/variance with Welford's update, batched
+via Chan et al.'s pairwise combination so a whole chunk is folded in with
+array ops.  ``TimeHistogram`` is a fixed-bin-width histogram used as a
+quantile sketch: memory depends on the spread of finish times, not on how
+many were simulated, and two histograms merge by adding counts.
+``RaceDistribution`` pairs one with per-km DNF counts so a run's whole
+outcome distribution can be exported, cached and combined.
+
+Both serialise to compact little-endian bytes (:meth:`to_bytes`): a small
+header, then fixed-width counts — uint32, or uint64 only if a bin overflows.
+A 1 s finish-time histogram of one runner spans a few thousand bins (the
+blow-up tail is long), so it is tens of kilobytes however many races went
+into it; wider bins shrink it proportionally.
+"""
+
+import struct
+
+import numpy as np
+
+# Histogram bin width for finish-time sketches, in seconds.
+DEFAULT_BIN_SECONDS = 1.0
+
+# magic, version, count width in bytes, bin width (s), offset (bins), bins
+_HISTOGRAM_HEADER = struct.Struct("<4sBBxxdqQ")
+_HISTOGRAM_MAGIC = b"THST"
+# magic, version, count width in bytes, number of km
+_DISTRIBUTION_HEADER = struct.Struct("<4sBBH")
+_DISTRIBUTION_MAGIC = b"RDST"
+_FORMAT_VERSION = 1
+
+
+def _count_dtype(counts):
+    """Narrowest of uint32/uint64 that holds ``counts``, little-endian."""
+    return np.dtype("<u4") if not len(counts) or counts.max() <= np.iinfo(np.uint32).max else np.dtype("<u8")
+
+
+def _read_counts(buf, start, n, itemsize, what):
+    if itemsize not in (4, 8):
+        raise ValueError(f"{what}: unsupported count width {itemsize}")
+    end = start + n * itemsize
+    if len(buf) < end:
+        raise ValueError(f"{what}: truncated ({len(buf)} bytes, need {end})")
+    counts = np.frombuffer(buf, dtype=f"<u{itemsize}", count=n, offset=start)
+    return counts.astype(np.int64), end
+
+
+class RunningMoments:
+    """Running count, mean and variance of scalars or fixed-shape vectors.
+
+    ``update`` takes a batch whose first axis indexes observations, so a
+    (n, 42) split matrix tracks per-km moments.
+    """
+
+    def __init__(self, shape=()):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def update(self, batch):
+        batch = np.asarray(batch, dtype=float)
+        n = len(batch)
+        if n == 0:
+            return
+        batch_mean = batch.mean(axis=0)
+        batch_m2 = ((batch - batch_mean) ** 2).sum(axis=0)
+        self._combine(n, batch_mean, batch_m2)
+
+    def merge(self, other):
+        """Fold another ``RunningMoments`` into this one."""
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+    @property
+    def variance(self):
+        """Population variance (``ddof=0``, matching ``np.std``)."""
+        return self.m2 / self.count if self.count else np.zeros_like(self.m2)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class TimeHistogram:
+    """Fixed-width histogram of times, anchored at 0 s, grown on demand."""
+
+    def __init__(self, bin_seconds=DEFAULT_BIN_SECONDS):
+        if bin_seconds <= 0:
+            raise ValueError(f"bin_seconds must be positive, got {bin_seconds}")
+        self.bin_seconds = float(bin_seconds)
+        self.offset = 0  # index of counts[0], in bins from 0 s
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def _ensure(self, lo, hi):
+        """Grow ``counts`` to cover absolute bins ``lo`` … ``hi`` inclusive."""
+        if not len(self.counts):
+            self.offset = lo
+            self.counts = np.zeros(hi - lo + 1, dtype=self.counts.dtype)
+            return
+        new_lo = min(lo, self.offset)
+        new_hi = max(hi, self.offset + len(self.counts) - 1)
+        if new_lo == self.offset and new_hi == self.offset + len(self.counts) - 1:
+            return
+        grown = np.zeros(new_hi - new_lo + 1, dtype=self.counts.dtype)
+        start = self.offset - new_lo
+        grown[start:start + len(self.counts)] = self.counts
+        self.offset, self.counts = new_lo, grown
+
+    def update(self, times):
+        times = np.asarray(times, dtype=float)
+        if not len(times):
+            return
+        bins = np.floor(times / self.bin_seconds).astype(np.int64)
+        lo, hi = int(bins.min()), int(bins.max())
+        self._ensure(lo, hi)
+        self.counts += np.bincount(bins - self.offset, minlength=len(self.counts)).astype(self.counts.dtype)
+
+    def merge(self, other):
+        """Add another histogram's counts (bin widths must match)."""
+        if other.bin_seconds != self.bin_seconds:
+            raise ValueError(f"Cannot merge histograms with bin widths {self.bin_seconds} and {other.bin_seconds}")
+        if not len(other.counts):
+            return
+        self._ensure(other.offset, other.offset + len(other.counts) - 1)
+        start = other.offset - self.offset
+        self.counts[start:start + len(other.counts)] += other.counts.astype(self.counts.dtype)
+
+    @property
+    def edges(self):
+        """Absolute bin edges in seconds (``len(counts) + 1`` of them)."""
+        return (self.offset + np.arange(len(self.counts) + 1)) * self.bin_seconds
+
+    def cdf(self, t):
+        """Fraction of recorded times at or below ``t`` (linear within a bin)."""
+        total = self.count
+        if not total:
+            return np.zeros_like(np.asarray(t, dtype=float))
+        cum = np.concatenate(([0], np.cumsum(self.counts)))
+        return np.interp(t, self.edges, cum) / total
+
+    def to_bytes(self):
+        counts = self.counts.astype(_count_dtype(self.counts))
+        header = _HISTOGRAM_HEADER.pack(_HISTOGRAM_MAGIC, _FORMAT_VERSION, counts.itemsize,
+                                        self.bin_seconds, self.offset, len(counts))
+        return header + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of :meth:`to_bytes`; raises ValueError on malformed input."""
+        hist, end = cls._read(memoryview(data), 0)
+        if end != len(data):
+            raise ValueError(f"histogram: {len(data) - end} trailing bytes")
+        return hist
+
+    @classmethod
+    def _read(cls, buf, start):
+        if len(buf) < start + _HISTOGRAM_HEADER.size:
+            raise ValueError("histogram: truncated header")
+        magic, version, itemsize, bin_seconds, offset, n = _HISTOGRAM_HEADER.unpack_from(buf, start)
+        if magic != _HISTOGRAM_MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"histogram: not a version-{_FORMAT_VERSION} time histogram")
+        hist = cls(bin_seconds)
+        hist.offset = offset
+        hist.counts, end = _read_counts(buf, start + _HISTOGRAM_HEADER.size, n, itemsize, "histogram")
+        return hist, end
+
+    def percentile(self, q):
+        """Approximate ``np.percentile(times, q)``, interpolating within bins.
+
+        Within one bin width wherever neighbouring samples are closer than a
+        bin; in a sparse tail the gap between them can add to that.
+        """
+        total = self.count
+        if not total:
+            return 0.0
+        cum = np.cumsum(self.counts)
+        target = np.clip(q / 100.0, 0.0, 1.0) * total
+        idx = int(np.searchsorted(cum, target, side="left"))
+        idx = min(idx, len(cum) - 1)
+        before = cum[idx - 1] if idx > 0 else 0
+        frac = (target - before) / self.counts[idx] if self.counts[idx] else 0.0
+        return (self.offset + idx + frac) * self.bin_seconds
+
+
+class RaceDistribution:
+    """Finish-time histogram plus the km at which each DNF dropped out.
+
+    ``finish_times`` is a :class:`TimeHistogram` over finishers and
+    ``dnf_km[k]`` counts DNFs during km ``k + 1``.  Distributions from
+    separate runs, shards or workers merge exactly by adding counts.
+    """
+
+    def __init__(self, bin_seconds=DEFAULT_BIN_SECONDS, num_km=42):
+        self.finish_times = TimeHistogram(bin_seconds)
+        self.dnf_km = np.zeros(num_km, dtype=np.int64)
+
+    @property
+    def finishers(self):
+        return self.finish_times.count
+
+    @property
+    def dnfs(self):
+        return int(self.dnf_km.sum())
+
+    @property
+    def dnf_rate(self):
+        starters = self.finishers + self.dnfs
+        return self.dnfs / starters if starters else 0.0
+
+    def update(self, finish_times, dnf_km):
+        """Add finishers' times and the (1-based) DNF km of each non-finisher."""
+        self.finish_times.update(finish_times)
+        dnf_km = np.asarray(dnf_km, dtype=np.int64)
+        if len(dnf_km):
+            self.dnf_km += np.bincount(dnf_km - 1, minlength=len(self.dnf_km))[:len(self.dnf_km)]
+
+    def merge(self, other):
+        if len(other.dnf_km) != len(self.dnf_km):
+            raise ValueError(f"Cannot merge distributions over {len(self.dnf_km)} and {len(other.dnf_km)} km")
+        self.finish_times.merge(other.finish_times)
+        self.dnf_km += other.dnf_km
+
+    def to_dict(self):
+        """JSON-ready form: histogram offset/width/counts and DNF-km counts."""
+        return {
+            "bin_seconds": self.finish_times.bin_seconds,
+            "start_seconds": self.finish_times.offset * self.finish_times.bin_seconds,
+            "counts": self.finish_times.counts.tolist(),
+            "dnf_km": self.dnf_km.tolist(),
+        }
+
+    def to_bytes(self):
+        dnf = self.dnf_km.astype(_count_dtype(self.dnf_km))
+        header = _DISTRIBUTION_HEADER.pack(_DISTRIBUTION_MAGIC, _FORMAT_VERSION, dnf.itemsize, len(dnf))
+        return header + dnf.tobytes() + self.finish_times.to_bytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of :meth:`to_bytes`; raises ValueError on malformed input."""
+        buf = memoryview(data)
+        if len(buf) < _DISTRIBUTION_HEADER.size:
+            raise ValueError("distribution: truncated header")
+        magic, version, itemsize, num_km = _DISTRIBUTION_HEADER.unpack_from(buf)
+        if magic != _DISTRIBUTION_MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"distribution: not a version-{_FORMAT_VERSION} race distribution")
+        dist = cls(num_km=num_km)
+        dist.dnf_km, end = _read_counts(buf, _DISTRIBUTION_HEADER.size, num_km, itemsize, "distribution")
+        dist.finish_times, end = TimeHistogram._read(buf, end)
+        if end != len(buf):
+            raise ValueError(f"distribution: {len(buf) - end} trailing bytes")
+        return dist
@@ -0,0 +1,281 @@
+"""
+Scenario-grid simulation with common random numbers.
+
+Race-day planning needs the whole field across many temperatures (and
+sometimes other model settings).  Rather than re-simulating from scratch at
+every point, each chunk of races is drawn once — fatigue coefficients, DNF
+uniforms and per-km noise — and then replayed under every scenario.  The
+deterministic part of a split is linear in the scenario's pace table, so a
+scenario costs a couple of tensor contractions instead of a fresh set of
+random draws, and differences between scenarios carry almost no Monte Carlo
+noise because every scenario sees the same races.  Each scenario's
+statistics are folded in as every chunk is replayed, so no finish-time array
+outlives its chunk.
+"""
+
+import numpy as np
+from model import get_dnf_rate
+from simulation import (
+    DEFAULT_TEMP_C,
+    FATIGUE_ONSET_KM,
+    FATIGUE_SHAPE,
+    _course_heat_table,
+    _draw_field_chunk,
+    _field_chunks,
+    _field_fatigue_params,
+    _per_km_dnf_hazard,
+    _resolve_course_profile,
+)
+from stats import DEFAULT_BIN_SECONDS, TimeHistogram
+
+# Scenario parameters and their neutral defaults.
+#   temp_celsius         race-day temperature
+#   heat_penalty_per_c   overrides model.HEAT_PENALTY_PER_C (None = model value)
+#   fatigue_scale        multiplies every drawn fatigue coefficient
+#   dnf_scale            multiplies each runner's overall DNF probability
+SCENARIO_DEFAULTS = {
+    "temp_celsius": DEFAULT_TEMP_C,
+    "heat_penalty_per_c": None,
+    "fatigue_scale": 1.0,
+    "dnf_scale": 1.0,
+}
+
+SWEEP_STATISTICS = (
+    "mean_time", "std_dev", "p5", "p25", "median", "p75", "p95",
+    "dnf_rate", "win_prob", "podium_prob", "expected_position",
+)
+
+_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Each runner's percentile histogram spans these multiples of their
+# deterministic finish time; races outside are counted in its end bins.  The
+# reported p5–p95 sit far inside (p95 stays below ~1.35× on the elite field).
+HISTOGRAM_WINDOW = (0.9, 1.8)
+
+
+def temperature_grid(start=5.0, stop=25.0, step=0.5):
+    """Temperatures from ``start`` to ``stop`` inclusive in ``step`` increments."""
+    n = int(round((stop - start) / step)) + 1
+    return [round(start + i * step, 10) for i in range(n)]
+
+
+def _normalise_scenario(scenario):
+    if not isinstance(scenario, dict):
+        scenario = {"temp_celsius": scenario}
+    unknown = set(scenario) - set(SCENARIO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown scenario parameter(s): {sorted(unknown)}  (expected {sorted(SCENARIO_DEFAULTS)})")
+    return {**SCENARIO_DEFAULTS, **scenario}
+
+
+def simulate_scenarios(pb_seconds, scenarios, simulations=10000, course_profile=None, seed=None):
+    """Simulate a field under every scenario using common random numbers.
+
+    ``scenarios`` is a sequence of temperatures or of dicts using the keys in
+    ``SCENARIO_DEFAULTS`` (e.g. ``temperature_grid()``).  Returns:
+
+      statistics   names of the last axis of ``values`` (SWEEP_STATISTICS)
+      scenarios    the normalised scenario dicts, in order
+      values       float array of shape (runners, scenarios, statistics)
+      simulations  races simulated per runner (shared by every scenario)
+
+    Statistics follow :func:`simulation.simulate_field`: percentiles and
+    moments over finishers, placing probabilities over all races.  They are
+    folded in chunk by chunk, so memory does not grow with ``simulations``:
+    percentiles come from 1 s histograms (accurate to about a second), the
+    rest are exact.
+    """
+    scenarios = [_normalise_scenario(s) for s in scenarios]
+    stats = _scenario_accumulate(pb_seconds, scenarios, simulations, course_profile, seed)
+    return _scenario_grid(scenarios, stats, simulations)
+
+
+def _scenario_chunks(pb_seconds, scenarios, simulations, course_profile, seed):
+    """Yield, per chunk of races, a list with each scenario's (runners, n)
+    finish times (``inf`` for DNFs), for already-normalised scenarios.
+
+    The draws depend only on the field, ``simulations`` and ``seed``, so any
+    subset of scenarios replays exactly the same races.
+    """
+    pbs = np.asarray(pb_seconds, dtype=float)
+    n_runners = len(pbs)
+    rng = np.random.default_rng(seed)
+
+    mu, fc_sigma = _field_fatigue_params(pbs)
+    bases = _scenario_bases(pbs, scenarios, course_profile)
+    dnf_rates = np.array([get_dnf_rate(pb) for pb in pbs])
+    hazards = [np.array([_per_km_dnf_hazard(min(1.0, r * s["dnf_scale"])) for r in dnf_rates])[:, None]
+               for s in scenarios]
+    tail_shape = FATIGUE_SHAPE[FATIGUE_ONSET_KM:]
+
+    for _, n in _field_chunks(n_runners, simulations):
+        fc, dnf_u, factor = _draw_field_chunk(rng, mu, fc_sigma, n)
+        tail = factor[..., FATIGUE_ONSET_KM:] * tail_shape
+
+        # finish = Σ_k base_k (1 + noise_k) (1 + c·shape_k), split into the
+        # part without fatigue and the fatigue part so each scenario is linear.
+        chunk = []
+        for i, s in enumerate(scenarios):
+            no_fatigue = np.einsum("rnk,rk->rn", factor, bases[i])
+            fatigue = np.einsum("rnk,rk->rn", tail, bases[i][:, FATIGUE_ONSET_KM:])
+            times = no_fatigue + (fc * s["fatigue_scale"]) * fatigue
+            times[dnf_u < hazards[i]] = np.inf
+            chunk.append(times)
+        yield chunk
+
+
+def _scenario_bases(pbs, scenarios, course_profile):
+    """Each scenario's (runners, 42) deterministic splits: pace × course × heat."""
+    course_profile = _resolve_course_profile(course_profile)
+    base_pace = (np.asarray(pbs, dtype=float) / 42.195)[:, None]
+    return [base_pace * _course_heat_table(course_profile, s["temp_celsius"], s["heat_penalty_per_c"])
+            for s in scenarios]
+
+
+def _scenario_accumulate(pb_seconds, scenarios, simulations, course_profile, seed):
+    """One :class:`_ScenarioStats` per scenario, folded in chunk by chunk."""
+    course_profile = _resolve_course_profile(course_profile)
+    stats = [_ScenarioStats(base.sum(axis=1))
+             for base in _scenario_bases(pb_seconds, scenarios, course_profile)]
+    for chunk in _scenario_chunks(pb_seconds, scenarios, simulations, course_profile, seed):
+        for acc, times in zip(stats, chunk):
+            acc.update(times)
+    return stats
+
+
+class _RunnerHistograms:
+    """One fixed-width finish-time histogram per runner, as rows of a single
+    count array.  Row ``r`` covers ``[lo[r], hi[r])``; races outside it are
+    counted in the end bins, so the memory is fixed up front."""
+
+    def __init__(self, lo, hi, bin_seconds=DEFAULT_BIN_SECONDS):
+        self.bin_seconds = float(bin_seconds)
+        self.offsets = np.floor(np.asarray(lo) / self.bin_seconds).astype(np.int64)
+        self.widths = np.ceil(np.asarray(hi) / self.bin_seconds).astype(np.int64) - self.offsets
+        self.counts = np.zeros((len(self.offsets), int(self.widths.max())), dtype=np.int32)
+
+    def update(self, times):
+        rows, cols = np.nonzero(np.isfinite(times))
+        bins = np.floor(times[rows, cols] / self.bin_seconds).astype(np.int64) - self.offsets[rows]
+        bins = np.clip(bins, 0, self.widths[rows] - 1)
+        flat = rows * self.counts.shape[1] + bins
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape).astype(
+            self.counts.dtype)
+
+    def merge(self, other):
+        """Add another set of histograms with the same windows."""
+        if not (np.array_equal(other.offsets, self.offsets) and np.array_equal(other.widths, self.widths)):
+            raise ValueError("Cannot merge runner histograms with different windows")
+        self.counts += other.counts
+
+    def percentiles(self, qs):
+        """(len(qs), runners) approximate percentiles; 0.0 for empty rows."""
+        out = np.zeros((len(qs), len(self.offsets)))
+        for r in range(len(self.offsets)):
+            hist = TimeHistogram(self.bin_seconds)
+            hist.offset, hist.counts = int(self.offsets[r]), self.counts[r, :self.widths[r]]
+            out[:, r] = [hist.percentile(q) for q in qs]
+        return out
+
+
+class _ScenarioStats:
+    """Per-runner statistics of one scenario, updated a chunk of races at a
+    time: finisher moments (Chan et al.'s pairwise combination, as in
+    :class:`stats.RunningMoments`), finish-time histograms and placing counts.
+
+    ``reference_times`` are the runners' deterministic finish times, which
+    place their histograms (see ``HISTOGRAM_WINDOW``).
+    """
+
+    def __init__(self, reference_times):
+        n_runners = len(reference_times)
+        self.races = 0
+        self.finishers = np.zeros(n_runners, dtype=np.int64)
+        self.mean = np.zeros(n_runners)
+        self.m2 = np.zeros(n_runners)
+        self.wins = np.zeros(n_runners, dtype=np.int64)
+        self.podiums = np.zeros(n_runners, dtype=np.int64)
+        self.position_sum = np.zeros(n_runners, dtype=np.int64)
+        lo, hi = HISTOGRAM_WINDOW
+        self.histograms = _RunnerHistograms(lo * reference_times, hi * reference_times)
+
+    def update(self, finish_times):
+        """Fold in (runners, n) finish times, ``inf`` for DNFs."""
+        n_runners, n = finish_times.shape
+        finished = np.isfinite(finish_times)
+        n_done = finished.sum(axis=1)
+
+        chunk_mean = np.where(finished, finish_times, 0.0).sum(axis=1) / np.maximum(n_done, 1)
+        chunk_m2 = (np.where(finished, finish_times - chunk_mean[:, None], 0.0) ** 2).sum(axis=1)
+        self._combine(n_done, chunk_mean, chunk_m2)
+        self.races += n
+
+        order = np.argsort(finish_times, axis=0)
+        positions = np.empty_like(order)
+        np.put_along_axis(positions, order, np.arange(1, n_runners + 1)[:, None], axis=0)
+        self.wins += ((positions == 1) & finished).sum(axis=1)
+        self.podiums += ((positions <= 3) & finished).sum(axis=1)
+        self.position_sum += np.where(finished, positions, 0).sum(axis=1)
+
+        self.histograms.update(finish_times)
+
+    def merge(self, other):
+        """Fold in the statistics of other races of the same field and scenario."""
+        self._combine(other.finishers, other.mean, other.m2)
+        self.races += other.races
+        self.wins += other.wins
+        self.podiums += other.podiums
+        self.position_sum += other.position_sum
+        self.histograms.merge(other.histograms)
+
+    def _combine(self, n, mean, m2):
+        total = self.finishers + n
+        weight = n / np.maximum(total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.finishers * weight
+        self.finishers = total
+
+
+def _scenario_grid(scenarios, stats, simulations):
+    """Assemble the :func:`simulate_scenarios` result from per-scenario statistics."""
+    values = np.stack([_scenario_statistics(acc) for acc in stats], axis=1)
+    return {
+        "statistics": SWEEP_STATISTICS,
+        "scenarios": scenarios,
+        "values": values,
+        "simulations": simulations,
+    }
+
+
+def _scenario_statistics(stats):
+    """(runners, len(SWEEP_STATISTICS)) statistics from a :class:`_ScenarioStats`."""
+    n_done = stats.finishers
+    has = n_done > 0
+    races = stats.races
+
+    out = np.empty((len(n_done), len(SWEEP_STATISTICS)))
+    out[:, 0] = np.where(has, stats.mean, np.inf)
+    out[:, 1] = np.sqrt(stats.m2 / np.maximum(n_done, 1))
+    out[:, 2:7] = stats.histograms.percentiles(_PERCENTILES).T
+    out[:, 7] = (races - n_done) / races
+    out[:, 8] = stats.wins / races
+    out[:, 9] = stats.podiums / races
+    out[:, 10] = np.where(has, stats.position_sum / np.maximum(n_done, 1), np.inf)
+    return out
+
+
+def sweep_records(grid, names=None):
+    """Flatten a :func:`simulate_scenarios` result into one dict per (runner, scenario).
+
+    Suitable for ``pandas.DataFrame(list(sweep_records(grid)))`` or a CSV
+    writer.  ``names`` labels the runners (defaults to their index).
+    """
+    values = grid["values"]
+    if names is None:
+        names = range(values.shape[0])
+    for r, name in enumerate(names):
+        for i, scenario in enumerate(grid["scenarios"]):
+            row = {"runner": name, **scenario}
+            row.update(zip(grid["statistics"], values[r, i].tolist()))
+            yield row
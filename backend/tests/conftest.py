@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The backend modules are imported top-level (``import simulation``), as the
+# CLI and server do when run from backend/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,30 @@
+"""Adaptive runs only report convergence the sample can support."""
+
+import math
+
+import numpy as np
+
+from simulation import ADAPTIVE_MEDIAN_TOL_S, ADAPTIVE_P95_TOL_S, _quantile_ci, simulate_adaptive
+
+
+def test_tiny_batches_do_not_converge():
+    result = simulate_adaptive(7325, batch_size=1, max_simulations=3, seed=0)
+    assert result["simulations"] == 3
+    assert not result["converged"]
+    assert math.isinf(result["precision"]["p95"])
+    assert math.isinf(result["precision"]["median"])
+
+
+def test_quantile_ci_is_unbounded_until_the_ranks_fit():
+    z = 1.96
+    # 95th percentile: n q + z sqrt(n q (1 - q)) must stay below n - 1
+    assert _quantile_ci(np.arange(50.0), 0.95, z) == (-math.inf, math.inf)
+    lo, hi = _quantile_ci(np.arange(1000.0), 0.95, z)
+    assert lo < 950 < hi < 999
+
+
+def test_converges_within_tolerance():
+    result = simulate_adaptive(7325, seed=1)
+    assert result["converged"]
+    assert result["precision"]["median"] <= ADAPTIVE_MEDIAN_TOL_S
+    assert result["precision"]["p95"] <= ADAPTIVE_P95_TOL_S
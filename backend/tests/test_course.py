@@ -0,0 +1,100 @@
+"""Compiled course files round-trip the parsed GPX course."""
+
+import shutil
+import struct
+
+import numpy as np
+import pytest
+
+import course
+
+
+@pytest.fixture
+def gpx(tmp_path):
+    path = tmp_path / "london.gpx"
+    shutil.copy(course.DEFAULT_GPX, path)
+    yield str(path)
+    course.clear_course_cache()
+
+
+def test_compile_round_trip(gpx, tmp_path):
+    out = course.compile_course(gpx, str(tmp_path / "london.course"))
+    compiled = course.load_compiled_course(out)
+    parsed = course.load_course(gpx)
+
+    assert compiled.source_hash == parsed.source_hash
+    # distances and elevations are stored as float32
+    np.testing.assert_allclose(compiled.cum_dist, parsed.cum_dist, rtol=1e-6, atol=0.01)
+    np.testing.assert_allclose(compiled.elevation, parsed.elevation, rtol=1e-6, atol=0.01)
+    np.testing.assert_array_equal(compiled.km_multipliers, parsed.km_multipliers)
+    assert not compiled.cum_dist.flags.writeable
+    assert not compiled.km_multipliers.flags.writeable
+
+
+def test_header_describes_the_source(gpx, tmp_path):
+    out = course.compile_course(gpx, str(tmp_path / "london.course"), num_km=42)
+    header = course.read_compiled_header(out)
+    assert header["num_km"] == 42
+    assert header["track"] is None
+    assert header["n_points"] == len(course.load_course(gpx).cum_dist)
+    for spec in header["arrays"].values():
+        assert spec["offset"] % 64 == 0
+
+
+def test_rejects_foreign_and_future_files(gpx, tmp_path):
+    with pytest.raises(ValueError, match="not a compiled course"):
+        course.read_compiled_header(gpx)
+
+    out = course.compile_course(gpx, str(tmp_path / "london.course"))
+    with open(out, "r+b") as f:
+        f.seek(8)
+        f.write(struct.pack("<I", course.COMPILED_VERSION + 1))
+    with pytest.raises(ValueError, match="version"):
+        course.read_compiled_header(out)
+
+
+def test_sidecar_is_reused_and_refreshed(gpx):
+    first = course.load_course(gpx, sidecar=True)
+    sidecar = gpx + course.COMPILED_SUFFIX
+    assert course.read_compiled_header(sidecar)["source_hash"] == first.source_hash
+
+    course.clear_course_cache()
+    again = course.load_course(gpx, sidecar=True)
+    assert isinstance(again.cum_dist, np.memmap)
+    np.testing.assert_array_equal(again.km_multipliers, first.km_multipliers)
+
+    # an edited GPX no longer matches the sidecar, which is recompiled
+    with open(gpx, "ab") as f:
+        f.write(b"\n")
+    course.clear_course_cache()
+    edited = course.load_course(gpx, sidecar=True)
+    assert edited.source_hash != first.source_hash
+    assert course.read_compiled_header(sidecar)["source_hash"] == edited.source_hash
+
+
+@pytest.mark.parametrize("track, match", [
+    (5, r"out of range: .* has 1 track"),
+    ("Berlin", r"No track named 'Berlin' in "),
+])
+def test_bad_track_selection_names_the_file(gpx, track, match):
+    with pytest.raises(ValueError, match=match):
+        course.load_course(gpx, track=track)
+
+
+def test_gpx_without_tracks_is_rejected(tmp_path):
+    path = tmp_path / "empty.gpx"
+    path.write_text('<?xml version="1.0"?><gpx xmlns="http://www.topografix.com/GPX/1/1"></gpx>')
+    with pytest.raises(ValueError, match=r"No <trk> in .*empty\.gpx"):
+        course.load_course(str(path))
+
+
+def test_registry_is_bounded_and_drops_stale_versions(gpx, monkeypatch):
+    monkeypatch.setattr(course, "COURSE_CACHE_SIZE", 3)
+    for num_km in (40, 41, 42, 43):
+        course.load_course(gpx, num_km=num_km)
+    assert [k[3] for k in course._COURSE_CACHE] == [41, 42, 43]
+
+    with open(gpx, "ab") as f:
+        f.write(b"\n")
+    course.load_course(gpx, num_km=42)
+    assert len(course._COURSE_CACHE) == 1
@@ -0,0 +1,84 @@
+"""The scalar reference engine and the vectorized engine sample the same model."""
+
+import math
+
+import numpy as np
+import pytest
+
+from simulation import DNF_ONSET_KM, simulate_race_per_km
+
+SCALAR_SIMULATIONS = 5_000
+VECTORIZED_SIMULATIONS = 100_000
+
+# Allowed gap, in standard errors of the difference; seeds are fixed, so this
+# only guards against genuine disagreement, not flaky draws.
+TOLERANCE_SE = 5
+
+
+def _se(std, n):
+    return std / math.sqrt(n)
+
+
+@pytest.fixture(scope="module", params=[(7325, 20.0), (8400, 20.0), (7325, 8.0)],
+                ids=["elite-warm", "club-warm", "elite-optimal"])
+def engines(request):
+    pb, temp = request.param
+    scalar = simulate_race_per_km(pb, temp_celsius=temp, simulations=SCALAR_SIMULATIONS,
+                                  seed=0, method="scalar", distribution=1.0)
+    vectorized = simulate_race_per_km(pb, temp_celsius=temp, simulations=VECTORIZED_SIMULATIONS,
+                                      seed=1, distribution=1.0)
+    return scalar, vectorized
+
+
+def test_mean_and_median_agree(engines):
+    scalar, vectorized = engines
+    se = math.hypot(_se(scalar["std_dev"], scalar["finishers"]),
+                    _se(vectorized["std_dev"], vectorized["finishers"]))
+    assert abs(scalar["mean_time"] - vectorized["mean_time"]) < TOLERANCE_SE * se
+    # the median's standard error is at most ~1.25× the mean's for these
+    # right-skewed times
+    assert abs(scalar["median"] - vectorized["median"]) < TOLERANCE_SE * 1.25 * se
+
+
+def test_spread_agrees(engines):
+    scalar, vectorized = engines
+    assert scalar["std_dev"] == pytest.approx(vectorized["std_dev"], rel=0.15)
+    assert scalar["p5"] == pytest.approx(vectorized["p5"], rel=0.005)
+    assert scalar["p95"] == pytest.approx(vectorized["p95"], rel=0.01)
+
+
+def test_dnf_rate_agrees(engines):
+    scalar, vectorized = engines
+    p = vectorized["dnf_rate"]
+    se = math.sqrt(p * (1 - p) / SCALAR_SIMULATIONS) + 1e-9
+    assert abs(scalar["dnf_rate"] - p) < TOLERANCE_SE * se
+
+
+def test_dnfs_only_after_onset(engines):
+    for result in engines:
+        dnf_km = result["distribution"].dnf_km
+        assert not dnf_km[:DNF_ONSET_KM].any()
+        assert dnf_km.sum() == result["dnf_count"]
+
+
+def test_mean_splits_agree(engines):
+    scalar, vectorized = engines
+    np.testing.assert_allclose(scalar["mean_splits"], vectorized["mean_splits"], rtol=0.02)
+
+
+def test_fatigue_override_agrees():
+    kwargs = dict(fatigue_coeff_override=0.002, temp_celsius=15.0)
+    scalar = simulate_race_per_km(7325, simulations=SCALAR_SIMULATIONS, seed=0, method="scalar",
+                                  **kwargs)
+    vectorized = simulate_race_per_km(7325, simulations=VECTORIZED_SIMULATIONS, seed=1, **kwargs)
+    se = math.hypot(_se(scalar["std_dev"], scalar["finishers"]),
+                    _se(vectorized["std_dev"], vectorized["finishers"]))
+    assert abs(scalar["mean_time"] - vectorized["mean_time"]) < TOLERANCE_SE * se
+
+
+def test_seeded_runs_are_reproducible():
+    for method in ("scalar", "vectorized"):
+        a = simulate_race_per_km(7325, simulations=500, seed=42, method=method)
+        b = simulate_race_per_km(7325, simulations=500, seed=42, method=method)
+        assert a["median"] == b["median"]
+        assert a["dnf_count"] == b["dnf_count"]
@@ -0,0 +1,97 @@
+"""Finish-time histograms and race distributions: bytes round-trip and exact merges."""
+
+import numpy as np
+import pytest
+
+from parallel import simulate_race_parallel
+from simulation import simulate_race_per_km
+from stats import RaceDistribution, TimeHistogram
+
+
+def _assert_same_distribution(a, b):
+    assert a.finish_times.bin_seconds == b.finish_times.bin_seconds
+    assert a.finish_times.offset == b.finish_times.offset
+    np.testing.assert_array_equal(a.finish_times.counts, b.finish_times.counts)
+    np.testing.assert_array_equal(a.dnf_km, b.dnf_km)
+
+
+@pytest.fixture(scope="module")
+def race():
+    return simulate_race_per_km(8400, simulations=20_000, seed=7, distribution=2.0)
+
+
+def test_histogram_round_trip():
+    rng = np.random.default_rng(0)
+    hist = TimeHistogram(0.5)
+    hist.update(rng.normal(7400, 120, 10_000))
+    back = TimeHistogram.from_bytes(hist.to_bytes())
+    assert back.bin_seconds == 0.5
+    assert back.offset == hist.offset
+    np.testing.assert_array_equal(back.counts, hist.counts)
+    assert back.percentile(50) == hist.percentile(50)
+
+
+def test_histogram_counts_use_the_narrowest_width():
+    hist = TimeHistogram()
+    hist.update([7400.0, 7401.0])
+    narrow = len(hist.to_bytes())
+    hist.counts[0] = 2**32  # beyond uint32
+    wide = hist.to_bytes()
+    assert len(wide) - narrow == 4 * len(hist.counts)
+    assert TimeHistogram.from_bytes(wide).counts[0] == 2**32
+
+
+def test_distribution_round_trip(race):
+    dist = race["distribution"]
+    assert dist.finishers == race["finishers"]
+    assert dist.dnfs == race["dnf_count"]
+    _assert_same_distribution(RaceDistribution.from_bytes(dist.to_bytes()), dist)
+
+
+def test_histogram_percentiles_within_a_bin_where_dense():
+    times = np.random.default_rng(2).normal(7400, 120, 50_000)
+    hist = TimeHistogram()
+    hist.update(times)
+    for q in (5, 25, 50, 75, 95):
+        assert abs(hist.percentile(q) - np.percentile(times, q)) <= hist.bin_seconds
+
+
+def test_merge_equals_single_pass():
+    rng = np.random.default_rng(1)
+    times = rng.normal(7400, 150, 5_000)
+    dnf_km = rng.integers(31, 43, 200)
+
+    whole = RaceDistribution()
+    whole.update(times, dnf_km)
+    left, right = RaceDistribution(), RaceDistribution()
+    left.update(times[:1_234], dnf_km[:50])
+    right.update(times[1_234:], dnf_km[50:])
+    # merged after a bytes round trip, as when collected from other processes
+    merged = RaceDistribution.from_bytes(left.to_bytes())
+    merged.merge(RaceDistribution.from_bytes(right.to_bytes()))
+    _assert_same_distribution(merged, whole)
+
+
+def test_shards_merge_independently_of_worker_count():
+    kwargs = dict(simulations=6_000, seed=3, shard_size=2_000, distribution=1.0)
+    serial = simulate_race_parallel(7325, workers=1, **kwargs)["distribution"]
+    pooled = simulate_race_parallel(7325, workers=2, **kwargs)["distribution"]
+    _assert_same_distribution(serial, pooled)
+
+
+@pytest.mark.parametrize("mangle", [
+    lambda b: b[:-1],                # truncated counts
+    lambda b: b + b"\0",             # trailing bytes
+    lambda b: b"XXXX" + b[4:],       # wrong magic
+    lambda b: b[:4] + b"\x09" + b[5:],  # unknown version
+], ids=["truncated", "trailing", "magic", "version"])
+def test_distribution_rejects_malformed_bytes(race, mangle):
+    with pytest.raises(ValueError):
+        RaceDistribution.from_bytes(mangle(race["distribution"].to_bytes()))
+
+
+def test_merge_rejects_mismatched_shapes():
+    with pytest.raises(ValueError):
+        RaceDistribution(num_km=42).merge(RaceDistribution(num_km=21))
+    with pytest.raises(ValueError):
+        TimeHistogram(1.0).merge(TimeHistogram(2.0))
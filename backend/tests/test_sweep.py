@@ -0,0 +1,56 @@
+"""Streamed scenario statistics agree with statistics of the raw samples."""
+
+import numpy as np
+import pytest
+
+from sweep import (
+    SWEEP_STATISTICS,
+    _normalise_scenario,
+    _scenario_chunks,
+    simulate_scenarios,
+)
+
+FIELD = [7325.0, 7400.0, 7500.0, 7800.0, 8400.0]
+SCENARIOS = [_normalise_scenario(s) for s in (8.0, 20.0, {"temp_celsius": 25.0, "fatigue_scale": 1.5})]
+SIMULATIONS = 4_000
+
+
+@pytest.fixture(scope="module")
+def grid_and_samples():
+    grid = simulate_scenarios(FIELD, SCENARIOS, simulations=SIMULATIONS, seed=5)
+    chunks = list(_scenario_chunks(FIELD, SCENARIOS, SIMULATIONS, None, seed=5))
+    samples = np.concatenate([np.stack(chunk) for chunk in chunks], axis=2)
+    return grid, samples
+
+
+def _column(grid, stat):
+    return grid["values"][:, :, SWEEP_STATISTICS.index(stat)]
+
+
+def test_moments_and_placings_are_exact(grid_and_samples):
+    grid, samples = grid_and_samples
+    finished = np.isfinite(samples)
+    times = np.where(finished, samples, np.nan)
+    np.testing.assert_allclose(_column(grid, "mean_time"), np.nanmean(times, axis=2).T)
+    np.testing.assert_allclose(_column(grid, "std_dev"), np.nanstd(times, axis=2).T)
+    np.testing.assert_allclose(_column(grid, "dnf_rate"), 1 - finished.mean(axis=2).T)
+
+    winners = np.argmin(samples, axis=1)  # (scenarios, sims)
+    wins = np.stack([(winners == r) & finished[:, r] for r in range(len(FIELD))])
+    np.testing.assert_allclose(_column(grid, "win_prob"), wins.mean(axis=2))
+
+
+def test_percentiles_within_two_bins(grid_and_samples):
+    # one bin of histogram resolution, plus up to one more where the slowest
+    # runner's samples are sparser than a bin (see TimeHistogram.percentile)
+    grid, samples = grid_and_samples
+    times = np.where(np.isfinite(samples), samples, np.nan)
+    for q, stat in zip((5, 50, 95), ("p5", "median", "p95")):
+        exact = np.nanpercentile(times, q, axis=2).T
+        assert np.abs(_column(grid, stat) - exact).max() <= 2.0
+
+
+def test_scenario_subsets_replay_the_same_races():
+    whole = simulate_scenarios(FIELD, SCENARIOS, simulations=1_000, seed=9)
+    last = simulate_scenarios(FIELD, SCENARIOS[-1:], simulations=1_000, seed=9)
+    np.testing.assert_array_equal(last["values"][:, 0], whole["values"][:, -1])
@@ -0,0 +1,42 @@
+"""
+Race-time parsing and formatting shared by the CLI, batch commands, server,
+jobs, calibration and benchmarks.
+
+A leaf module — standard library only — so anything can import it without
+pulling in the engine or creating an import cycle through ``main``.
+"""
+
+import math
+
+
+def time_to_seconds(time_str):
+    parts = time_str.strip().split(":")
+    if len(parts) == 3:
+        h, m, s = map(int, parts)
+    elif len(parts) == 2:
+        h, m, s = 0, int(parts[0]), int(parts[1])
+    else:
+        raise ValueError(f"Invalid time format: {time_str!r}  (expected H:MM:SS or MM:SS)")
+    return h * 3600 + m * 60 + s
+
+
+def seconds_to_time(seconds):
+    h = int(seconds // 3600)
+    m = int((seconds % 3600) // 60)
+    s = int(seconds % 60)
+    return f"{h}:{m:02d}:{s:02d}"
+
+
+def format_time(seconds, dnf="DNF"):
+    """:func:`seconds_to_time`, or ``dnf`` for a missing or non-finite time."""
+    if seconds is None or not math.isfinite(seconds):
+        return dnf
+    return seconds_to_time(seconds)
+
+
+def format_result_time(result, stat, dnf="DNF"):
+    """Format ``result[stat]`` from an engine result dict, or return ``dnf``
+    when nobody finished (the engine reports 0.0 / inf for those fields)."""
+    if result.get("finishers", 1) == 0:
+        return dnf
+    return format_time(result[stat], dnf)